@@ -0,0 +1,94 @@
+"""Compares loading cache files through full validation with the trusted path
+(see `mixins.Cached.parse`) on synthetic records written by the tool.
+
+Run from the repository root: python -m benchmarks.cache_loading [followers...]"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from random import Random
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+from cmds.models import cached, mixins
+from cmds.models.viewer import Viewer, Viewers
+
+ENTRIES = 1000
+CHURN = 0.005
+STORIES = 200
+ROUNDS = 3
+
+
+def synthetic_user(size: int, seed: int = 0) -> cached.User:
+    random = Random(seed)
+    user = cached.User(
+        followers={random.randrange(10**11): f"user_{i}" for i in range(size)},
+        followings={random.randrange(10**11): f"user_{i}" for i in range(size // 3)},
+    )
+    start = datetime(2020, 1, 1)
+    for day in range(ENTRIES):
+        entry = cached.ChangelogEntry(timestamp=start + timedelta(days=day))
+        for list_name in ("followers", "followings"):
+            users: dict[int, str] = getattr(user, list_name)
+            update: cached.Update = getattr(entry, list_name)
+            changed = max(int(len(users) * CHURN), 1)
+            for uid in random.sample(list(users), changed):
+                update.removed[uid] = users.pop(uid)
+            for index in range(changed):
+                uid = random.randrange(10**11)
+                users[uid] = update.added[uid] = f"new_user_{day}_{index}"
+        user.changelog.append(entry)
+    user.rebuild_checkpoints()
+    return user
+
+
+def synthetic_stories(size: int, seed: int = 0) -> cached.StoryHistory:
+    random = Random(seed)
+    history = cached.StoryHistory()
+    start = datetime(2020, 1, 1)
+    for index in range(STORIES):
+        taken_at = start + timedelta(days=index)
+        viewers = {
+            random.randrange(10**11): Viewer(
+                name=f"user_{random.randrange(size)}", recorded_at=taken_at
+            )
+            for _ in range(size // 10)
+        }
+        history.stories[index] = cached.Story.model_construct(
+            timestamp=taken_at, viewers=Viewers.of(viewers, history._names)
+        )
+    return history
+
+
+def measure(load: Callable[[], object]) -> float:
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        load()
+    return (perf_counter() - start) / ROUNDS
+
+
+def compare(name: str, record: mixins.Cached):
+    kind = type(record)
+    text = record.dumps()
+    validated = measure(lambda: kind.model_validate_json(text))  # type: ignore[attr-defined]
+    trusted = measure(lambda: kind.parse(text))
+    assert kind.parse(text).model_dump() == record.model_dump()  # type: ignore[attr-defined]
+    print(
+        f"{name:>28} ({len(text) / 10**6:6.1f}MB): validated {validated * 1000:8.1f}ms, "
+        f"trusted {trusted * 1000:8.1f}ms ({validated / trusted:.1f}x)"
+    )
+
+
+def main(sizes: list[int]):
+    # anything the records write on the side (e.g. the uid map) goes to a scratch directory
+    os.chdir(tempfile.mkdtemp())
+    Path("user info").mkdir()
+    for size in sizes:
+        compare(f"state of {size} followers", synthetic_user(size))
+        compare(f"stories of {size // 10} viewers", synthetic_stories(size))
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10_000, 30_000, 100_000])
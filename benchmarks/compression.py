@@ -0,0 +1,54 @@
+"""Compares the codecs (see `utils.compression`) cache files can be written with, in both
+formats of state files, on synthetic records: their size and the time it takes to write
+and to load them (and checkout a point in the changelog).
+
+Run from the repository root: python -m benchmarks.compression [followers...]"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+from time import perf_counter
+
+from benchmarks.cache_loading import synthetic_user
+from benchmarks.state_format import measure
+from cmds.models import cached
+from cmds.utils import compression
+from cmds.utils.settings import CODECS, STATE_FORMATS, Settings
+
+
+def compare(size: int):
+    user = synthetic_user(size)
+    # off any checkpoint so that some entries have to be replayed
+    point = date.fromordinal(user.dates[len(user.changelog) * 5 // 8])
+    print(f"state of {size} followers:")
+    for state_format in STATE_FORMATS:
+        for codec in CODECS:
+            Settings.get().state_format, Settings.get().codec = state_format, codec
+            start = perf_counter()
+            user.dump("target", 0)
+            written = perf_counter() - start
+            path = (
+                cached.User.binary_path_of(0)
+                if state_format == "binary"
+                else cached.User.path_of(0)
+            )
+            file_size = compression.path_with(path, codec).stat().st_size
+            loaded = measure(lambda: cached.User.get("target").checkout(point))
+            print(
+                f"{state_format:>8} {codec:>5}: {file_size / 10**6:6.1f}MB, "
+                f"write {written * 1000:8.1f}ms, load {loaded * 1000:8.1f}ms"
+            )
+
+
+def main(sizes: list[int]):
+    # the records (and the uid map) are written to a scratch directory
+    os.chdir(tempfile.mkdtemp())
+    Path("user info").mkdir()
+    for size in sizes:
+        compare(size)
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10_000, 30_000])
@@ -0,0 +1,72 @@
+"""Compares the dict based and the numpy based (`cmds.utils.vectorized`) implementations
+of the added/removed/renamed/mutuals computations on synthetic users.
+
+Run from the repository root: python -m benchmarks.set_operations [sizes...]"""
+
+import sys
+from random import Random
+from time import perf_counter
+
+from cmds.models import cached, fetched
+from cmds.utils import vectorized
+
+CHURN = 0.01
+ROUNDS = 5
+
+
+def synthetic_users(size: int, seed: int = 0) -> tuple[cached.User, fetched.User]:
+    random = Random(seed)
+    lists = {
+        list_name: {
+            random.randrange(10**11): f"user_{index}" for index in range(size)
+        }
+        for list_name in ("followers", "followings")
+    }
+    previous = cached.User.model_construct(
+        **{list_name: users.copy() for list_name, users in lists.items()}
+    )
+    for users in lists.values():
+        changed = int(size * CHURN)
+        for uid in random.sample(list(users), changed):
+            del users[uid]
+        for index in range(changed):
+            users[random.randrange(10**11)] = f"new_user_{index}"
+        for uid in random.sample(list(users), changed):
+            users[uid] += "_renamed"
+    current = fetched.User(
+        username="target",
+        followers=lists["followers"],
+        followings=lists["followings"],
+    )
+    return previous, current
+
+
+def measure(previous: cached.User, current: fetched.User):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        updates = current.updates_from(previous)
+        diffs = current.diffs_from(previous)
+    return (perf_counter() - start) / ROUNDS, updates, diffs
+
+
+def main(sizes: list[int]):
+    if vectorized.np is None:
+        sys.exit("numpy is not installed")
+    min_size = vectorized.MIN_SIZE
+
+    for size in sizes:
+        previous, current = synthetic_users(size)
+        vectorized.MIN_SIZE = sys.maxsize
+        dict_time, dict_updates, dict_diffs = measure(previous, current)
+        vectorized.MIN_SIZE = min_size
+        numpy_time, numpy_updates, numpy_diffs = measure(previous, current)
+
+        assert dict_updates == numpy_updates and dict_diffs == numpy_diffs
+        print(
+            f"{size:>9} users: dict {dict_time * 1000:9.2f}ms, "
+            f"numpy {numpy_time * 1000:9.2f}ms ({dict_time / numpy_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10_000, 100_000, 500_000])
@@ -0,0 +1,83 @@
+"""Compares the json and binary (see `cached.binary`) formats of state files
+on synthetic records: their size and the time it takes to load them and
+answer `state --summary`, `checkout` (to the middle of the changelog) and `compare`.
+
+Run from the repository root: python -m benchmarks.state_format [followers...]"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+from benchmarks.cache_loading import synthetic_user
+from cmds.models import cached
+from cmds.models.mixins import cached as cached_mixin
+from cmds.utils.settings import Settings
+
+ROUNDS = 3
+
+
+def measure(operation: Callable[[], object]) -> float:
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        # every round starts from a cold cache (of the tool, not of the os)
+        cached_mixin._cached.clear()
+        operation()
+    return (perf_counter() - start) / ROUNDS
+
+
+def operations(user: cached.User) -> dict[str, Callable[[], object]]:
+    middle = date.fromordinal(user.dates[len(user.changelog) // 2])
+    return {
+        "load": lambda: cached.User.get("target"),
+        "summary": lambda: len(cached.User.get("target").checkout(date.today()).followers),
+        "checkout": lambda: cached.User.get("target").checkout(middle).followers_usernames,
+        "compare": lambda: cached.User.get("target").mutuals_from(
+            cached.User.get("target").checkout(middle), "followers"
+        ),
+    }
+
+
+def compare(size: int):
+    user = synthetic_user(size)
+    timings: dict[str, dict[str, float]] = {}
+    sizes: dict[str, int] = {}
+    for state_format in ("json", "binary"):
+        Settings.get().state_format = state_format
+        user.dump("target", 0)
+        path = (
+            cached.User.binary_path_of(0)
+            if state_format == "binary"
+            else cached.User.path_of(0)
+        )
+        sizes[state_format] = path.stat().st_size
+        timings[state_format] = {
+            name: measure(operation) for name, operation in operations(user).items()
+        }
+
+    print(
+        f"state of {size} followers: json {sizes['json'] / 10**6:.1f}MB, "
+        f"binary {sizes['binary'] / 10**6:.1f}MB "
+        f"({sizes['json'] / sizes['binary']:.1f}x smaller)"
+    )
+    for name, json_time in timings["json"].items():
+        binary_time = timings["binary"][name]
+        print(
+            f"{name:>12}: json {json_time * 1000:8.1f}ms, binary {binary_time * 1000:8.1f}ms "
+            f"({json_time / binary_time:.1f}x)"
+        )
+
+
+def main(sizes: list[int]):
+    # the records (and the uid map) are written to a scratch directory
+    os.chdir(tempfile.mkdtemp())
+    Path("user info").mkdir()
+    for size in sizes:
+        compare(size)
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10_000, 30_000, 100_000])
@@ -0,0 +1,40 @@
+from argparse import ArgumentParser
+
+from .cachecmds import checkpoint, compact, convert, migrate
+
+
+def setup_parser(parser: ArgumentParser):
+    operations = parser.add_subparsers(
+        title="operations",
+        required=True,
+        help="Maintenance operations on the cached records",
+    )
+    checkpoint.setup_parser(
+        operations.add_parser(
+            "checkpoint",
+            help="(Re)build the checkpoints of the cached changelogs "
+            "so that reconstructing history does not require replaying all of it",
+        )
+    )
+    compact.setup_parser(
+        operations.add_parser(
+            "compact",
+            help="Fold the changelog journals back into their base files",
+        )
+    )
+    convert.setup_parser(
+        operations.add_parser(
+            "convert",
+            help="Rewrite the cache files in another format (e.g. the compact binary one "
+            "or back to json for exporting them) and/or with another compression "
+            "and keep using them for later invocations",
+        )
+    )
+    migrate.setup_parser(
+        operations.add_parser(
+            "migrate",
+            help="Import the json cache into the sqlite database "
+            "and switch to it for later invocations",
+        )
+    )
+    parser.set_defaults(func=lambda args: args.subfunc(args))
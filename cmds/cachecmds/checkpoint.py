@@ -0,0 +1,53 @@
+from argparse import ArgumentParser, FileType, Namespace
+from sys import stdout
+
+from ..models import cached
+from ..utils.constants import CHECKPOINT_INTERVAL, CHECKPOINT_RATIO
+from ..utils.tool_logger import logger
+from ..utils.uids import UIDMap
+
+
+def run(args: Namespace):
+    targets: list[str] = args.targets or list(cached.User.tracked().values())
+
+    for target in targets:
+        uid = UIDMap.get().uid_of(target)
+        cached_user = cached.User.get(target)
+        if uid is None or not cached_user:
+            logger.warning(f"skipping untracked user: {target}")
+            continue
+
+        count = cached_user.rebuild_checkpoints(args.interval, args.ratio)
+        cached_user.dump(target, uid)
+        args.out.write(
+            f"{target}: {count} checkpoints over {len(cached_user.changelog)} logs\n"
+        )
+
+
+def setup_parser(parser: ArgumentParser):
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        metavar="target",
+        help="The usernames of the accounts to checkpoint (defaults to every cached account)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=CHECKPOINT_INTERVAL,
+        help="The max number of logs between two checkpoints",
+    )
+    parser.add_argument(
+        "--ratio",
+        type=float,
+        default=CHECKPOINT_RATIO,
+        help="The max number of added/removed/renamed users between two checkpoints "
+        "relative to the number of followers/followings (i.e. to the size of a checkpoint)",
+    )
+    parser.add_argument(
+        "--out",
+        type=FileType("w", encoding="utf-8"),
+        default=stdout,
+        help="An optional file to output the result",
+    )
+    parser.set_defaults(subfunc=run)
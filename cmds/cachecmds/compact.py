@@ -0,0 +1,49 @@
+from argparse import ArgumentParser, FileType, Namespace
+from sys import stdout
+
+from ..models import cached
+from ..models.cached.index import ChangelogIndex
+from ..utils.tool_logger import logger
+from ..utils.uids import UIDMap
+
+
+def run(args: Namespace):
+    targets: list[str] = args.targets or list(cached.User.tracked().values())
+
+    for target in targets:
+        uid = UIDMap.get().uid_of(target)
+        if uid is None:
+            logger.warning(f"skipping untracked user: {target}")
+            continue
+        journal_path = cached.User.journal_path_of(uid)
+        index_journal_path = ChangelogIndex.journal_path_of(
+            cached.User.index_path_of(uid)
+        )
+        if not journal_path.is_file() and not index_journal_path.is_file():
+            args.out.write(f"{target}: nothing to compact\n")
+            continue
+
+        if journal_path.is_file():
+            with open(journal_path, encoding="utf-8") as file:
+                entry_count = sum(1 for line in file if line.strip())
+            cached.User.get(target).dump(target, uid)
+            args.out.write(f"{target}: folded {entry_count} journal entries\n")
+        if index_journal_path.is_file():
+            cached.User.changelog_index(target)
+            args.out.write(f"{target}: folded the journal of the changelog index\n")
+
+
+def setup_parser(parser: ArgumentParser):
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        metavar="target",
+        help="The usernames of the accounts to compact (defaults to every cached account)",
+    )
+    parser.add_argument(
+        "--out",
+        type=FileType("w", encoding="utf-8"),
+        default=stdout,
+        help="An optional file to output the result",
+    )
+    parser.set_defaults(subfunc=run)
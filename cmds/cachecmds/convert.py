@@ -0,0 +1,66 @@
+from argparse import ArgumentParser, FileType, Namespace
+from sys import stdout
+
+from ..models import cached
+from ..utils.settings import CODECS, STATE_FORMATS, Settings
+from ..utils.tool_logger import logger
+from ..utils.uids import UIDMap
+
+
+def run(args: Namespace):
+    if Settings.get().storage != "json":
+        args.out.write("Cache files are only used by the json storage\n")
+        return
+    if args.format is None and args.codec is None:
+        args.out.write("Nothing to convert to, specify a format and/or a codec\n")
+        return
+
+    Settings.get().update(state_format=args.format, codec=args.codec)
+    settings = Settings.get()
+    # the format only applies to states, stories are just (re)compressed
+    kinds = (cached.User,) if args.codec is None else (cached.User, cached.StoryHistory)
+    targets: list[str] = args.targets or list(
+        {username: None for kind in kinds for username in kind.tracked().values()}
+    )
+
+    for target in targets:
+        uid = UIDMap.get().uid_of(target)
+        if uid is None:
+            logger.warning(f"skipping untracked user: {target}")
+            continue
+        for kind in kinds:
+            if not kind.is_stored(uid):
+                continue
+            kind.get(target).dump(target, uid)
+            args.out.write(
+                f"{target}: converted {kind.subdir} to "
+                f"{settings.state_format if kind is cached.User else 'json'} "
+                f"({settings.codec})\n"
+            )
+
+
+def setup_parser(parser: ArgumentParser):
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        metavar="target",
+        help="The usernames of the accounts to convert (defaults to every cached account)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=STATE_FORMATS,
+        help="The format to rewrite the state files in (and to write them in from now on)",
+    )
+    parser.add_argument(
+        "--codec",
+        choices=CODECS,
+        help="The compression to rewrite the state and story files with "
+        "(and to write them with from now on)",
+    )
+    parser.add_argument(
+        "--out",
+        type=FileType("w", encoding="utf-8"),
+        default=stdout,
+        help="An optional file to output the result",
+    )
+    parser.set_defaults(subfunc=run)
@@ -0,0 +1,33 @@
+from argparse import ArgumentParser, FileType, Namespace
+from sys import stdout
+
+from ..models import cached
+from ..utils.settings import Settings
+from ..utils.uids import UIDMap
+
+
+def run(args: Namespace):
+    uid_map = UIDMap.from_file()
+    usernames = {uid: username for username, uid in uid_map.table.items()}
+
+    for kind in (cached.User, cached.StoryHistory):
+        for uid, username in usernames.items():
+            record = kind.load(uid, "json")
+            if record is None:
+                continue
+            record.dump(username, uid, "sqlite")
+            args.out.write(f"imported {kind.subdir} of {username}\n")
+
+    uid_map.to_database()
+    Settings.get().update(storage="sqlite")
+    args.out.write("switched the cache storage to sqlite\n")
+
+
+def setup_parser(parser: ArgumentParser):
+    parser.add_argument(
+        "--out",
+        type=FileType("w", encoding="utf-8"),
+        default=stdout,
+        help="An optional file to output the result",
+    )
+    parser.set_defaults(subfunc=run)
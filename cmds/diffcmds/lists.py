@@ -1,11 +1,12 @@
 from argparse import ArgumentParser, FileType, Namespace
-from datetime import datetime
+from datetime import datetime, timedelta
 from sys import stdout
 from typing import Union
 
 from ..models import cached, fetched
 from ..utils.bots import Bot
-from ..utils.parsers import date_parser
+from ..utils.constants import GATE_RESCAN_HOURS, INCREMENTAL_RUN
+from ..utils.parsers import date_parser, hours_parser, positive_int_parser
 from ..utils.renderers import ListsDiffRenderer
 from ..utils.streams import ColoredOutput
 
@@ -27,7 +28,15 @@ def run(args: Namespace):
         state = cached_user.checkout(args.date)
     else:
         client = bot.login()
-        state = fetched.User.fetch(client, args.target, args.chunk_size)
+        state = fetched.User.fetch(
+            client,
+            args.target,
+            args.chunk_size,
+            args.concurrent,
+            cached_user,
+            args.incremental,
+            args.gate,
+        )
         cached_user.dump_update(state)
 
     renderer.render(state.diff(args.reverse))
@@ -73,5 +82,33 @@ def setup_parser(parser: ArgumentParser) -> None:
         help="When fetching directly from instagram this dictates "
         "the size of each chunk to request",
     )
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="When fetching directly from instagram this scraps "
+        "followers and followings concurrently",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs="?",
+        type=positive_int_parser,
+        const=INCREMENTAL_RUN,
+        metavar="RUN",
+        help="When fetching directly from instagram, "
+        "stops scrapping each list once RUN (defaults to %(const)s) consecutive users match "
+        "the cached one and infers the rest from cache (falls back to a full scan "
+        "if the counts differ, renames further down the list are missed)",
+    )
+    parser.add_argument(
+        "--gate",
+        nargs="?",
+        type=hours_parser,
+        const=timedelta(hours=GATE_RESCAN_HOURS),
+        metavar="HOURS",
+        help="When fetching directly from instagram, "
+        "compares the count and first chunk of each list with the cached ones and skips "
+        "the rest of it if both match, unless it hasn't been fully scanned for HOURS "
+        f"(defaults to {GATE_RESCAN_HOURS})",
+    )
 
     parser.set_defaults(subfunc=run)
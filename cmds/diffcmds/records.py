@@ -1,11 +1,12 @@
 from argparse import ArgumentParser, FileType, Namespace
+from datetime import timedelta
 from sys import stdout
 
 from ..models import cached, fetched
 from ..utils.bots import Bot
-from ..utils.constants import CHANGES, LISTS
+from ..utils.constants import CHANGES, GATE_RESCAN_HOURS, INCREMENTAL_RUN, LISTS
 from ..utils.filters import change_filter, list_filter
-from ..utils.parsers import date_parser
+from ..utils.parsers import date_parser, hours_parser, positive_int_parser
 from ..utils.renderers import RecordsDiffRenderer
 from ..utils.streams import ColoredOutput
 
@@ -26,9 +27,30 @@ def run(args: Namespace) -> None:
         to_date=args.date2,
     )
 
+    if args.username is not None and args.date2 is not None:
+        renderer.render(
+            cached_user.updates_between(
+                cached.User.changelog_index(args.target),
+                args.username,
+                args.date1,
+                args.date2,
+                renderer.lists,
+                renderer.changes,
+            )
+        )
+        return
+
     if args.date2 is None:
         client = bot.login()
-        record2 = fetched.User.fetch(client, args.target, args.chunk_size)
+        record2 = fetched.User.fetch(
+            client,
+            args.target,
+            args.chunk_size,
+            args.concurrent,
+            cached_user,
+            args.incremental,
+            args.gate,
+        )
 
         if args.date1 is None:
             cached_user.dump_update(record2, renderer.render_block)
@@ -99,6 +121,34 @@ def setup_parser(parser: ArgumentParser) -> None:
         help="If no 'second-record' is specified, this controls "
         "the size of each chunk to request from instagram",
     )
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="If no 'second-record' is specified, this scraps "
+        "followers and followings concurrently",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs="?",
+        type=positive_int_parser,
+        const=INCREMENTAL_RUN,
+        metavar="RUN",
+        help="If no 'second-record' is specified, "
+        "stops scrapping each list once RUN (defaults to %(const)s) consecutive users match "
+        "the cached one and infers the rest from cache (falls back to a full scan "
+        "if the counts differ, renames further down the list are missed)",
+    )
+    parser.add_argument(
+        "--gate",
+        nargs="?",
+        type=hours_parser,
+        const=timedelta(hours=GATE_RESCAN_HOURS),
+        metavar="HOURS",
+        help="If no 'second-record' is specified, "
+        "compares the count and first chunk of each list with the cached ones and skips "
+        "the rest of it if both match, unless it hasn't been fully scanned for HOURS "
+        f"(defaults to {GATE_RESCAN_HOURS})",
+    )
     parser.add_argument(
         "--out",
         type=FileType("w", encoding="utf-8"),
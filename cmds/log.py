@@ -1,11 +1,12 @@
 from argparse import ArgumentParser, FileType, Namespace
+from datetime import timedelta
 from sys import stdout
 
 from .models import cached, fetched
 from .utils.bots import Bot
-from .utils.constants import CHANGES, LISTS
-from .utils.filters import change_filter, date_filter, list_filter
-from .utils.parsers import date_parser
+from .utils.constants import CHANGES, GATE_RESCAN_HOURS, INCREMENTAL_RUN, LISTS
+from .utils.filters import change_filter, list_filter
+from .utils.parsers import date_parser, hours_parser, positive_int_parser
 from .utils.renderers import ChangelogRenderer
 from .utils.streams import ColoredOutput
 
@@ -15,13 +16,20 @@ def run(args: Namespace) -> None:
     if not args.target:
         args.target = bot.username
 
-    cached_user = cached.User.get(args.target)
-
     if args.sync:
         client = bot.login()
-        fetched_user = fetched.User.fetch(client, args.target, args.chunk_size)
+        cached_user = cached.User.get(args.target)
+        fetched_user = fetched.User.fetch(
+            client,
+            args.target,
+            args.chunk_size,
+            args.concurrent,
+            cached_user,
+            args.incremental,
+            args.gate,
+        )
         cached_user.dump_update(fetched_user)
-    elif not cached_user:
+    elif not cached.User.exists(args.target):
         args.out.write(f"No logs to display for '{args.target}'\n")
         return
 
@@ -32,8 +40,8 @@ def run(args: Namespace) -> None:
         username=args.username,
         detailed=args.detailed,
         target=args.target,
-        changelog=date_filter(
-            args.from_date, args.to_date, reversed(cached_user.changelog)
+        changelog=cached.User.history(
+            args.target, args.from_date, args.to_date, args.username
         ),
         all=args.all,
     )
@@ -96,4 +104,31 @@ def setup_parser(parser: ArgumentParser) -> None:
         default=100,
         help="Only matters if --sync is specified and controls the size of each chunk to fetch while scrapping",
     )
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="Only matters if --sync is specified and scraps followers and followings concurrently",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs="?",
+        type=positive_int_parser,
+        const=INCREMENTAL_RUN,
+        metavar="RUN",
+        help="Only matters if --sync is specified and "
+        "stops scrapping each list once RUN (defaults to %(const)s) consecutive users match "
+        "the cached one and infers the rest from cache (falls back to a full scan "
+        "if the counts differ, renames further down the list are missed)",
+    )
+    parser.add_argument(
+        "--gate",
+        nargs="?",
+        type=hours_parser,
+        const=timedelta(hours=GATE_RESCAN_HOURS),
+        metavar="HOURS",
+        help="Only matters if --sync is specified and "
+        "compares the count and first chunk of each list with the cached ones and skips "
+        "the rest of it if both match, unless it hasn't been fully scanned for HOURS "
+        f"(defaults to {GATE_RESCAN_HOURS})",
+    )
     parser.set_defaults(func=run)
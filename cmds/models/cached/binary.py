@@ -0,0 +1,486 @@
+"""A compact binary layout for user states, read through a memory map.
+
+Every uid that appears anywhere in the file is stored once in a sorted table and every
+username once in a string table, everything else refers to them by index:
+
+- the current lists and the checkpoints are arrays of uid indices (sorted, so that
+  a uid is looked up by bisection) paired with arrays of name indices
+- each changelog entry holds such arrays for the users added, removed and renamed
+- the timestamps of all the entries are a single array (so are their scan info)
+
+Users of the current lists whose name is the one of the shared table of usernames
+(see `UsernameTable`) as of the last entry don't have it stored at all, they are resolved
+through that table instead. The checkpoints and the changelog always store the names.
+
+Arrays are prefixed by their length and padded to 8 bytes, in native byte order."""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence
+
+from ...utils.constants import LISTS, ListsType
+from ...utils.tool_logger import logger
+from ...utils.uids import UsernameTable
+
+MAGIC = b"ISTB"
+VERSION = 2
+# the versions that can still be read (the first one didn't refer to the shared names)
+VERSIONS = (1, 2)
+
+# magic, version and the offsets of the strings, uids, lists, checkpoints and changelog
+_HEADER = struct.Struct("=4sI5Q")
+_LENGTH = struct.Struct("=Q")
+_ALIGNMENT = 8
+_LISTS: tuple[ListsType, ...] = tuple(LISTS)
+_NO_STRING = -1
+# the name index of the users that are named as in the shared table
+_SHARED = 0xFFFFFFFF
+
+Users = Mapping[int, str]
+# the added, removed and renamed (to old and new names) users of a list
+ListUpdate = tuple[dict[int, str], dict[int, str], dict[int, tuple[str, str]]]
+
+
+class EntryRecord(NamedTuple):
+    """The plain contents of a changelog entry as stored in a state file"""
+
+    timestamp: float
+    updates: dict[ListsType, ListUpdate]
+    fingerprints: dict[ListsType, str]
+    gated: list[ListsType]
+
+
+class MappedUsers(Mapping[int, str]):
+    """A user list looked up in place within a state file. Iteration follows the order
+    the list was stored in (i.e. as it was fetched), if it was stored along with it.
+    Copying it (or going through its items) decodes it into a regular dict"""
+
+    def __init__(
+        self,
+        state: StateFile,
+        uids: Sequence[int],
+        names: Sequence[int],
+        order: Optional[Sequence[int]] = None,
+    ):
+        self.state = state
+        self.uids = uids
+        self.names = names
+        self.order = order
+
+    def position(self, uid: int) -> Optional[int]:
+        table = self.state.uids
+        index = bisect_left(table, uid)
+        if index == len(table) or table[index] != uid:
+            return None
+        position = bisect_left(self.uids, index)
+        if position == len(self.uids) or self.uids[position] != index:
+            return None
+        return position
+
+    def positions(self) -> Iterable[int]:
+        return self.order if self.order is not None else range(len(self.uids))
+
+    def __getitem__(self, uid: int) -> str:
+        position = self.position(uid)
+        if position is None:
+            raise KeyError(uid)
+        return self.state.name(uid, self.names[position])
+
+    def __contains__(self, uid: object) -> bool:
+        return isinstance(uid, int) and self.position(uid) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        table, uids = self.state.uids, self.uids
+        return (table[uids[position]] for position in self.positions())
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def copy(self) -> dict[int, str]:
+        table, name = self.state.uids, self.state.name
+        uids, names = self.uids, self.names
+        users: dict[int, str] = {}
+        for position in self.positions():
+            uid = table[uids[position]]
+            users[uid] = name(uid, names[position])
+        return users
+
+    def items(self):  # type: ignore[override]
+        return self.copy().items()
+
+    def values(self):  # type: ignore[override]
+        return self.copy().values()
+
+
+class StateFile:
+    """A state file mapped into memory, the sections of which are only decoded on access"""
+
+    def __init__(self, data: bytes | mmap.mmap, shared: Optional[UsernameTable] = None):
+        self.data = data
+        self.shared = shared
+        self._recorded: Optional[dict[int, str]] = None
+        self.view = memoryview(data)
+        magic, version, strings, uids, lists, checkpoints, changelog = (
+            _HEADER.unpack_from(data)
+        )
+        if magic != MAGIC or version not in VERSIONS:
+            logger.critical(f"unsupported state file (version {version})")
+            raise RuntimeError("invalid state file")
+
+        (string_offsets, blob), _ = self.arrays(strings, "QB")
+        self.string_offsets: Sequence[int] = string_offsets
+        self.blob = blob
+        (self.uids,), _ = self.arrays(uids, "q")
+
+        self.lists_offset = lists
+
+        (self.checkpoint_indices, self.checkpoint_offsets), _ = self.arrays(
+            checkpoints, "QQ"
+        )
+        (
+            self.timestamps,
+            self.fingerprints,
+            self.gated,
+            self.entry_offsets,
+        ), _ = self.arrays(changelog, "dqBQ")
+        # the current lists are named as of the last entry
+        self.named_at: Optional[float] = (
+            self.timestamps[-1] if len(self.timestamps) else None
+        )
+
+    @classmethod
+    def open(cls, path: Path, shared: Optional[UsernameTable] = None) -> StateFile:
+        """Maps the file, which is unmapped once nothing refers to it anymore.
+        A mapped file can't be replaced or removed on windows, it's read into memory there"""
+        with open(path, "rb") as file:
+            if os.name == "nt":
+                return cls(file.read(), shared)
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), shared)
+
+    def __deepcopy__(self, memo: dict) -> StateFile:
+        # the file is never modified once mapped (it's replaced when written again)
+        return self
+
+    def arrays(self, offset: int, typecodes: str) -> tuple[list, int]:
+        return read_arrays(self.view, offset, typecodes)
+
+    def string(self, index: int) -> str:
+        return str(
+            self.blob[self.string_offsets[index] : self.string_offsets[index + 1]],
+            "utf-8",
+        )
+
+    def name(self, uid: int, index: int) -> str:
+        if index != _SHARED:
+            return self.string(index)
+        name = self.shared.name_at(uid, self.named_at) if self.shared is not None else None
+        if name is None:
+            name = self.recorded_names().get(uid)
+        if name is None:
+            logger.warning(f"{uid} has no name recorded anywhere, naming it by its uid")
+            return str(uid)
+        return name
+
+    def recorded_names(self) -> dict[int, str]:
+        """The names of the users as last recorded in the history of the state, which
+        stand in for the ones missing from the shared table (e.g. if it was lost)"""
+        if self._recorded is not None:
+            return self._recorded
+        logger.warning(
+            "users are missing from the username table, "
+            "naming them as last recorded in the changelog"
+        )
+        # names are looked up while the history is read (for files written otherwise)
+        self._recorded = {}
+        checkpoint: Optional[dict[ListsType, MappedUsers]] = None
+        start = 0
+        if len(self.checkpoint_indices):
+            checkpoint = self.checkpoint(len(self.checkpoint_indices) - 1)
+            start = self.checkpoint_indices[-1]
+        self._recorded = recorded_names(
+            checkpoint, map(self.entry, range(start, len(self.entry_offsets)))
+        )
+        return self._recorded
+
+    def lists(self) -> dict[ListsType, MappedUsers]:
+        # built on demand, the lists refer to the file but not the other way around
+        offset = self.lists_offset
+        lists: dict[ListsType, MappedUsers] = {}
+        for list_name in _LISTS:
+            (uids, names, order), offset = self.arrays(offset, "III")
+            lists[list_name] = MappedUsers(self, uids, names, order)
+        return lists
+
+    def checkpoint(self, position: int) -> dict[ListsType, MappedUsers]:
+        offset = self.checkpoint_offsets[position]
+        lists: dict[ListsType, MappedUsers] = {}
+        for list_name in _LISTS:
+            (uids, names), offset = self.arrays(offset, "II")
+            lists[list_name] = MappedUsers(self, uids, names)
+        return lists
+
+    def entry(self, position: int) -> EntryRecord:
+        table, string, name = self.uids, self.string, self.name
+        offset = self.entry_offsets[position]
+        updates: dict[ListsType, ListUpdate] = {}
+        for list_name in _LISTS:
+            (added, added_names, removed, removed_names), offset = self.arrays(
+                offset, "IIII"
+            )
+            (renamed, new_names, old_names), offset = self.arrays(offset, "III")
+            updates[list_name] = (
+                {
+                    table[uid]: name(table[uid], index)
+                    for uid, index in zip(added, added_names)
+                },
+                {
+                    table[uid]: name(table[uid], index)
+                    for uid, index in zip(removed, removed_names)
+                },
+                {
+                    table[uid]: (string(old_name), string(new_name))
+                    for uid, old_name, new_name in zip(renamed, old_names, new_names)
+                },
+            )
+
+        fingerprints = self.fingerprints[
+            position * len(_LISTS) : (position + 1) * len(_LISTS)
+        ]
+        return EntryRecord(
+            timestamp=self.timestamps[position],
+            updates=updates,
+            fingerprints={
+                list_name: string(fingerprint)
+                for list_name, fingerprint in zip(_LISTS, fingerprints)
+                if fingerprint != _NO_STRING
+            },
+            gated=[
+                list_name
+                for bit, list_name in enumerate(_LISTS)
+                if self.gated[position] & (1 << bit)
+            ],
+        )
+
+
+class StateWriter:
+    """Lays out a state (see the module docs), going through it twice:
+    once to collect the uid table and once to write everything else"""
+
+    def __init__(
+        self,
+        uids: Iterable[int],
+        shared: Optional[UsernameTable] = None,
+        named_at: Optional[float] = None,
+    ):
+        self.data = bytearray(_HEADER.size)
+        self.shared = shared
+        self.named_at = named_at
+        self.uid_table = sorted(set(uids))
+        self.uid_indices = {uid: index for index, uid in enumerate(self.uid_table)}
+        self.strings: dict[str, int] = {}
+
+    def intern(self, string: str) -> int:
+        return self.strings.setdefault(string, len(self.strings))
+
+    def intern_all(self, strings: list[Optional[str]]) -> list[int]:
+        """Interns every string, with `None` standing for the name in the shared table"""
+        # most strings of a state are repeated (checkpoints) so they're looked up first
+        # (`None` is never a key, mypy only accepts `str` for it)
+        indices: list = list(map(self.strings.get, strings))  # type: ignore[arg-type]
+        if None in indices:
+            for position, index in enumerate(indices):
+                if index is None:
+                    string = strings[position]
+                    indices[position] = _SHARED if string is None else self.intern(string)
+        return indices
+
+    def names_of(self, users: dict[int, str]) -> list[int]:
+        """The name indices of a current list, leaving out the names of the shared table"""
+        table = self.shared
+        if table is None:
+            return self.intern_all(list(users.values()))
+        names, previous, named_at = table.names, table.previous, self.named_at
+        return self.intern_all(
+            [
+                None
+                if (
+                    names.get(uid)
+                    if uid not in previous
+                    else table.name_at(uid, named_at)
+                )
+                == name
+                else name
+                for uid, name in users.items()
+            ]
+        )
+
+    def array(self, typecode: str, values: Iterable) -> int:
+        return write_array(self.data, typecode, values)
+
+    def users(self, users: Users, current: bool = False) -> int:
+        """Writes the sorted uid indices and name indices of a list (and for the current
+        lists, the order they were in as the position of each user in the sorted arrays)"""
+        offset = len(self.data)
+        if not isinstance(users, dict):
+            users = dict(users.items())
+        indices = list(map(self.uid_indices.__getitem__, users))
+        names = (
+            self.names_of(users) if current else self.intern_all(list(users.values()))
+        )
+        positions = sorted(range(len(indices)), key=indices.__getitem__)
+        self.array("I", list(map(indices.__getitem__, positions)))
+        self.array("I", list(map(names.__getitem__, positions)))
+        if current:
+            # the inverse of the sorting permutation
+            self.array("I", sorted(range(len(positions)), key=positions.__getitem__))
+        return offset
+
+    def renamed(self, users: Mapping[int, tuple[str, str]]) -> int:
+        offset = len(self.data)
+        items = sorted((self.uid_indices[uid], names) for uid, names in users.items())
+        self.array("I", (index for index, _ in items))
+        self.array("I", (self.intern(new_name) for _, (_, new_name) in items))
+        self.array("I", (self.intern(old_name) for _, (old_name, _) in items))
+        return offset
+
+    def strings_table(self) -> int:
+        blobs = [string.encode() for string in self.strings]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        offset = self.array("Q", offsets)
+        self.array("B", b"".join(blobs))
+        return offset
+
+    def finish(self, *offsets: int) -> bytes:
+        _HEADER.pack_into(self.data, 0, MAGIC, VERSION, *offsets)
+        return bytes(self.data)
+
+
+def encode_state(
+    lists: Mapping[ListsType, Users],
+    checkpoints: Iterable[tuple[int, Mapping[ListsType, Users]]],
+    entries: Iterable[EntryRecord],
+    shared: Optional[UsernameTable] = None,
+) -> bytes:
+    checkpoints = list(checkpoints)
+    entries = list(entries)
+    uids: set[int] = set()
+    for users in _users_of(lists, checkpoints, entries):
+        uids.update(users)
+    writer = StateWriter(uids, shared, entries[-1].timestamp if entries else None)
+
+    list_offset = len(writer.data)
+    for list_name in _LISTS:
+        writer.users(lists[list_name], current=True)
+
+    checkpoint_offsets: list[int] = []
+    for _, checkpoint in checkpoints:
+        checkpoint_offsets.append(len(writer.data))
+        for list_name in _LISTS:
+            writer.users(checkpoint[list_name])
+    checkpoints_offset = writer.array("Q", (index for index, _ in checkpoints))
+    writer.array("Q", checkpoint_offsets)
+
+    entry_offsets: list[int] = []
+    for entry in entries:
+        entry_offsets.append(len(writer.data))
+        for list_name in _LISTS:
+            added, removed, renamed = entry.updates[list_name]
+            writer.users(added)
+            writer.users(removed)
+            writer.renamed(renamed)
+    changelog_offset = writer.array("d", (entry.timestamp for entry in entries))
+    writer.array(
+        "q",
+        (
+            (
+                writer.intern(entry.fingerprints[list_name])
+                if list_name in entry.fingerprints
+                else _NO_STRING
+            )
+            for entry in entries
+            for list_name in _LISTS
+        ),
+    )
+    writer.array(
+        "B",
+        (
+            sum(1 << bit for bit, list_name in enumerate(_LISTS) if list_name in entry.gated)
+            for entry in entries
+        ),
+    )
+    writer.array("Q", entry_offsets)
+
+    uids_offset = writer.array("q", writer.uid_table)
+    return writer.finish(
+        writer.strings_table(),
+        uids_offset,
+        list_offset,
+        checkpoints_offset,
+        changelog_offset,
+    )
+
+
+def _users_of(
+    lists: Mapping[ListsType, Users],
+    checkpoints: list[tuple[int, Mapping[ListsType, Users]]],
+    entries: list[EntryRecord],
+) -> Iterator[Mapping[int, object]]:
+    for list_name in _LISTS:
+        yield lists[list_name]
+        for _, checkpoint in checkpoints:
+            yield checkpoint[list_name]
+        for entry in entries:
+            yield from entry.updates[list_name]
+
+
+def read_arrays(view: memoryview, offset: int, typecodes: str) -> tuple[list, int]:
+    """Reads consecutive arrays starting at `offset` (one per typecode)
+    without copying them, returning them along with the offset that follows"""
+    result: list[memoryview] = []
+    for typecode in typecodes:
+        (length,) = _LENGTH.unpack_from(view, offset)
+        start = offset + _LENGTH.size
+        end = start + length * struct.calcsize(typecode)
+        # the typecodes are the ones of `array`, which typeshed only accepts as literals
+        result.append(view[start:end].cast(typecode))  # type: ignore[call-overload]
+        offset = _aligned(end)
+    return result, offset
+
+
+def write_array(data: bytearray, typecode: str, values: Iterable) -> int:
+    """Appends an array (prefixed by its length and padded), returning its offset"""
+    offset = len(data)
+    items = array(typecode, values)
+    data += _LENGTH.pack(len(items))
+    data += items.tobytes()
+    data += bytes(-len(data) % _ALIGNMENT)
+    return offset
+
+
+def _aligned(offset: int) -> int:
+    return offset + -offset % _ALIGNMENT
+
+
+def recorded_names(
+    checkpoint: Optional[Mapping[ListsType, Users]], entries: Iterable[EntryRecord]
+) -> dict[int, str]:
+    """The names users were last recorded under in the lists of a checkpoint
+    and the changelog entries that followed it"""
+    names: dict[int, str] = {}
+    if checkpoint is not None:
+        for users in checkpoint.values():
+            names.update(users.items())
+    for entry in entries:
+        for added, _, renamed in entry.updates.values():
+            names.update(added)
+            names.update((uid, new_name) for uid, (_, new_name) in renamed.items())
+    return names
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence, TypeVar
+
+from pydantic import BaseModel, Field
+
+from ...utils.constants import CHANGES, LISTS, ChangesType, ListsType
+from ...utils.tool_logger import logger
+from .. import mixins
+
+EntryType = TypeVar("EntryType", bound=mixins.UserUpdate)
+
+_LISTS: tuple[ListsType, ...] = tuple(LISTS)
+_CHANGES: tuple[ChangesType, ...] = tuple(CHANGES)
+
+
+def encode_posting(entry: int, list_name: ListsType, change_type: ChangesType) -> int:
+    return (entry * len(_LISTS) + _LISTS.index(list_name)) * len(
+        _CHANGES
+    ) + _CHANGES.index(change_type)
+
+
+def decode_posting(posting: int) -> tuple[int, ListsType, ChangesType]:
+    rest, change = divmod(posting, len(_CHANGES))
+    entry, list_index = divmod(rest, len(_LISTS))
+    return entry, _LISTS[list_index], _CHANGES[change]
+
+
+# the changes of an entry as given by `UserUpdate.change_rows`
+ChangeRow = tuple[ListsType, ChangesType, int, str, Optional[str]]
+
+
+class IndexedEntry(BaseModel):
+    """A line of the journal of a `ChangelogIndex`, i.e. the changes of the entry at `position`"""
+
+    position: int
+    rows: list[ChangeRow] = Field(default_factory=list)
+
+
+class ChangelogIndex(BaseModel):
+    """An inverted index over a user's changelog. Postings are packed as a single integer
+    (see `encode_posting`) which identifies the entry (by position), the list and the change type.
+    With the json storage it's persisted next to the state file, new entries being appended
+    to a journal of their own (see `journal`) which is only folded back once the index is read
+
+    Attributes:
+        size (int): The number of changelog entries that have been indexed so far
+        usernames (dict[str, list[tuple[int, int]]]): Maps every username that appears in the changelog
+            (including old names of renamed users) to `(posting, uid)` pairs
+        uids (dict[int, list[int]]): Maps every uid that appears in the changelog to its postings
+    """
+
+    size: int = 0
+    usernames: dict[str, list[tuple[int, int]]] = Field(default_factory=dict)
+    uids: dict[int, list[int]] = Field(default_factory=dict)
+
+    @classmethod
+    def get(
+        cls, changelog: Sequence[mixins.UserUpdate], path: Optional[Path] = None
+    ) -> ChangelogIndex:
+        """Loads the index stored at `path` (if any) along with its journal and brings it
+        up to date with `changelog`, backing it up again (folding the journal) if anything
+        had to be indexed or replayed"""
+        index: Optional[ChangelogIndex] = None
+        if path is not None and path.is_file():
+            with open(path, encoding="utf-8") as file:
+                index = cls.model_validate_json(file.read())
+            if index.size > len(changelog):
+                logger.warning("the changelog index is out of sync, rebuilding it")
+                index = None
+        if index is None:
+            index = cls()
+
+        journal = cls.journal_path_of(path) if path is not None else None
+        stale = journal is not None and journal.is_file()
+        if journal is not None and stale:
+            with open(journal, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        index.replay(IndexedEntry.model_validate_json(line), changelog)
+        if index.size < len(changelog):
+            index.extend(changelog[index.size :])
+            stale = True
+        if path is not None and stale:
+            index.backup(path)
+        return index
+
+    @staticmethod
+    def journal_path_of(path: Path) -> Path:
+        return path.with_suffix(".jsonl")
+
+    @classmethod
+    def journal(cls, entry: mixins.UserUpdate, position: int, path: Path) -> None:
+        """Appends the changes of the entry at `position` to the journal of the index
+        stored at `path`, without loading it"""
+        indexed = IndexedEntry(position=position, rows=list(entry.change_rows()))
+        with open(cls.journal_path_of(path), "a", encoding="utf-8") as file:
+            file.write(f"{indexed.model_dump_json()}\n")
+
+    def backup(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.model_dump_json())
+        self.journal_path_of(path).unlink(missing_ok=True)
+
+    def replay(
+        self, indexed: IndexedEntry, changelog: Sequence[mixins.UserUpdate]
+    ) -> None:
+        # entries that were never journaled (e.g. before the index existed) are read instead
+        if indexed.position < self.size or indexed.position >= len(changelog):
+            return
+        self.extend(changelog[self.size : indexed.position])
+        self.add_rows(indexed.rows)
+
+    def extend(self, entries: Iterable[mixins.UserUpdate]) -> None:
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: mixins.UserUpdate) -> None:
+        self.add_rows(entry.change_rows())
+
+    def add_rows(self, rows: Iterable[ChangeRow]) -> None:
+        for list_name, change_type, uid, username, old_username in rows:
+            posting = encode_posting(self.size, list_name, change_type)
+            self.uids.setdefault(uid, []).append(posting)
+            self.usernames.setdefault(username, []).append((posting, uid))
+            if old_username is not None:
+                self.usernames.setdefault(old_username, []).append((posting, uid))
+        self.size += 1
+
+    def postings_of_uid(self, uid: int) -> list[tuple[int, ListsType, ChangesType]]:
+        return [decode_posting(posting) for posting in self.uids.get(uid, ())]
+
+    def uids_of(self, username: str) -> set[int]:
+        return {uid for _, uid in self.usernames.get(username, ())}
+
+    def project(
+        self,
+        changelog: Sequence[EntryType],
+        username: str,
+        blank: Callable[[int], EntryType],
+        selection: slice = slice(None),
+    ) -> list[EntryType]:
+        """Creates a copy of the selected part of the changelog where each entry
+        (timestamp aside) only keeps the changes that mention `username`. Only the entries
+        with such changes are read, `blank` builds the (empty) copy of the entry at a position"""
+        start, stop, _ = selection.indices(len(changelog))
+        projected: list[EntryType] = [blank(position) for position in range(start, stop)]
+        for posting, uid in self.usernames.get(username, ()):
+            entry_index, list_name, change_type = decode_posting(posting)
+            if not start <= entry_index < stop:
+                continue
+            source = getattr(getattr(changelog[entry_index], list_name), change_type)
+            target = getattr(
+                getattr(projected[entry_index - start], list_name), change_type
+            )
+            target[uid] = source[uid]
+        return projected
@@ -1,33 +1,291 @@
+import json
+from array import array
 from datetime import date, datetime
-from typing import ClassVar, Optional, Self, Union
+from pathlib import Path
+from sqlite3 import Connection
+from typing import Any, ClassVar, Optional, Self, Union
 
-from pydantic import BaseModel, Field, field_serializer
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PrivateAttr,
+    ValidatorFunctionWrapHandler,
+    field_serializer,
+    field_validator,
+    model_serializer,
+    model_validator,
+)
 
+from ...utils import database
+from ...utils.filters import date_slice
+from ...utils.settings import Settings
+from ...utils.uids import UIDMap
 from .. import fetched, mixins
-from ..viewer import Viewer
+from ..viewer import Names, Viewer, Viewers
+from .viewer_index import ViewerIndex
 
 
 class Story(mixins.Story, BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     timestamp: datetime
-    viewers: dict[int, Viewer]
+    viewers: Viewers
 
     @field_serializer("timestamp")
     def serialize_taken_at(self, timestamp: datetime, _info):
         return timestamp.timestamp()
 
+    @field_validator("viewers", mode="before")
+    @classmethod
+    def validate_viewers(cls, value: Any) -> Viewers:
+        # `StoryHistory` passes them already loaded with its own name table
+        return Viewers.load(value, Names())
+
+    @field_serializer("viewers")
+    def serialize_viewers(self, viewers: Viewers, _info):
+        return viewers.dump()
+
+    @property
+    def viewers_usernames(self):
+        return self.viewers.usernames()
+
 
 class StoryHistory(mixins.Cached, BaseModel):
     subdir: ClassVar[str] = "stories"
     stories: dict[int, Story] = Field(default_factory=dict)
+    # the usernames the viewers of every story refer to (stored once per history)
+    _names: Names = PrivateAttr(default_factory=Names)
+    _timeline: list[int] = PrivateAttr(default_factory=list)
+    _dates: array = PrivateAttr(default_factory=lambda: array("l"))
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def validate_viewers(cls, data: Any, handler: ValidatorFunctionWrapHandler):
+        if not isinstance(data, dict):
+            return handler(data)
+        names = Names(data.get("names", ()))
+        stories = {
+            sid: (
+                story | {"viewers": Viewers.load(story["viewers"], names)}
+                if isinstance(story, dict)
+                else story.model_copy(
+                    update={"viewers": Viewers.of(story.viewers, names)}
+                )
+            )
+            for sid, story in data.get("stories", {}).items()
+        }
+        instance = handler(data | {"stories": stories})
+        instance._names = names
+        return instance
+
+    @model_serializer(mode="wrap")
+    def serialize_names(self, handler):
+        data = handler(self)
+        data["names"] = self._names.strings
+        return data
+
+    def serialize(self) -> str:
+        """Histories aren't indented like other records (the viewer arrays would take a line
+        per item), each story is written on a line of its own instead"""
+        stories = ",\n".join(
+            f'"{sid}": {story.model_dump_json()}' for sid, story in self.stories.items()
+        )
+        names = json.dumps(self._names.strings, ensure_ascii=False)
+        return f'{{\n"stories": {{\n{stories}\n}},\n"names": {names}\n}}'
+
+    @classmethod
+    def lookup(
+        cls,
+        username: str,
+        viewer: str,
+        deep: bool = False,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        all: bool = False,
+    ) -> list[tuple[int, Story, Optional[Viewer]]]:
+        """Selects the stories (from most recent to oldest) within a range of dates that
+        `viewer` was recorded in (along with its record), or every one of them if `all` is set.
+        With the sqlite storage this is answered through its indexes, otherwise
+        through a persisted index over the viewers (see `lookup_viewer` and `ViewerIndex`)
+
+        Args:
+            username (str): The uploader of the stories
+            viewer (str): The username of the viewer that is looked up
+            deep (bool): Whether the viewer should be matched by its id
+                (as found by its username) instead of just its name
+            from_date (Optional[date]): The (inclusive) start of the range
+            to_date (Optional[date]): The (inclusive) end of the range
+            all (bool): Whether to include the stories the viewer was not recorded in
+        """
+        if Settings.get().storage != "sqlite":
+            history = cls.get(username)
+            uid = UIDMap.get().uid_of(username)
+            index = (
+                history.viewer_index(uid)
+                if uid is not None and cls.is_stored(uid)
+                else None
+            )
+            return history.lookup_viewer(viewer, deep, from_date, to_date, all, index)
+
+        uid = UIDMap.get().uid_of(username)
+        if uid is None:
+            return []
+        connection = database.connect()
+        start, end = database.date_range(from_date, to_date)
+        viewer_filter: tuple[str, tuple] = ("v.username = ?", (viewer,))
+
+        if deep:
+            row = connection.execute(
+                "SELECT v.uid FROM viewers v JOIN stories s ON s.id = v.story "
+                "WHERE s.owner = ? AND s.timestamp >= ? AND s.timestamp < ? "
+                "AND v.username = ? ORDER BY s.timestamp DESC, s.id DESC LIMIT 1",
+                (uid, start, end, viewer),
+            ).fetchone()
+            if row is None:
+                return []
+            viewer_filter = ("v.uid = ?", row)
+
+        stories = cls.stories_from_database(connection, uid, start, end, viewer_filter)
+        return [
+            (sid, story, next(iter(story.viewers.values()), None))
+            for sid, story in reversed(stories.items())
+            if all or story.viewers
+        ]
+
+    def lookup_viewer(
+        self,
+        viewer: str,
+        deep: bool = False,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        all: bool = False,
+        index: Optional[ViewerIndex] = None,
+    ) -> list[tuple[int, Story, Optional[Viewer]]]:
+        """The counterpart of `lookup` for an already loaded history. The viewers are
+        matched by the id of the username (or the uid) through `index` if given, and by
+        scanning the arrays of the selected stories past what it covers (see `ViewerIndex.find`)"""
+        selected = self.select(from_date, to_date)
+        stories = {sid: story.viewers for sid, story in selected}
+        index = index or ViewerIndex()
+        name_id = self._names.ids.get(viewer)
+        found = index.find(stories, "name_ids", name_id) if name_id is not None else {}
+
+        if deep:
+            if not found:
+                return []
+            # the viewer that was first recorded with that username in the most recent story
+            sid = next(sid for sid, _ in reversed(selected) if sid in found)
+            found = index.find(stories, "uids", stories[sid].uids[found[sid]])
+
+        return [
+            (sid, story, story.viewers.record(found[sid]) if sid in found else None)
+            for sid, story in reversed(selected)
+            if all or sid in found
+        ]
+
+    def viewer_index(self, uid: int) -> ViewerIndex:
+        """Opens the persisted index over the viewers of the history (see `ViewerIndex.get`)"""
+        return ViewerIndex.get(
+            self.viewer_index_path_of(uid),
+            {sid: story.viewers for sid, story in self.stories.items()},
+        )
+
+    @classmethod
+    def viewer_index_path_of(cls, uid: int) -> Path:
+        return cls.path_of(uid).with_suffix(".viewers.bin")
+
+    def select(
+        self, from_date: Optional[date], to_date: Optional[date]
+    ) -> list[tuple[int, Story]]:
+        """Selects the stories (from oldest to most recent) within a range of dates by bisecting
+        the timeline (the story ids sorted by timestamp) which is built once and reused"""
+        if len(self._timeline) != len(self.stories):
+            self._timeline = sorted(
+                self.stories, key=lambda sid: self.stories[sid].timestamp.timestamp()
+            )
+            self._dates = array(
+                "l",
+                (
+                    self.stories[sid].timestamp.date().toordinal()
+                    for sid in self._timeline
+                ),
+            )
+        return [
+            (sid, self.stories[sid])
+            for sid in self._timeline[date_slice(from_date, to_date, self._dates)]
+        ]
+
+    @classmethod
+    def from_database(cls, connection: Connection, uid: int) -> Optional[Self]:
+        if not cls.is_stored(uid, "sqlite"):
+            return None
+        names = Names()
+        instance = cls.model_construct(
+            stories=cls.stories_from_database(connection, uid, names=names)
+        )
+        instance._names = names
+        return instance
+
+    @staticmethod
+    def stories_from_database(
+        connection: Connection,
+        uid: int,
+        start: float = float("-inf"),
+        end: float = float("inf"),
+        viewer_filter: tuple[str, tuple] = ("1", ()),
+        names: Optional[Names] = None,
+    ) -> dict[int, Story]:
+        names = names if names is not None else Names()
+        stories: dict[int, Story] = {
+            sid: Story.model_construct(
+                timestamp=database.to_datetime(timestamp), viewers=Viewers(names)
+            )
+            for sid, timestamp in connection.execute(
+                "SELECT id, timestamp FROM stories "
+                "WHERE owner = ? AND timestamp >= ? AND timestamp < ? "
+                "ORDER BY timestamp, id",
+                (uid, start, end),
+            )
+        }
+        condition, params = viewer_filter
+        for sid, viewer_uid, username, recorded_at in connection.execute(
+            "SELECT v.story, v.uid, v.username, v.recorded_at "
+            "FROM viewers v JOIN stories s ON s.id = v.story "
+            "WHERE s.owner = ? AND s.timestamp >= ? AND s.timestamp < ? "
+            f"AND {condition} ORDER BY v.rowid",
+            (uid, start, end, *params),
+        ):
+            stories[sid].viewers[viewer_uid] = Viewer.model_construct(
+                name=username, recorded_at=database.to_datetime(recorded_at)
+            )
+        return stories
+
+    def to_database(self, connection: Connection, uid: int) -> None:
+        connection.execute("DELETE FROM stories WHERE owner = ?", (uid,))
+        connection.executemany(
+            "INSERT INTO stories (id, owner, timestamp) VALUES (?, ?, ?)",
+            (
+                (sid, uid, story.timestamp.timestamp())
+                for sid, story in self.stories.items()
+            ),
+        )
+        connection.executemany(
+            "INSERT INTO viewers (story, uid, username, recorded_at) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                (sid, viewer_uid, viewer.name, viewer.recorded_at.timestamp())
+                for sid, story in self.stories.items()
+                for viewer_uid, viewer in story.viewers.items()
+            ),
+        )
 
     def dump_update(self, fetched_stories: fetched.Stories) -> None:
         for story_id, story in fetched_stories:
             if story_id in self.stories:
-                current = self.stories[story_id]
-                current.viewers = story.viewers | current.viewers
+                self.stories[story_id].viewers.merge(story.viewers)
             else:
                 self.stories[story_id] = Story.model_construct(
-                    timestamp=story.taken_at, viewers=story.viewers
+                    timestamp=story.taken_at,
+                    viewers=Viewers.of(story.viewers, self._names),
                 )
-
         self.dump(fetched_stories.username, fetched_stories.id)
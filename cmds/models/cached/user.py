@@ -1,20 +1,118 @@
 from __future__ import annotations
 
-from copy import deepcopy
-from datetime import date, datetime
-from typing import ClassVar, Iterable, Optional, Protocol, Self
+import os
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableSequence
+from copy import copy, deepcopy
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from sqlite3 import Connection
+from time import time
+from typing import (
+    Any,
+    ClassVar,
+    Iterable,
+    Mapping,
+    Optional,
+    Protocol,
+    Self,
+    TypeVar,
+    cast,
+    overload,
+)
 
-from pydantic import BaseModel, Field, field_serializer
+from pydantic import (
+    BaseModel,
+    Field,
+    PrivateAttr,
+    SerializationInfo,
+    ValidationInfo,
+    field_serializer,
+    field_validator,
+)
 
-from ...utils.constants import CHANGES, LISTS, ListsType
+from ...utils import compression, database
+from ...utils.constants import (
+    CHANGES,
+    CHECKPOINT_INTERVAL,
+    CHECKPOINT_RATIO,
+    LISTS,
+    ChangesType,
+    ListsType,
+)
+from ...utils.filters import date_slice
+from ...utils.settings import Settings, StorageType
+from ...utils.tool_logger import logger
+from ...utils.uids import UIDMap, UsernameTable
 from .. import fetched, mixins
 from ..update import Update as UpdateContainer
+from ..update import UserUpdate
+from .binary import (
+    EntryRecord,
+    MappedUsers,
+    StateFile,
+    encode_state,
+    recorded_names,
+)
+from .index import ChangelogIndex
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
 
 
 class OutputUpdateCallback(Protocol):
     def __call__(self, list_name: ListsType, update: mixins.Update) -> None: ...
 
 
+def _plain_users(users: Mapping[int, str]) -> dict[int, str]:
+    # lists loaded from a binary file are looked up in place until copied
+    return users if isinstance(users, dict) else dict(users.items())
+
+
+def _serialize_users(
+    users: Mapping[int, str], info: SerializationInfo, named_at: Optional[float]
+) -> Any:
+    """In json the users of a current list whose name matches the shared `UsernameTable`
+    (as of `named_at`) are stored by their uid alone and the rest as `[uid, name]` pairs"""
+    if not info.mode_is_json():
+        return _plain_users(users)
+    table = UsernameTable.get()
+    names, previous = table.names, table.previous
+    return [
+        (
+            uid
+            if (names.get(uid) if uid not in previous else table.name_at(uid, named_at))
+            == username
+            else [uid, username]
+        )
+        for uid, username in users.items()
+    ]
+
+
+def _resolve_users(value: Any, renamed: set[int], missing: set[int]) -> Any:
+    """The counterpart of `_serialize_users`, the older mapping of uids to names is kept as is.
+    Users are given their latest name, the ones that were renamed or that are missing from
+    the table are collected to be named later on (see `User.settle_names`)"""
+    if not isinstance(value, list):
+        return value
+    table = UsernameTable.get()
+    names, previous = table.names, table.previous
+    users: dict[int, str] = {}
+    for item in value:
+        if isinstance(item, list):
+            users[item[0]] = item[1]
+            continue
+        username = names.get(item)
+        if username is None:
+            missing.add(item)
+            username = str(item)
+        elif item in previous:
+            renamed.add(item)
+        users[item] = username
+    return users
+
+
 class Update(mixins.Update, BaseModel):
     added: dict[int, str] = Field(default_factory=dict)
     removed: dict[int, str] = Field(default_factory=dict)
@@ -25,17 +123,507 @@ class ChangelogEntry(mixins.UserUpdate, BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now)
     followers: Update = Field(default_factory=Update)  # type: ignore[override]
     followings: Update = Field(default_factory=Update)  # type: ignore[override]
+    fingerprints: dict[ListsType, str] = Field(default_factory=dict)
+    gated: list[ListsType] = Field(default_factory=list)
 
     @field_serializer("timestamp")
     def serialize_timestamp(self, timestamp: datetime, _info):
         return timestamp.timestamp()
 
+    @classmethod
+    def blank(cls, timestamp: datetime) -> Self:
+        """An entry without any changes (built without going through the default factories)"""
+        return cls.model_construct(
+            timestamp=timestamp,
+            followers=Update.model_construct(added={}, removed={}, renamed={}),
+            followings=Update.model_construct(added={}, removed={}, renamed={}),
+            fingerprints={},
+            gated=[],
+        )
+
+    def add_change_row(
+        self,
+        list_name: ListsType,
+        change_type: ChangesType,
+        uid: int,
+        username: str,
+        old_username: Optional[str],
+    ) -> None:
+        update: Update = getattr(self, list_name)
+        if change_type == "renamed":
+            update.renamed[uid] = (old_username or "", username)
+            return
+        getattr(update, change_type)[uid] = username
+
+    def scan_rows(self) -> Iterable[tuple[ListsType, Optional[str], bool]]:
+        for list_name in LISTS:
+            fingerprint = self.fingerprints.get(list_name)
+            gated = list_name in self.gated
+            if fingerprint is not None or gated:
+                yield list_name, fingerprint, gated
+
+    def add_scan_row(
+        self, list_name: ListsType, fingerprint: Optional[str], gated: bool
+    ) -> None:
+        if fingerprint is not None:
+            self.fingerprints[list_name] = fingerprint
+        if gated:
+            self.gated.append(list_name)
+
+    @classmethod
+    def from_record(cls, record: EntryRecord) -> Self:
+        return cls.model_construct(
+            # the same as the timestamps validated out of json files
+            timestamp=datetime.fromtimestamp(record.timestamp, timezone.utc),
+            # mypy also matches the lists against the `_fields_set` parameter
+            **{  # type: ignore[arg-type]
+                list_name: Update.model_construct(
+                    added=added, removed=removed, renamed=renamed
+                )
+                for list_name, (added, removed, renamed) in record.updates.items()
+            },
+            fingerprints=record.fingerprints,
+            gated=record.gated,
+        )
+
+    def to_record(self) -> EntryRecord:
+        record = EntryRecord(
+            self.timestamp.timestamp(), {}, self.fingerprints, self.gated
+        )
+        for list_name in LISTS:
+            update: Update = getattr(self, list_name)
+            record.updates[list_name] = (update.added, update.removed, update.renamed)
+        return record
+
+
+class LazyList(MutableSequence[ModelType]):
+    """A list of models loaded from a (trusted) file whose items are kept as the json lines
+    they were read as (or their position in a binary file) until they are accessed, at which
+    point they are decoded (once). Slicing is lazy as well. Commands that only need
+    the current state never pay for going through years of history"""
+
+    model: ClassVar[type[BaseModel]]
+
+    def __init__(self, items: Iterable[ModelType | str | int] = ()):
+        self.items: list[ModelType | str | int] = list(items)
+
+    def entry(self, index: int) -> ModelType:
+        item = self.items[index]
+        if not isinstance(item, BaseModel):
+            item = self.items[index] = self.decode(item)
+        return cast(ModelType, item)
+
+    def decode(self, item: str | int) -> ModelType:
+        return cast(ModelType, self.model.model_validate_json(cast(str, item)))
+
+    @overload
+    def __getitem__(self, index: int) -> ModelType: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Self: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sliced = copy(self)
+            sliced.items = self.items[index]
+            return sliced
+        return self.entry(index)
+
+    def __setitem__(self, index, value) -> None:
+        self.items[index] = value
+
+    def __delitem__(self, index) -> None:
+        del self.items[index]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def insert(self, index: int, value: ModelType) -> None:
+        self.items.insert(index, value)
+
+    def scalar(self, index: int, key: str) -> Optional[float]:
+        """Reads a top level number of an item straight from its line if it wasn't
+        validated yet (only the items themselves have keys other than uids)"""
+        item = self.items[index]
+        if not isinstance(item, str):
+            return None
+        position = item.find(f'"{key}":')
+        if position < 0:
+            return None
+        number = _NUMBER.match(item, position + len(key) + 3)
+        return float(number[0]) if number is not None else None
+
+    def lines(self) -> Iterable[str]:
+        # json lines that were never accessed are written back as they were read
+        for index, item in enumerate(self.items):
+            yield item if isinstance(item, str) else self.entry(index).model_dump_json()
+
+
+class LazyChangelog(LazyList[ChangelogEntry]):
+    model = ChangelogEntry
+
+    def ordinals(self, start: int = 0) -> Iterable[int]:
+        """The ordinals of the dates of the entries from `start` onwards"""
+        for index in range(start, len(self.items)):
+            yield self.timestamp_of(index).date().toordinal()
+
+    def timestamp_of(self, index: int) -> datetime:
+        """The timestamp of an entry, read without decoding it (unless it already was)"""
+        timestamp = self.scalar(index, "timestamp")
+        if timestamp is None:
+            return self.entry(index).timestamp
+        return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class MappedChangelog(LazyChangelog):
+    """A changelog laid out in a binary state file, whose entries are decoded once accessed"""
+
+    def __init__(self, state: StateFile, items: Optional[Iterable] = None):
+        super().__init__(range(len(state.timestamps)) if items is None else items)
+        self.state = state
+
+    def decode(self, item: str | int) -> ChangelogEntry:
+        return ChangelogEntry.from_record(self.state.entry(cast(int, item)))
+
+    def scalar(self, index: int, key: str) -> Optional[float]:
+        item = self.items[index]
+        if key == "timestamp" and isinstance(item, int):
+            return self.state.timestamps[item]
+        return super().scalar(index, key)
+
+
+# the sections of a state file that follow the current state (see `User.serialize`)
+_CHECKPOINTS_HEAD = ',\n  "checkpoints": [\n'
+_CHANGELOG_HEAD = '],\n  "changelog": [\n'
+_TAIL = "]\n}\n"
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+
+
+def _lines(items: Iterable[BaseModel | str]) -> str:
+    lines = (
+        items.lines()
+        if isinstance(items, LazyList)
+        else (cast(BaseModel, item).model_dump_json() for item in items)
+    )
+    return "".join(f"{line},\n" for line in lines).removesuffix(",\n") + "\n"
+
+
+def _checkpoint_due(
+    entry_count: int, change_count: int, size: int, interval: int, ratio: float
+) -> bool:
+    # a checkpoint right after a single entry would only save replaying that entry
+    if entry_count < 2:
+        return False
+    # a checkpoint is a full copy of the lists (of `size` users), which only pays off
+    # once the changes it saves replaying outweigh it (or once there are too many
+    # entries to decode, however small they are)
+    return change_count >= size * ratio or entry_count >= interval
+
+
+class Checkpoint(BaseModel):
+    """A full copy of the followers/followings lists as they were right after
+    the first `index` changelog entries took place"""
+
+    index: int
+    followers: dict[int, str] = Field(default_factory=dict)
+    followings: dict[int, str] = Field(default_factory=dict)
+
+    @field_serializer("followers", "followings")
+    def serialize_users(self, users: Mapping[int, str], _info) -> dict[int, str]:
+        return _plain_users(users)
+
+
+class LazyCheckpoints(LazyList[Checkpoint]):
+    model = Checkpoint
+
+    def indices(self) -> list[int]:
+        indices: list[int] = []
+        for position in range(len(self.items)):
+            index = self.scalar(position, "index")
+            indices.append(int(index) if index is not None else self.entry(position).index)
+        return indices
+
+
+class MappedCheckpoints(LazyCheckpoints):
+    """The checkpoints laid out in a binary state file, whose lists are looked up in place"""
+
+    def __init__(self, state: StateFile, items: Optional[Iterable] = None):
+        super().__init__(
+            range(len(state.checkpoint_indices)) if items is None else items
+        )
+        self.state = state
+
+    def decode(self, item: str | int) -> Checkpoint:
+        return Checkpoint.model_construct(
+            index=self.state.checkpoint_indices[cast(int, item)],
+            # mypy also matches the lists against the `_fields_set` parameter
+            **self.state.checkpoint(cast(int, item)),  # type: ignore[arg-type]
+        )
+
+    def scalar(self, index: int, key: str) -> Optional[float]:
+        item = self.items[index]
+        if key == "index" and isinstance(item, int):
+            return self.state.checkpoint_indices[item]
+        return super().scalar(index, key)
+
 
 class User(mixins.User, mixins.Cached, BaseModel):
     subdir: ClassVar[str] = "state"
+    # the time the current lists are named as of (see `UsernameTable`), i.e. of the last entry
+    named_at: Optional[float] = None
     followers: dict[int, str] = Field(default_factory=dict)
     followings: dict[int, str] = Field(default_factory=dict)
     changelog: list[ChangelogEntry] = Field(default_factory=list)
+    checkpoints: list[Checkpoint] = Field(default_factory=list)
+    _dates: array = PrivateAttr(default_factory=lambda: array("l"))
+    _sorted_users: dict = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def decode(cls, text: str, trusted: bool) -> Self:
+        """Trusted files are split into their sections (see `serialize`) without decoding
+        the checkpoints and the changelog, whose items are only validated once accessed.
+        The current state is validated right away either way, since pydantic validates
+        json into `dict[int, str]` faster than it can be decoded and constructed"""
+        # the users to name once the whole state is validated, by list
+        context: dict[ListsType, tuple[set[int], set[int]]] = {}
+        if not trusted:
+            instance = cls.model_validate_json(text, context=context)
+            instance.settle_names(context)
+            return instance
+
+        checkpoints_start = text.rfind(_CHECKPOINTS_HEAD)
+        changelog_start = text.rfind(_CHANGELOG_HEAD)
+        instance = cls.model_validate_json(
+            f"{text[:checkpoints_start]}\n}}", context=context
+        )
+        # the lazy lists stand in for the lists of the fields (see `LazyList`)
+        instance.checkpoints = LazyCheckpoints(  # type: ignore[assignment]
+            line.rstrip(",")
+            for line in text[
+                checkpoints_start + len(_CHECKPOINTS_HEAD) : changelog_start
+            ].splitlines()
+            if line
+        )
+        instance.changelog = LazyChangelog(  # type: ignore[assignment]
+            line.rstrip(",")
+            for line in text[
+                changelog_start + len(_CHANGELOG_HEAD) : text.rfind(_TAIL)
+            ].splitlines()
+            if line
+        )
+        instance.settle_names(context)
+        return instance
+
+    def serialize(self) -> str:
+        """Lays out the checkpoints and then the changelog last, one item per line,
+        so that they can be split off the current state without decoding them"""
+        head = self.model_dump_json(indent=2, exclude={"changelog", "checkpoints"})
+        # the head ends with the closing brace of the object
+        return (
+            f"{head[:-2]}{_CHECKPOINTS_HEAD}{_lines(self.checkpoints)}"
+            f"{_CHANGELOG_HEAD}{_lines(self.changelog)}{_TAIL}"
+        )
+
+    @field_serializer("changelog", "checkpoints")
+    def serialize_lazy(self, items: list[BaseModel], _info):
+        return list(items)
+
+    @field_validator("followers", "followings", mode="before")
+    @classmethod
+    def resolve_users(cls, value: Any, info: ValidationInfo) -> Any:
+        renamed: set[int] = set()
+        missing: set[int] = set()
+        users = _resolve_users(value, renamed, missing)
+        if info.context is not None:
+            info.context[info.field_name] = renamed, missing
+        elif missing:
+            logger.warning(
+                f"{len(missing)} users are missing from the username table, "
+                "naming them by their uid"
+            )
+        return users
+
+    @field_serializer("named_at")
+    def serialize_named_at(self, _named_at: Optional[float], _info) -> Optional[float]:
+        return self.synced_at()
+
+    @field_serializer("followers", "followings")
+    def serialize_users(self, users: Mapping[int, str], info: SerializationInfo):
+        return _serialize_users(users, info, self.synced_at())
+
+    @classmethod
+    def binary_path_of(cls, uid: int) -> Path:
+        return cls.path_of(uid).with_suffix(".bin")
+
+    @classmethod
+    def is_stored(cls, uid: int, storage: Optional[StorageType] = None) -> bool:
+        if super().is_stored(uid, storage):
+            return True
+        return (storage or Settings.get().storage) == "json" and (
+            compression.find(cls.binary_path_of(uid)) is not None
+        )
+
+    @classmethod
+    def read_file(cls, uid: int) -> Optional[Self]:
+        """Loads the file of the state in whichever format (and codec) it was last written"""
+        found = compression.find(cls.binary_path_of(uid))
+        if found is None:
+            return super().read_file(uid)
+        path, codec = found
+        table = UsernameTable.get()
+        if codec == "none":
+            return cls.from_state_file(StateFile.open(path, table))
+        # compressed files can't be mapped, they're decompressed in memory instead
+        with compression.open_file(path, "rb", codec) as file:
+            return cls.from_state_file(StateFile(file.read(), table))
+
+    @classmethod
+    def from_state_file(cls, state: StateFile) -> Self:
+        """Nothing but the layout of the file is read up front, the lists (of the current
+        state and the checkpoints) are looked up in place and the changelog entries
+        are only decoded once accessed"""
+        return cls.model_construct(
+            # mypy also matches the lists against the `_fields_set` parameter
+            **state.lists(),  # type: ignore[arg-type]
+            changelog=MappedChangelog(state),
+            checkpoints=MappedCheckpoints(state),
+        )
+
+    def to_file(self, uid: int) -> None:
+        """Writes the state in the configured format (see `binary` for the compact one)
+        and codec, removing the files of any other"""
+        self.release_file()
+        self.share_names()
+        if Settings.get().state_format == "json":
+            super().to_file(uid)
+            compression.remove(self.binary_path_of(uid))
+            return
+
+        codec = Settings.get().codec
+        path = self.binary_path_of(uid)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        compressed_path = compression.path_with(path, codec)
+        temporary_path = compressed_path.with_name(f"{compressed_path.name}.tmp")
+        with compression.open_file(temporary_path, "wb", codec) as file:
+            file.write(self.encode())
+        # the previous file may still be mapped (e.g. by a checkout of this instance)
+        # so it's replaced rather than overwritten in place
+        os.replace(temporary_path, compressed_path)
+        compression.remove(path, keep=codec)
+        compression.remove(self.path_of(uid))
+        self.journal_path_of(uid).unlink(missing_ok=True)
+        logger.debug(
+            f"wrote binary state file of {compressed_path.stat().st_size} bytes"
+        )
+
+    def release_file(self) -> None:
+        """Decodes whatever is still looked up in place in a binary state file, so that
+        the instance no longer keeps it mapped (and it can be replaced or removed)"""
+        for list_name in LISTS:
+            users = getattr(self, list_name)
+            if isinstance(users, MappedUsers):
+                setattr(self, list_name, users.copy())
+        if isinstance(self.changelog, MappedChangelog):
+            self.changelog = list(self.changelog)
+        if isinstance(self.checkpoints, MappedCheckpoints):
+            self.checkpoints = [
+                Checkpoint.model_construct(
+                    index=checkpoint.index,
+                    **{
+                        list_name: dict(getattr(checkpoint, list_name).items())
+                        for list_name in LISTS
+                    },
+                )
+                for checkpoint in self.checkpoints
+            ]
+
+    def encode(self) -> bytes:
+        return encode_state(
+            {list_name: getattr(self, list_name) for list_name in LISTS},
+            (
+                (
+                    checkpoint.index,
+                    {list_name: getattr(checkpoint, list_name) for list_name in LISTS},
+                )
+                for checkpoint in self.checkpoints
+            ),
+            (entry.to_record() for entry in self.changelog),
+            UsernameTable.get(),
+        )
+
+    def share_names(self) -> None:
+        """Persists the names the current lists are about to refer to by uid alone
+        (see `UsernameTable`), including the ones it doesn't know about yet
+        (e.g. of states that were cached before it existed)"""
+        table = UsernameTable.get()
+        for list_name in LISTS:
+            table.record(getattr(self, list_name))
+        table.commit()
+
+    def timestamp_of(self, index: int) -> datetime:
+        if isinstance(self.changelog, LazyChangelog):
+            return self.changelog.timestamp_of(index)
+        return self.changelog[index].timestamp
+
+    def synced_at(self) -> Optional[float]:
+        """The time of the last changelog entry (if any)"""
+        if not self.changelog:
+            return None
+        if isinstance(self.changelog, LazyList):
+            timestamp = self.changelog.scalar(len(self.changelog) - 1, "timestamp")
+            if timestamp is not None:
+                return timestamp
+        return self.changelog[-1].timestamp.timestamp()
+
+    def settle_names(
+        self, unnamed: Mapping[ListsType, tuple[set[int], set[int]]]
+    ) -> None:
+        """Names the users of the current lists that were given their latest name when
+        validated (see `_resolve_users`): the renamed ones as of `named_at` (which is only
+        validated after the lists) and the ones missing from the shared table (e.g. if it
+        was lost) as they were last recorded in the history of the state"""
+        table = UsernameTable.get()
+        recorded: Optional[dict[int, str]] = None
+        for list_name, (renamed, missing) in unnamed.items():
+            users: dict[int, str] = getattr(self, list_name)
+            for uid in renamed:
+                users[uid] = cast(str, table.name_at(uid, self.named_at))
+            if not missing:
+                continue
+            if recorded is None:
+                logger.warning(
+                    "users are missing from the username table, "
+                    "naming them as last recorded in the changelog"
+                )
+                recorded = self.recorded_names()
+            for uid in missing:
+                if uid in recorded:
+                    users[uid] = recorded[uid]
+                else:
+                    logger.warning(f"{uid} has no name recorded anywhere, naming it by its uid")
+
+    def recorded_names(self) -> dict[int, str]:
+        """The names users were last recorded under in the latest checkpoint
+        and the changelog entries that followed it"""
+        start = self.checkpoint_indices()[-1] if self.checkpoints else 0
+        return recorded_names(
+            (
+                {list_name: getattr(self.checkpoints[-1], list_name) for list_name in LISTS}
+                if self.checkpoints
+                else None
+            ),
+            (entry.to_record() for entry in self.changelog[start:]),
+        )
+
+    def append(self, entry: BaseModel, username: str, uid: int):
+        if Settings.get().storage == "json":
+            UsernameTable.get().commit()
+        super().append(entry, username, uid)
+
+    def checkpoint_indices(self) -> list[int]:
+        if isinstance(self.checkpoints, LazyCheckpoints):
+            return self.checkpoints.indices()
+        return [checkpoint.index for checkpoint in self.checkpoints]
 
     def is_empty(self) -> bool:
         return not bool(self.followers or self.followings or self.changelog)
@@ -45,7 +633,9 @@ class User(mixins.User, mixins.Cached, BaseModel):
 
     def checkout(self, at: date, lists: Iterable[ListsType] = LISTS) -> Self:
         """Backtraces up to a specific point in time (specified by `at`) and
-        recovers the state of followers/followings
+        recovers the state of followers/followings.
+        Replaying starts from whichever checkpoint (or the current state) is
+        the closest to that point so that only a few entries need to be visited
 
         Args:
             at (date): The point to which history will be recovered,
@@ -56,32 +646,391 @@ class User(mixins.User, mixins.Cached, BaseModel):
         Returns:
             A new `CachedUser` instance containing the state at the point in time specified
         """
-        kwargs: dict[str, dict[int, str]] = {
-            list_name: getattr(self, list_name).copy() for list_name in lists
+        changelog_count = self.cut_index(at)
+        # the indices are read without validating every checkpoint
+        indices = self.checkpoint_indices()
+        position = min(
+            range(len(indices) + 1),
+            key=lambda position: abs(
+                (indices[position - 1] if position else len(self.changelog))
+                - changelog_count
+            ),
+        )
+        base: User | Checkpoint = self.checkpoints[position - 1] if position else self
+        base_index = self.index_of(base)
+        # copied (i.e. decoded if they were mapped) so that the result never shares them
+        kwargs: dict[ListsType, dict[int, str]] = {
+            list_name: getattr(base, list_name).copy() for list_name in lists
         }
-        changelog_count: int = len(self.changelog)
 
+        if base_index > changelog_count:
+            for log in reversed(self.changelog[changelog_count:base_index]):
+                log.revert(kwargs, lists)
+        else:
+            for log in self.changelog[base_index:changelog_count]:
+                log.apply(kwargs, lists)
+
+        return self.model_construct(
+            None,
+            **kwargs,
+            changelog=deepcopy(self.changelog[:changelog_count]),
+            checkpoints=self.checkpoints[: bisect_right(indices, changelog_count)],
+        )
+
+    @property
+    def dates(self) -> array:
+        """The ordinals of the dates of the changelog entries (sorted just like the changelog).
+        It is extended lazily whenever entries have been appended since the last access"""
+        if len(self._dates) > len(self.changelog):
+            self._dates = array("l")
+        if isinstance(self.changelog, LazyChangelog):
+            self._dates.extend(self.changelog.ordinals(len(self._dates)))
+        else:
+            self._dates.extend(
+                log.timestamp.date().toordinal()
+                for log in self.changelog[len(self._dates) :]
+            )
+        return self._dates
+
+    def cut_index(self, at: Optional[date]) -> int:
+        """The number of changelog entries that make up the state at `at`
+        (with `None` standing for the current state)"""
+        if at is None:
+            return len(self.changelog)
+        return bisect_left(self.dates, at.toordinal())
+
+    def index_of(self, point: User | Checkpoint) -> int:
+        if isinstance(point, Checkpoint):
+            return point.index
+        return len(self.changelog)
+
+    def fingerprint_of(self, list_name: ListsType) -> Optional[str]:
+        """The fingerprint of the first chunk of the list as it was last fetched"""
+        if not self.changelog:
+            return None
+        return self.changelog[-1].fingerprints.get(list_name)
+
+    def rescan_due(self, list_name: ListsType, interval: timedelta) -> bool:
+        """Whether the list hasn't been fully scanned (i.e. without being gated) for `interval`"""
+        for entry in reversed(self.changelog):
+            if list_name not in entry.gated:
+                return time() - entry.timestamp.timestamp() >= interval.total_seconds()
+        return True
+
+    def checkpoint_due(
+        self,
+        interval: int = CHECKPOINT_INTERVAL,
+        ratio: float = CHECKPOINT_RATIO,
+    ) -> bool:
+        """Tells whether enough entries (or changed users, relative to the size
+        of the lists) have accumulated since the last checkpoint for a new one to be taken"""
+        last_index = self.checkpoint_indices()[-1] if self.checkpoints else 0
+        return _checkpoint_due(
+            len(self.changelog) - last_index,
+            sum(log.change_count for log in self.changelog[last_index:]),
+            sum(len(getattr(self, list_name)) for list_name in LISTS),
+            interval,
+            ratio,
+        )
+
+    def rebuild_checkpoints(
+        self,
+        interval: int = CHECKPOINT_INTERVAL,
+        ratio: float = CHECKPOINT_RATIO,
+    ) -> int:
+        """Discards any existing checkpoints and takes new ones throughout the whole changelog
+
+        Args:
+            interval (int): The max number of entries between two checkpoints
+            ratio (float): The max number of changed users between two checkpoints
+                relative to the size of the lists
+        Returns:
+            The number of checkpoints taken
+        """
+        state: dict[ListsType, dict[int, str]] = {
+            list_name: getattr(self, list_name).copy() for list_name in LISTS
+        }
         for log in reversed(self.changelog):
-            if log.timestamp.date() < at:
-                break
+            log.revert(state)
+
+        self.checkpoints = []
+        last_index: int = 0
+        change_count: int = 0
+
+        for index, log in enumerate(self.changelog, 1):
+            log.apply(state)
+            change_count += log.change_count
+            size = sum(len(state[list_name]) for list_name in LISTS)
+            if not _checkpoint_due(index - last_index, change_count, size, interval, ratio):
+                continue
+            self.checkpoints.append(
+                Checkpoint.model_construct(
+                    index=index,
+                    # mypy also matches the lists against the `_fields_set` parameter
+                    **{  # type: ignore[arg-type]
+                        list_name: state[list_name].copy() for list_name in LISTS
+                    },
+                )
+            )
+            last_index = index
+            change_count = 0
+
+        return len(self.checkpoints)
+
+    @classmethod
+    def changelog_index(cls, username: str) -> ChangelogIndex:
+        """Gets the inverted index over the changelog of `username`. With the json storage
+        it is persisted next to the state file, otherwise it is only built in memory"""
+        uid = UIDMap.get().uid_of(username)
+        path = (
+            cls.index_path_of(uid)
+            if uid is not None and Settings.get().storage == "json"
+            else None
+        )
+        return ChangelogIndex.get(cls.get(username).changelog, path)
 
+    def updates_between(
+        self,
+        index: ChangelogIndex,
+        username: str,
+        from_date: Optional[date],
+        to_date: Optional[date],
+        lists: Iterable[ListsType] = LISTS,
+        changes: Iterable[ChangesType] = CHANGES,
+    ) -> UserUpdate:
+        """Equivalent to `self.checkout(to_date).updates_from(self.checkout(from_date))`
+        narrowed down to the users that have ever been named `username`,
+        but resolved through the changelog index instead of reconstructing both states
+
+        Args:
+            index (ChangelogIndex): The (up to date) index of the changelog
+            username (str): The username to look for
+            from_date (Optional[date]): The first point in history (`None` for the current state)
+            to_date (Optional[date]): The second point in history (`None` for the current state)
+        """
+        from_index = self.cut_index(from_date)
+        to_index = self.cut_index(to_date)
+        # iterated for every list and user
+        lists, changes = tuple(lists), set(changes)
+        result = UserUpdate(
+            **{
+                list_name: UpdateContainer(**{change_type: {} for change_type in changes})
+                for list_name in lists
+            }
+        )
+
+        for uid in index.uids_of(username):
             for list_name in lists:
-                update: Update = getattr(log, list_name)
-                state: dict[int, str] = kwargs[list_name]
+                old_name = self.name_at(index, uid, from_index, list_name)
+                new_name = self.name_at(index, uid, to_index, list_name)
+                if old_name == new_name:
+                    continue
+                update: UpdateContainer = getattr(result, list_name)
+                value: str | tuple[str, str]
+                if old_name is not None and new_name is not None:
+                    change_type, value = "renamed", (old_name, new_name)
+                elif new_name is not None:
+                    change_type, value = "added", new_name
+                elif old_name is not None:
+                    change_type, value = "removed", old_name
+                if change_type in changes:
+                    getattr(update, change_type)[uid] = value
+        return result
 
-                for uid in list(update.added.keys()):
-                    del state[uid]
+    def name_at(
+        self, index: ChangelogIndex, uid: int, point: int, list_name: ListsType
+    ) -> Optional[str]:
+        """The username `uid` had in a list right after the first `point` changelog entries
+        took place or `None` if it wasn't part of it"""
+        name: Optional[str] = None
+        for entry_index, posting_list, change_type in index.postings_of_uid(uid):
+            if entry_index >= point:
+                break
+            if posting_list != list_name:
+                continue
+            update: Update = getattr(self.changelog[entry_index], list_name)
+            if change_type == "added":
+                name = update.added[uid]
+            elif change_type == "removed":
+                name = None
+            else:
+                name = update.renamed[uid][1]
+        return name
 
-                state |= update.removed
+    @classmethod
+    def history(
+        cls,
+        username: str,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        mention: Optional[str] = None,
+    ) -> Iterable[ChangelogEntry]:
+        """Selects the changelog entries (from most recent to oldest) within a range of dates.
+        With the sqlite storage this is answered through the indexes and if `mention` is
+        specified, only the changes involving that username are loaded
 
-                for uid, (old_name, _) in update.renamed.items():
-                    state[uid] = old_name
-            changelog_count -= 1
+        Args:
+            username (str): The user whose changelog is queried
+            from_date (Optional[date]): The (inclusive) start of the range
+            to_date (Optional[date]): The (inclusive) end of the range
+            mention (Optional[str]): A hint that only changes involving this username are needed
+        """
+        if Settings.get().storage != "sqlite":
+            cached_user = cls.get(username)
+            selection = date_slice(from_date, to_date, cached_user.dates)
+            if mention is None:
+                return reversed(cached_user.changelog[selection])
+            return reversed(
+                cls.changelog_index(username).project(
+                    cached_user.changelog,
+                    mention,
+                    lambda position: ChangelogEntry.blank(
+                        cached_user.timestamp_of(position)
+                    ),
+                    selection,
+                )
+            )
+        uid = UIDMap.get().uid_of(username)
+        if uid is None:
+            return ()
+        return reversed(
+            cls.changelog_from_database(
+                database.connect(), uid, *database.date_range(from_date, to_date), mention
+            )
+        )
 
-        return self.model_construct(
-            None,
-            **kwargs,
-            changelog=deepcopy(self.changelog[:changelog_count]),
+    @classmethod
+    def from_database(cls, connection: Connection, uid: int) -> Optional[Self]:
+        if not cls.is_stored(uid, "sqlite"):
+            return None
+
+        lists: dict[ListsType, dict[int, str]] = {list_name: {} for list_name in LISTS}
+        for list_name, member, username in connection.execute(
+            "SELECT list, uid, username FROM members WHERE owner = ? ORDER BY rowid",
+            (uid,),
+        ):
+            lists[list_name][member] = username
+
+        checkpoints: dict[int, Checkpoint] = {}
+        for index, list_name, member, username in connection.execute(
+            "SELECT idx, list, uid, username FROM checkpoints "
+            "WHERE owner = ? ORDER BY rowid",
+            (uid,),
+        ):
+            if index not in checkpoints:
+                checkpoints[index] = Checkpoint.model_construct(
+                    index=index, followers={}, followings={}
+                )
+            getattr(checkpoints[index], list_name)[member] = username
+
+        return cls.model_construct(
+            # mypy also matches the lists against the `_fields_set` parameter
+            **lists,  # type: ignore[arg-type]
+            changelog=cls.changelog_from_database(connection, uid),
+            checkpoints=list(checkpoints.values()),
+        )
+
+    @staticmethod
+    def changelog_from_database(
+        connection: Connection,
+        uid: int,
+        start: float = float("-inf"),
+        end: float = float("inf"),
+        mention: Optional[str] = None,
+    ) -> list[ChangelogEntry]:
+        entries: dict[int, ChangelogEntry] = {
+            entry_id: ChangelogEntry.model_construct(
+                timestamp=database.to_datetime(timestamp)
+            )
+            for entry_id, timestamp in connection.execute(
+                "SELECT id, timestamp FROM entries "
+                "WHERE owner = ? AND timestamp >= ? AND timestamp < ? ORDER BY id",
+                (uid, start, end),
+            )
+        }
+        for entry_id, *row in connection.execute(
+            "SELECT s.entry, s.list, s.fingerprint, s.gated "
+            "FROM scans s JOIN entries e ON e.id = s.entry "
+            "WHERE e.owner = ? AND e.timestamp >= ? AND e.timestamp < ? ORDER BY s.rowid",
+            (uid, start, end),
+        ):
+            entries[entry_id].add_scan_row(*row)
+        query = (
+            "SELECT c.entry, c.list, c.change, c.uid, c.username, c.old_username "
+            "FROM changes c JOIN entries e ON e.id = c.entry "
+            "WHERE e.owner = ? AND e.timestamp >= ? AND e.timestamp < ?"
+        )
+        params: tuple = (uid, start, end)
+        if mention is not None:
+            query += " AND (c.username = ? OR c.old_username = ?)"
+            params += (mention, mention)
+
+        for entry_id, *row in connection.execute(f"{query} ORDER BY c.rowid", params):
+            entries[entry_id].add_change_row(*row)
+        return list(entries.values())
+
+    def to_database(self, connection: Connection, uid: int) -> None:
+        for table in ("members", "entries", "checkpoints"):
+            connection.execute(f"DELETE FROM {table} WHERE owner = ?", (uid,))
+
+        connection.executemany(
+            "INSERT INTO members (owner, list, uid, username) VALUES (?, ?, ?, ?)",
+            (
+                (uid, list_name, member, username)
+                for list_name in LISTS
+                for member, username in getattr(self, list_name).items()
+            ),
+        )
+        for entry in self.changelog:
+            self.insert_entry(connection, entry, uid)
+        connection.executemany(
+            "INSERT INTO checkpoints (owner, idx, list, uid, username) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (uid, checkpoint.index, list_name, member, username)
+                for checkpoint in self.checkpoints
+                for list_name in LISTS
+                for member, username in getattr(checkpoint, list_name).items()
+            ),
+        )
+
+    def append_to_database(
+        self, connection: Connection, entry: ChangelogEntry, uid: int  # type: ignore[override]
+    ) -> None:
+        self.insert_entry(connection, entry, uid)
+
+        for list_name, change_type, member, username, _ in entry.change_rows():
+            if change_type == "removed":
+                connection.execute(
+                    "DELETE FROM members WHERE owner = ? AND list = ? AND uid = ?",
+                    (uid, list_name, member),
+                )
+            elif change_type == "added":
+                connection.execute(
+                    "INSERT INTO members (owner, list, uid, username) VALUES (?, ?, ?, ?)",
+                    (uid, list_name, member, username),
+                )
+            else:
+                connection.execute(
+                    "UPDATE members SET username = ? "
+                    "WHERE owner = ? AND list = ? AND uid = ?",
+                    (username, uid, list_name, member),
+                )
+
+    @staticmethod
+    def insert_entry(connection: Connection, entry: ChangelogEntry, uid: int) -> None:
+        entry_id = connection.execute(
+            "INSERT INTO entries (owner, timestamp) VALUES (?, ?)",
+            (uid, entry.timestamp.timestamp()),
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO changes (entry, list, change, uid, username, old_username) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((entry_id, *row) for row in entry.change_rows()),
+        )
+        connection.executemany(
+            "INSERT INTO scans (entry, list, fingerprint, gated) VALUES (?, ?, ?, ?)",
+            ((entry_id, *row) for row in entry.scan_rows()),
         )
 
     def dump_update(
@@ -91,14 +1040,17 @@ class User(mixins.User, mixins.Cached, BaseModel):
     ) -> None:
         """Creates a new changelog entry by comparing the dynamically fetched state
         with the latest cached one. It will include users with added/removed/renamed updates
-        and will proceed to back it up in a file
+        and will proceed to back it up in a file. Usually the entry is just appended
+        to the journal, the whole file is only rewritten when a checkpoint is taken
 
         Args:
             fetched_user (fetched.User): The dynamically fetched state to use (should not be empty)
             callback (Optional[OutputUpdateCallback]): An optional callback that will be called
                 (if provided) for every list providing it with the list name as well as the changes
                 as keyword arguments. Can be used for printing the result."""
-        entry = ChangelogEntry()
+        entry = ChangelogEntry(
+            fingerprints=fetched_user.fingerprints, gated=fetched_user.gated
+        )
 
         for list_name in LISTS:
             update: Update = getattr(entry, list_name)
@@ -120,15 +1072,46 @@ class User(mixins.User, mixins.Cached, BaseModel):
         if fetched_user.follower_count != len(
             fetched_user.followers
         ) or fetched_user.following_count != len(fetched_user.followings):
-            if (
-                input(
-                    "not all the requested users were fetched, should the result be cached regardless? (Y/n) "
-                ).strip()
-                != "Y"
+            if not Settings.get().retry.commit_partial(
+                "not all the requested users were fetched, should the result be cached regardless?"
             ):
                 return
 
         self.followers = fetched_user.followers
         self.followings = fetched_user.followings
         self.changelog.append(entry)
-        self.dump(fetched_user.username, fetched_user.id)
+        if Settings.get().storage == "json":
+            # renames are recorded once for every state that refers to the user
+            for list_name in LISTS:
+                UsernameTable.get().record(
+                    getattr(self, list_name), entry.timestamp.timestamp()
+                )
+
+        if self.checkpoint_due():
+            self.checkpoints.append(
+                Checkpoint.model_construct(
+                    index=len(self.changelog),
+                    followers=self.followers.copy(),
+                    followings=self.followings.copy(),
+                )
+            )
+            self.dump(fetched_user.username, fetched_user.id)
+        elif self.is_stored(fetched_user.id):
+            self.append(entry, fetched_user.username, fetched_user.id)
+        else:
+            self.dump(fetched_user.username, fetched_user.id)
+
+        if Settings.get().storage == "json":
+            ChangelogIndex.journal(
+                entry, len(self.changelog) - 1, self.index_path_of(fetched_user.id)
+            )
+
+    def replay(self, line: str) -> None:
+        entry = ChangelogEntry.model_validate_json(line)
+        # the lists of a binary file are read only, they are decoded to be replayed on
+        for list_name in LISTS:
+            users = getattr(self, list_name)
+            if isinstance(users, MappedUsers):
+                setattr(self, list_name, users.copy())
+        self.apply(entry)
+        self.changelog.append(entry)
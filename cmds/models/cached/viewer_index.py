@@ -0,0 +1,203 @@
+"""A persisted index over the viewers of a story history (json storage), in the layout
+of `binary` and read through a memory map as well.
+
+The stories are listed once along with how many of their records are covered, the postings
+of every name id (see `Names`) and of every uid are the story numbers and positions of the
+records that have it, grouped by key in the order the records were stored in. Syncs only
+ever append records so they don't write the index: lookups scan whatever follows the
+covered records of each story and the index is rebuilt once those become too many."""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator, Mapping, Sequence
+from itertools import repeat
+from pathlib import Path
+from typing import Literal, Optional
+
+from ...utils import vectorized
+from ...utils.tool_logger import logger
+from ..viewer import Viewers
+from .binary import read_arrays, write_array
+
+MAGIC = b"ISVI"
+VERSION = 1
+
+_HEADER = struct.Struct("=4sI")
+# the covered stories (ids and record counts), then the offsets, story numbers and
+# positions of the postings of the name ids and of the (sorted) uids
+_TYPECODES = "qIQIIqQII"
+# the share of uncovered records (to the covered ones) past which the index is rebuilt
+STALE_RATIO = 0.25
+
+
+class ViewerIndex:
+    """The arrays of an index file, looked up in place (an empty index covers nothing)"""
+
+    def __init__(self, data: bytes | mmap.mmap = b""):
+        if data:
+            magic, version = _HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"not a viewer index (version {version})")
+            arrays, _ = read_arrays(memoryview(data), _HEADER.size, _TYPECODES)
+        else:
+            arrays = [array(typecode) for typecode in _TYPECODES]
+        (
+            self.story_ids,
+            self.counts,
+            self.name_offsets,
+            self.name_stories,
+            self.name_positions,
+            self.uids,
+            self.uid_offsets,
+            self.uid_stories,
+            self.uid_positions,
+        ) = arrays
+        self.covered: dict[int, int] = dict(zip(self.story_ids, self.counts))
+
+    @classmethod
+    def get(cls, path: Path, stories: Mapping[int, Viewers]) -> ViewerIndex:
+        """Opens the index at `path`, which is rebuilt (and written) if it's missing,
+        no longer matches the stories or too many of their records are past it"""
+        index = cls.open(path)
+        if index is not None and index.matches(stories):
+            return index
+        data = encode_index(stories)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(f"{path.name}.tmp")
+        with open(temporary_path, "wb") as file:
+            file.write(data)
+        # the previous file is unmapped once `index` is released
+        index = None
+        os.replace(temporary_path, path)
+        logger.debug(f"wrote viewer index of {len(data)} bytes")
+        return cls(data)
+
+    @classmethod
+    def open(cls, path: Path) -> Optional[ViewerIndex]:
+        """Maps the file (see `StateFile.open`), if it exists and is readable"""
+        try:
+            with open(path, "rb") as file:
+                if os.name == "nt":
+                    return cls(file.read())
+                return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"ignoring the unreadable viewer index {path}: {e}")
+            return None
+
+    def matches(self, stories: Mapping[int, Viewers]) -> bool:
+        """Whether the covered records are still those of the stories and the records
+        past them don't exceed `STALE_RATIO` of them"""
+        for sid, count in self.covered.items():
+            if sid not in stories or len(stories[sid]) < count:
+                return False
+        covered = sum(self.covered.values())
+        uncovered = sum(len(viewers) for viewers in stories.values()) - covered
+        return uncovered <= covered * STALE_RATIO
+
+    def postings(
+        self, field: Literal["uids", "name_ids"], value: int
+    ) -> Iterator[tuple[int, int]]:
+        """The story ids and positions of the covered records whose uid (or name id) is `value`"""
+        if field == "name_ids":
+            offsets, numbers, positions = (
+                self.name_offsets,
+                self.name_stories,
+                self.name_positions,
+            )
+            key = value if 0 <= value < len(offsets) - 1 else None
+        else:
+            offsets, numbers, positions = (
+                self.uid_offsets,
+                self.uid_stories,
+                self.uid_positions,
+            )
+            key = bisect_left(self.uids, value)
+            if key == len(self.uids) or self.uids[key] != value:
+                key = None
+        if key is None:
+            return
+        for posting in range(offsets[key], offsets[key + 1]):
+            yield self.story_ids[numbers[posting]], positions[posting]
+
+    def find(
+        self,
+        stories: Mapping[int, Viewers],
+        field: Literal["uids", "name_ids"],
+        value: int,
+    ) -> dict[int, int]:
+        """The position of the first record whose uid (or name id) is `value` in each of
+        `stories` that has one, through the postings and then by scanning the records
+        the index doesn't cover"""
+        found: dict[int, int] = {}
+        for sid, position in self.postings(field, value):
+            viewers = stories.get(sid)
+            if (
+                viewers is not None
+                and sid not in found
+                and position < len(viewers)
+                and getattr(viewers, field)[position] == value
+            ):
+                found[sid] = position
+        for sid, viewers in stories.items():
+            if sid not in found:
+                scanned = viewers.find(field, value, self.covered.get(sid, 0))
+                if scanned is not None:
+                    found[sid] = scanned
+        return found
+
+
+def encode_index(stories: Mapping[int, Viewers]) -> bytes:
+    story_ids = list(stories)
+    numbers = array("I")
+    positions = array("I")
+    name_ids = array("l")
+    uids = array("q")
+    for number, sid in enumerate(story_ids):
+        viewers = stories[sid]
+        numbers.extend(repeat(number, len(viewers)))
+        positions.extend(range(len(viewers)))
+        name_ids.extend(viewers.name_ids)
+        uids.extend(viewers.uids)
+
+    data = bytearray(_HEADER.pack(MAGIC, VERSION))
+    write_array(data, "q", story_ids)
+    write_array(data, "I", (len(stories[sid]) for sid in story_ids))
+    name_count = max(name_ids, default=-1) + 1
+    _write_postings(data, name_ids, range(name_count), numbers, positions)
+    distinct_uids = sorted(set(uids))
+    write_array(data, "q", distinct_uids)
+    _write_postings(data, uids, distinct_uids, numbers, positions)
+    return bytes(data)
+
+
+def grouped(
+    keys: array, distinct: Sequence[int], *columns: array
+) -> tuple[list[int], list[list[int]]]:
+    """Sorts the (parallel) `columns` by `keys`, keeping the order of the equal ones,
+    returning them along with the offset each of the `distinct` keys starts at"""
+    if vectorized.enabled(keys):
+        return vectorized.grouped(keys, distinct, *columns)
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    sorted_keys = [keys[posting] for posting in order]
+    offsets = [bisect_left(sorted_keys, key) for key in distinct]
+    return offsets, [[column[posting] for posting in order] for column in columns]
+
+
+def _write_postings(
+    data: bytearray,
+    keys: array,
+    distinct: Sequence[int],
+    numbers: array,
+    positions: array,
+) -> None:
+    offsets, columns = grouped(keys, distinct, numbers, positions)
+    write_array(data, "Q", [*offsets, len(keys)])
+    for column in columns:
+        write_array(data, "I", column)
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from ...utils.constants import DATE_OUTPUT_FORMAT
-from ...utils.scrapping import Scrapper
+from ...utils.scrapping import KnownViewers, Scrapper
 from ...utils.tool_logger import logger
 from .. import mixins
 from ..viewer import Viewer
@@ -14,6 +15,8 @@ if TYPE_CHECKING:
     from instagrapi import Client
     from instagrapi.types import Story as InstaStory
 
+    from .. import cached
+
 
 @dataclass
 class Story(mixins.Story):
@@ -22,13 +25,54 @@ class Story(mixins.Story):
     taken_at: datetime
     viewers: dict[int, Viewer]
 
-    @classmethod
-    def fetch(cls, story: InstaStory, client: Client, chunk_size: int):
-        scrapper = Scrapper(client=client, target_id=story.pk, chunk_size=chunk_size)
+    @staticmethod
+    def scrapper_of(
+        story: InstaStory,
+        client: Client,
+        chunk_size: int,
+        known: Optional[cached.Story] = None,
+        match_run: Optional[int] = None,
+    ) -> Scrapper:
         logger.info(
             f"fetching viewers from story at: {story.taken_at.strftime(DATE_OUTPUT_FORMAT)}"
         )
-        viewers: dict[int, str] = scrapper.fetch_story_viewers()
+        return Scrapper(
+            client=client,
+            target_id=story.pk,
+            chunk_size=chunk_size,
+            stop=(
+                KnownViewers(known.viewers.keys(), match_run)
+                if known is not None and match_run is not None
+                else None
+            ),
+        )
+
+    @classmethod
+    def fetch(
+        cls,
+        story: InstaStory,
+        client: Client,
+        chunk_size: int,
+        known: Optional[cached.Story] = None,
+        match_run: Optional[int] = None,
+    ):
+        scrapper = cls.scrapper_of(story, client, chunk_size, known, match_run)
+        return cls.from_viewers(story, scrapper.fetch_story_viewers())
+
+    @classmethod
+    async def fetch_async(
+        cls,
+        story: InstaStory,
+        client: Client,
+        chunk_size: int,
+        known: Optional[cached.Story] = None,
+        match_run: Optional[int] = None,
+    ):
+        scrapper = cls.scrapper_of(story, client, chunk_size, known, match_run)
+        return cls.from_viewers(story, await scrapper.fetch_story_viewers_async())
+
+    @classmethod
+    def from_viewers(cls, story: InstaStory, viewers: dict[int, str]):
         logger.info(f"fetched viewers, total count: {len(viewers)}")
         return cls(
             taken_at=story.taken_at,
@@ -46,7 +90,21 @@ class Stories:
     stories: dict[int, Story] = field(default_factory=dict)
 
     @classmethod
-    def fetch(cls, client: Client, target_username: str, chunk_size: int = 100):
+    def fetch(
+        cls,
+        client: Client,
+        target_username: str,
+        chunk_size: int = 100,
+        concurrent: Optional[int] = None,
+        known: Optional[cached.StoryHistory] = None,
+        match_run: Optional[int] = None,
+    ):
+        """Fetches the viewers of every active story, of up to `concurrent` stories at once if set.
+        Concurrent scraps still share the client, whose rate limit paces them and which makes
+        their requests one at a time (so only the waits overlap). Given the `known` (i.e. cached)
+        stories and a `match_run`, the viewers of a story stop being fetched once that many
+        consecutive ones were already recorded (see `KnownViewers`), in which case
+        the fetched viewers are only the new ones (and a few known)"""
         logger.info(f"fetching user id and stories info of: {target_username}")
         uid: str = client.user_id_from_username(target_username)
         stories = client.user_stories(uid)
@@ -56,15 +114,58 @@ class Stories:
             return cls(username=target_username, id=int(uid))
 
         logger.info("fetched stories info, proceeding with fetching viewers...")
+        known_stories = known.stories if known is not None else {}
+
+        if concurrent is not None:
+            return cls(
+                username=target_username,
+                id=int(uid),
+                stories=asyncio.run(
+                    cls.fetch_stories(
+                        stories,
+                        client,
+                        chunk_size,
+                        concurrent,
+                        known_stories,
+                        match_run,
+                    )
+                ),
+            )
 
         return cls(
             username=target_username,
             id=int(uid),
             stories={
-                int(story.pk): Story.fetch(story, client, chunk_size)
+                int(story.pk): Story.fetch(
+                    story,
+                    client,
+                    chunk_size,
+                    known_stories.get(int(story.pk)),
+                    match_run,
+                )
                 for story in stories
             },
         )
 
+    @staticmethod
+    async def fetch_stories(
+        stories: list[InstaStory],
+        client: Client,
+        chunk_size: int,
+        limit: int,
+        known: dict[int, cached.Story],
+        match_run: Optional[int] = None,
+    ) -> dict[int, Story]:
+        semaphore = asyncio.Semaphore(max(limit, 1))
+
+        async def fetch(story: InstaStory) -> Story:
+            async with semaphore:
+                return await Story.fetch_async(
+                    story, client, chunk_size, known.get(int(story.pk)), match_run
+                )
+
+        results = await asyncio.gather(*(fetch(story) for story in stories))
+        return {int(story.pk): result for story, result in zip(stories, results)}
+
     def __iter__(self):
         return iter(self.stories.items())
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, Self
+from datetime import timedelta
+from typing import TYPE_CHECKING, Optional, Self
 
 from ...utils.constants import LISTS, ListsType
-from ...utils.scrapping import Scrapper
+from ...utils.scrapping import IncrementalScan, ListGate, Scrapper, StopHook
 from ...utils.tool_logger import logger
 from .. import mixins
 
 if TYPE_CHECKING:
     from instagrapi import Client
 
+    from .. import cached
+
 
 @dataclass
 class User(mixins.User):
@@ -20,6 +24,11 @@ class User(mixins.User):
     followings: dict[int, str] = field(default_factory=dict)
     follower_count: int = 0
     following_count: int = 0
+    fingerprints: dict[ListsType, str] = field(default_factory=dict)
+    gated: list[ListsType] = field(default_factory=list)
+    _sorted_users: dict = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
     @classmethod
     def fetch(
@@ -27,29 +36,84 @@ class User(mixins.User):
         client: Client,
         username: str,
         chunk_size: int = 100,
+        concurrent: bool = False,
+        known: Optional[cached.User] = None,
+        match_run: Optional[int] = None,
+        rescan: Optional[timedelta] = None,
     ) -> Self:
+        """Fetches the profile info and both lists of a user. Given the `known` (i.e. cached)
+        state, the first chunk of each list is fingerprinted and:
+        - if `rescan` is set, a list is gated (i.e. the rest of it is skipped and it's taken
+          from cache) when its count and fingerprint match the cached ones, unless it hasn't
+          been fully scanned for that long
+        - if `match_run` is set, a list is scanned incrementally, i.e. it stops once that
+          many consecutive users match the cached list and infers the rest from it"""
         logger.info(f"fetching profile info of: {username}")
         target = client.user_info_by_username_v1(username)
-        container: dict[ListsType, dict[int, str]] = {}
+        scrappers: dict[ListsType, Scrapper] = {}
+        gates: dict[ListsType, ListGate] = {}
 
         for list_name in LISTS:
             count: int = getattr(target, f"{list_name[:-1]}_count")
-            scrapper = Scrapper(
+            stop: Optional[StopHook] = None
+            if known is not None:
+                known_list: dict[int, str] = getattr(known, list_name)
+                if match_run is not None:
+                    stop = IncrementalScan(known_list, count, match_run)
+                stop = gates[list_name] = ListGate(
+                    known_list,
+                    count,
+                    known.fingerprint_of(list_name),
+                    rescan is not None and not known.rescan_due(list_name, rescan),
+                    stop,
+                )
+            scrappers[list_name] = Scrapper(
                 client=client,
                 target_id=target.pk,
                 user_count=count,
                 chunk_size=chunk_size,
+                stop=stop,
+            )
+        container: dict[ListsType, dict[int, str]] = {}
+
+        if concurrent:
+            logger.info(
+                f"fetching {' and '.join(LISTS)} concurrently, total counts: "
+                f"{target.follower_count} and {target.following_count}"
             )
-            logger.info(f"fetching {list_name}, total count: {count}")
-            user_list: dict[int, str] = getattr(scrapper, f"fetch_{list_name}")()
-            container[list_name] = user_list
+            container = asyncio.run(cls.fetch_lists(scrappers))
+            for list_name, user_list in container.items():
+                logger.info(f"fetched {list_name}, total count: {len(user_list)}")
+        else:
+            for list_name, scrapper in scrappers.items():
+                logger.info(f"fetching {list_name}, total count: {scrapper.user_count}")
+                user_list = getattr(scrapper, f"fetch_{list_name}")()
+                container[list_name] = user_list
 
-            logger.info(f"fetched {list_name}, total count: {len(user_list)}")
+                logger.info(f"fetched {list_name}, total count: {len(user_list)}")
 
         return cls(
             username=target.username,
             id=int(target.pk),
             follower_count=target.follower_count,
             following_count=target.following_count,
+            fingerprints={
+                list_name: gate.fingerprint
+                for list_name, gate in gates.items()
+                if gate.fingerprint is not None
+            },
+            gated=[list_name for list_name, gate in gates.items() if gate.gated],
             **container,
         )
+
+    @staticmethod
+    async def fetch_lists(
+        scrappers: dict[ListsType, Scrapper],
+    ) -> dict[ListsType, dict[int, str]]:
+        results = await asyncio.gather(
+            *(
+                getattr(scrapper, f"fetch_{list_name}_async")()
+                for list_name, scrapper in scrappers.items()
+            )
+        )
+        return dict(zip(scrappers, results))
@@ -1,14 +1,74 @@
-from typing import Any, ClassVar, Self
+from __future__ import annotations
 
+import re
+import zlib
+from pathlib import Path
+from sqlite3 import Connection
+from typing import Any, ClassVar, Iterable, Optional, Self
+
+from pydantic import BaseModel, ValidationError
+
+from ...utils import compression, database
 from ...utils.constants import CACHE_FOLDER
+from ...utils.settings import Settings, StorageType
 from ...utils.tool_logger import logger
 from ...utils.uids import UIDMap
 
 _cached: dict[tuple[str, int], Any] = {}
+# the first line of the files written by the tool, which takes the place of the opening brace
+_HEADER = re.compile(r'\{"format": \{"version": (\d+), "checksum": "([0-9a-f]{8})"\},')
 
 
 class Cached:
+    """Provides loading/storing of a record (one per user) through whichever
+    storage backend is configured. With the `json` backend each record is a separate file
+    (plus an optional journal) under `subdir`, while with `sqlite` everything lives in a single
+    database and subclasses provide the mapping through `from_database`/`to_database`"""
+
     subdir: ClassVar[str] = ""
+    # bumped whenever the layout that `decode` relies on for trusted files changes
+    format_version: ClassVar[int] = 1
+
+    @classmethod
+    def path_of(cls, uid: int) -> Path:
+        return CACHE_FOLDER / cls.subdir / f"{uid}.json"
+
+    @classmethod
+    def index_path_of(cls, uid: int) -> Path:
+        return CACHE_FOLDER / cls.subdir / f"{uid}.index.json"
+
+    @classmethod
+    def journal_path_of(cls, uid: int) -> Path:
+        return CACHE_FOLDER / cls.subdir / f"{uid}.jsonl"
+
+    @classmethod
+    def is_stored(cls, uid: int, storage: Optional[StorageType] = None) -> bool:
+        if (storage or Settings.get().storage) == "sqlite":
+            row = (
+                database.connect()
+                .execute(
+                    "SELECT 1 FROM records WHERE owner = ? AND kind = ?",
+                    (uid, cls.subdir),
+                )
+                .fetchone()
+            )
+            return row is not None
+        return compression.find(cls.path_of(uid)) is not None
+
+    @classmethod
+    def tracked(cls, storage: Optional[StorageType] = None) -> dict[int, str]:
+        """Maps the id of every user that has a record of this kind
+        to the most recent username it was recorded with"""
+        return {
+            uid: username
+            for username, uid in UIDMap.get().table.items()
+            if cls.is_stored(uid, storage)
+        }
+
+    @classmethod
+    def exists(cls, username: str) -> bool:
+        uid = UIDMap.get().uid_of(username)
+        return uid is not None and cls.is_stored(uid)
 
     @classmethod
     def get(cls, username: str) -> Self:
@@ -19,18 +79,157 @@ class Cached:
         if uid is None:
             return _cached.setdefault(key, cls())
 
-        path = CACHE_FOLDER / cls.subdir / f"{uid}.json"
-        if not path.is_file():
-            return _cached.setdefault(key, cls())
+        instance = cls.load(uid)
+        return _cached.setdefault(key, instance if instance is not None else cls())
 
-        with open(path, encoding="utf-8") as file:
-            return _cached.setdefault(key, cls.model_validate_json(file.read()))
+    @classmethod
+    def load(cls, uid: int, storage: Optional[StorageType] = None) -> Optional[Self]:
+        if (storage or Settings.get().storage) == "sqlite":
+            return cls.from_database(database.connect(), uid)
+        return cls.from_file(uid)
+
+    @classmethod
+    def from_file(cls, uid: int) -> Optional[Self]:
+        instance = cls.read_file(uid)
+        if instance is None:
+            return None
 
-    def dump(self, username: str, uid: int):
-        target_dir = CACHE_FOLDER / self.__class__.subdir
-        target_dir.mkdir(parents=True, exist_ok=True)
-        with open(target_dir / f"{uid}.json", "w", encoding="utf-8") as file:
-            file.write(self.model_dump_json(indent=2))
+        journal_path = cls.journal_path_of(uid)
+        if journal_path.is_file():
+            with open(journal_path, encoding="utf-8") as file:
+                instance.replay_journal(file)
+        return instance
+
+    @classmethod
+    def read_file(cls, uid: int) -> Optional[Self]:
+        """Loads the base file of the record (i.e. without its journal)
+        whichever codec it was written with"""
+        found = compression.find(cls.path_of(uid))
+        if found is None:
+            return None
+        with compression.open_file(found[0], "rt", found[1]) as file:
+            return cls.parse(file.read())
+
+    @classmethod
+    def parse(cls, text: str) -> Self:
+        """Loads a record from the contents of its file. Files whose header (as written by
+        `to_file`) carries the current format version and the checksum of the rest of
+        the file are trusted to be exactly as the tool wrote them, anything else
+        (older or hand edited files) goes through full validation"""
+        header_end = text.find("\n")
+        header = _HEADER.fullmatch(text, 0, header_end)
+        if header is None:
+            return cls.decode(text, trusted=False)
+
+        body = f"{{{text[header_end:]}"
+        version, checksum = int(header[1]), header[2]
+        if version != cls.format_version or checksum != _checksum(body):
+            logger.debug(f"untrusted {cls.__name__} file, validating it")
+            return cls.decode(body, trusted=False)
+        return cls.decode(body, trusted=True)
+
+    @classmethod
+    def decode(cls, text: str, trusted: bool) -> Self:
+        """Builds a record from its serialized form (see `serialize`). By default
+        it's validated either way since for plain models pydantic's json validation
+        is about as fast as decoding the json alone"""
+        return cls.model_validate_json(text)  # type: ignore[attr-defined]
+
+    @classmethod
+    def from_database(cls, connection: Connection, uid: int) -> Optional[Self]:
+        raise NotImplementedError(
+            f"{cls.__name__} does not support the sqlite storage"
+        )
+
+    def replay_journal(self, lines: Iterable[str]) -> None:
+        """Streams the journal entries (one json document per line) that were appended
+        after the base file was last written and applies them in order"""
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                self.replay(line)
+            except ValidationError:
+                logger.warning(
+                    f"ignoring corrupted journal entry at line {line_number}"
+                )
+
+    def replay(self, line: str) -> None:
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support journaling"
+        )
+
+    def dump(
+        self, username: str, uid: int, storage: Optional[StorageType] = None
+    ) -> None:
+        """Writes the entire record. With the `json` storage this also folds
+        (and removes) any journal entries appended since the last time"""
+        if (storage or Settings.get().storage) == "sqlite":
+            with database.connect() as connection:
+                self.to_database(connection, uid)
+                connection.execute(
+                    "INSERT OR IGNORE INTO records (owner, kind) VALUES (?, ?)",
+                    (uid, self.__class__.subdir),
+                )
+        else:
+            self.to_file(uid)
 
         UIDMap.get().add_entry(username, uid)
         logger.info("cached the result")
+
+    def to_file(self, uid: int) -> None:
+        """Writes the record through the configured codec
+        (removing any copy of it that was written with another one)"""
+        path = self.path_of(uid)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        codec = Settings.get().codec
+        with compression.open_file(
+            compression.path_with(path, codec), "wt", codec
+        ) as file:
+            file.write(self.dumps())
+        compression.remove(path, keep=codec)
+        self.journal_path_of(uid).unlink(missing_ok=True)
+
+    def dumps(self) -> str:
+        """The contents of the file of the record, i.e. its serialized form
+        behind a header with the format version and its checksum (see `parse`)"""
+        body = self.serialize()
+        if not body.startswith("{\n"):
+            return body
+        return (
+            f'{{"format": {{"version": {self.format_version}, '
+            f'"checksum": "{_checksum(body)}"}},{body[1:]}'
+        )
+
+    def serialize(self) -> str:
+        """The contents of the file of the record (the counterpart of `parse`)"""
+        return self.model_dump_json(indent=2)  # type: ignore[attr-defined]
+
+    def to_database(self, connection: Connection, uid: int) -> None:
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support the sqlite storage"
+        )
+
+    def append(self, entry: BaseModel, username: str, uid: int):
+        """Stores a single new entry without rewriting the entire record
+        (the record must have been dumped at least once before)"""
+        if Settings.get().storage == "sqlite":
+            with database.connect() as connection:
+                self.append_to_database(connection, entry, uid)
+        else:
+            with open(self.journal_path_of(uid), "a", encoding="utf-8") as file:
+                file.write(f"{entry.model_dump_json()}\n")
+
+        UIDMap.get().add_entry(username, uid)
+        logger.info("cached the result")
+
+    def append_to_database(
+        self, connection: Connection, entry: BaseModel, uid: int
+    ) -> None:
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support the sqlite storage"
+        )
+
+
+def _checksum(body: str) -> str:
+    return f"{zlib.crc32(body.encode()):08x}"
@@ -1,10 +1,10 @@
-from typing import Iterable, Self
+from typing import Iterable, Mapping, Self
 
 from ..viewer import Viewer
 
 
 class Story:
-    viewers: dict[int, Viewer]
+    viewers: Mapping[int, Viewer]
 
     def added_from(self, other: Self) -> dict[int, Viewer]:
         return {
@@ -1,5 +1,7 @@
 from itertools import chain
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+
+from ...utils.constants import LISTS, ChangesType, ListsType
 
 
 class Update:
@@ -21,6 +23,10 @@ class Update:
             (f"{oldname} -> {newname}" for oldname, newname in self.renamed.values())
         )
 
+    @property
+    def change_count(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.renamed)
+
     def has_username_on_added(self, username: str) -> bool:
         return username in self.added.values()
 
@@ -35,6 +41,26 @@ class Update:
             self.added.values(), self.removed.values(), *self.renamed.values()
         )
 
+    def apply(self, state: dict[int, str]) -> None:
+        """Moves `state` forward in time by performing the update on it (in place)"""
+        for uid in self.removed.keys():
+            del state[uid]
+
+        state |= self.added
+
+        for uid, (_, new_name) in self.renamed.items():
+            state[uid] = new_name
+
+    def revert(self, state: dict[int, str]) -> None:
+        """Moves `state` backwards in time by undoing the update on it (in place)"""
+        for uid in self.added.keys():
+            del state[uid]
+
+        state |= self.removed
+
+        for uid, (old_name, _) in self.renamed.items():
+            state[uid] = old_name
+
     def is_empty(self, username: Optional[str] = None) -> bool:
         if username is not None:
             return not self.has_username(username)
@@ -48,11 +74,44 @@ class UserUpdate:
     followers: Update
     followings: Update
 
+    @property
+    def change_count(self) -> int:
+        return self.followers.change_count + self.followings.change_count
+
     def has_username(self, username: str) -> bool:
         return self.followers.has_username(username) or self.followings.has_username(
             username
         )
 
+    def change_rows(
+        self,
+    ) -> Iterator[tuple[ListsType, ChangesType, int, str, Optional[str]]]:
+        """Flattens the update to `(list, change, uid, username, old_username)` rows"""
+        for list_name in LISTS:
+            update: Update = getattr(self, list_name)
+            for uid, username in update.added.items():
+                yield list_name, "added", uid, username, None
+            for uid, username in update.removed.items():
+                yield list_name, "removed", uid, username, None
+            for uid, (old_name, new_name) in update.renamed.items():
+                yield list_name, "renamed", uid, new_name, old_name
+
+    def apply(
+        self,
+        state: dict[ListsType, dict[int, str]],
+        lists: Iterable[ListsType] = LISTS,
+    ) -> None:
+        for list_name in lists:
+            getattr(self, list_name).apply(state[list_name])
+
+    def revert(
+        self,
+        state: dict[ListsType, dict[int, str]],
+        lists: Iterable[ListsType] = LISTS,
+    ) -> None:
+        for list_name in lists:
+            getattr(self, list_name).revert(state[list_name])
+
     def is_empty(self, username: Optional[str] = None) -> bool:
         return self.followers.is_empty(username) and self.followings.is_empty(username)
 
@@ -1,5 +1,6 @@
 from typing import Callable, Iterable, Self
 
+from ...utils import vectorized
 from ...utils.constants import (
     CHANGES,
     DIFFS,
@@ -10,11 +11,14 @@ from ...utils.constants import (
 )
 from ..diff import Diff, UserDiff
 from ..update import Update, UserUpdate
+from . import update
 
 
 class User:
     followers: dict[int, str]
     followings: dict[int, str]
+    # maps each list to the dict its sorted arrays were computed from (and the arrays themselves)
+    _sorted_users: dict[ListsType, tuple[dict[int, str], vectorized.SortedUsers]]
 
     def diff(self, reverse: bool) -> frozenset[str]:
         return (
@@ -23,9 +27,29 @@ class User:
             else self.followers_usernames - self.followings_usernames
         )
 
+    def sorted_users(self, list_name: ListsType) -> vectorized.SortedUsers:
+        """The list as arrays sorted by uid, recomputed only if the list has been replaced
+        or changed in place (which goes through `apply`)"""
+        current_list: dict[int, str] = getattr(self, list_name)
+        cached = self._sorted_users.get(list_name)
+        if cached is not None and cached[0] is current_list:
+            return cached[1]
+        users = vectorized.SortedUsers.of(current_list)
+        self._sorted_users[list_name] = (current_list, users)
+        return users
+
+    def apply(self, entry: update.UserUpdate) -> None:
+        """Moves the lists forward in time by performing `entry` on them (in place)"""
+        entry.apply({list_name: getattr(self, list_name) for list_name in LISTS})
+        self._sorted_users.clear()
+
     def renamed_from(self, other: Self, list_name: ListsType):
         current_list: dict[int, str] = getattr(self, list_name)
         other_list: dict[int, str] = getattr(other, list_name)
+        if vectorized.enabled(current_list, other_list):
+            return vectorized.renamed(
+                self.sorted_users(list_name), other.sorted_users(list_name)
+            )
         return {
             uid: (other_list[uid], current_list[uid])
             for uid in current_list.keys() & other_list.keys()
@@ -35,6 +59,10 @@ class User:
     def added_from(self, other: Self, list_name: ListsType) -> dict[int, str]:
         current_list: dict[int, str] = getattr(self, list_name)
         other_list: dict[int, str] = getattr(other, list_name)
+        if vectorized.enabled(current_list, other_list):
+            return vectorized.added(
+                self.sorted_users(list_name), other.sorted_users(list_name)
+            )
         return {
             uid: current_list[uid] for uid in current_list.keys() - other_list.keys()
         }
@@ -45,6 +73,12 @@ class User:
     def mutuals_from(self, other: Self, list_name: ListsType) -> dict[int, str]:
         current_list: dict[int, str] = getattr(self, list_name)
         other_list: dict[int, str] = getattr(other, list_name)
+        if vectorized.enabled(current_list, other_list):
+            return vectorized.mutuals(
+                current_list,
+                self.sorted_users(list_name),
+                other.sorted_users(list_name),
+            )
         return {
             uid: current_list[uid] for uid in current_list.keys() & other_list.keys()
         }
@@ -1,4 +1,7 @@
-from datetime import datetime
+from array import array
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from datetime import datetime, timezone
+from typing import Any, Literal, Optional, Self
 
 from pydantic import BaseModel, field_serializer
 
@@ -13,3 +16,136 @@ class Viewer(BaseModel):
     @field_serializer("recorded_at")
     def serialize_recorded_at(self, recorded_at: datetime, _info):
         return recorded_at.timestamp()
+
+
+class Names:
+    """The distinct usernames of a story history, which its viewers refer to by id"""
+
+    __slots__ = ("strings", "ids")
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.strings: list[str] = list(strings)
+        self.ids: dict[str, int] = {name: id for id, name in enumerate(self.strings)}
+
+    def intern(self, name: str) -> int:
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.strings)
+            self.strings.append(name)
+        return id
+
+    def __getitem__(self, id: int) -> str:
+        return self.strings[id]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class Viewers(MutableMapping[int, Viewer]):
+    """The viewers of a story kept as parallel arrays of uids, name ids (see `Names`) and
+    timestamps (in the order they were recorded) instead of a model per viewer. It's accessed
+    like a `dict[int, Viewer]`, with each `Viewer` being built on access"""
+
+    __slots__ = ("names", "uids", "name_ids", "timestamps", "_positions")
+
+    def __init__(
+        self,
+        names: Names,
+        uids: Iterable[int] = (),
+        name_ids: Iterable[int] = (),
+        timestamps: Iterable[float] = (),
+    ):
+        self.names = names
+        self.uids = array("q", uids)
+        self.name_ids = array("l", name_ids)
+        self.timestamps = array("d", timestamps)
+        self._positions: Optional[dict[int, int]] = None
+
+    @classmethod
+    def of(cls, viewers: Mapping[int, Viewer], names: Names) -> Self:
+        instance = cls(names)
+        instance.merge(viewers)
+        return instance
+
+    @property
+    def positions(self) -> dict[int, int]:
+        # only built for the stories that are actually looked up
+        if self._positions is None:
+            self._positions = {uid: position for position, uid in enumerate(self.uids)}
+        return self._positions
+
+    def __getitem__(self, uid: int) -> Viewer:
+        return self.record(self.positions[uid])
+
+    def record(self, position: int) -> Viewer:
+        """The record of the viewer at `position` (in the order they were recorded)"""
+        return Viewer.model_construct(
+            name=self.names[self.name_ids[position]],
+            recorded_at=datetime.fromtimestamp(self.timestamps[position], timezone.utc),
+        )
+
+    def __setitem__(self, uid: int, viewer: Viewer) -> None:
+        name_id = self.names.intern(viewer.name)
+        position = self.positions.get(uid)
+        if position is not None:
+            self.name_ids[position] = name_id
+            self.timestamps[position] = viewer.recorded_at.timestamp()
+            return
+        self.positions[uid] = len(self.uids)
+        self.uids.append(uid)
+        self.name_ids.append(name_id)
+        self.timestamps.append(viewer.recorded_at.timestamp())
+
+    def __delitem__(self, uid: int) -> None:
+        position = self.positions[uid]
+        del self.uids[position]
+        del self.name_ids[position]
+        del self.timestamps[position]
+        self._positions = None
+
+    def __contains__(self, uid: object) -> bool:
+        return uid in self.positions
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.uids)
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def merge(self, viewers: Mapping[int, Viewer]) -> None:
+        """Adds the viewers that are not recorded yet (keeping the existing records as is)"""
+        for uid, viewer in viewers.items():
+            if uid not in self.positions:
+                self[uid] = viewer
+
+    def find(
+        self, field: Literal["uids", "name_ids"], value: int, start: int = 0
+    ) -> Optional[int]:
+        """The position of the first record from `start` on whose uid (or name id)
+        is `value`, scanning the array rather than building `positions`"""
+        try:
+            return getattr(self, field).index(value, start)
+        except ValueError:
+            return None
+
+    def usernames(self) -> Iterator[str]:
+        return (self.names[id] for id in self.name_ids)
+
+    def dump(self) -> dict[str, list]:
+        return {
+            "uids": self.uids.tolist(),
+            "names": self.name_ids.tolist(),
+            "recorded_at": self.timestamps.tolist(),
+        }
+
+    @classmethod
+    def load(cls, data: Any, names: Names) -> Self:
+        """Accepts both the array layout and the older mapping of uids to viewer objects"""
+        if isinstance(data, cls):
+            return data
+        if isinstance(data, dict) and "uids" in data:
+            return cls(names, data["uids"], data["names"], data["recorded_at"])
+        return cls.of(
+            {int(uid): Viewer.model_validate(viewer) for uid, viewer in data.items()},
+            names,
+        )
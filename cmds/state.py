@@ -1,11 +1,12 @@
 from argparse import ArgumentParser, FileType, Namespace
-from datetime import datetime
+from datetime import datetime, timedelta
 from sys import stdout
 
 from . import checkout
 from .models import cached, fetched
 from .utils.bots import Bot
-from .utils.constants import LISTS
+from .utils.constants import GATE_RESCAN_HOURS, INCREMENTAL_RUN, LISTS
+from .utils.parsers import hours_parser, positive_int_parser
 from .utils.renderers import HistoryPointRenderer
 from .utils.streams import ColoredOutput
 
@@ -27,8 +28,17 @@ def run(args: Namespace):
     if not args.target:
         args.target = bot.username
     client = bot.login()
-    state = fetched.User.fetch(client, args.target, args.chunk_size)
-    cached.User.get(args.target).dump_update(state)
+    cached_user = cached.User.get(args.target)
+    state = fetched.User.fetch(
+        client,
+        args.target,
+        args.chunk_size,
+        args.concurrent,
+        cached_user,
+        args.incremental,
+        args.gate,
+    )
+    cached_user.dump_update(state)
     renderer = HistoryPointRenderer(
         out=ColoredOutput(args.out, "green"),
         history_point=datetime.now().date(),
@@ -73,4 +83,31 @@ def setup_parser(parser: ArgumentParser):
         default=100,
         help="Specifies the size of each chunk to request when fetching from the api",
     )
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="Whether to scrap followers and followings concurrently when fetching from the api",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs="?",
+        type=positive_int_parser,
+        const=INCREMENTAL_RUN,
+        metavar="RUN",
+        help="When fetching from the api, "
+        "stops scrapping each list once RUN (defaults to %(const)s) consecutive users match "
+        "the cached one and infers the rest from cache (falls back to a full scan "
+        "if the counts differ, renames further down the list are missed)",
+    )
+    parser.add_argument(
+        "--gate",
+        nargs="?",
+        type=hours_parser,
+        const=timedelta(hours=GATE_RESCAN_HOURS),
+        metavar="HOURS",
+        help="When fetching from the api, "
+        "compares the count and first chunk of each list with the cached ones and skips "
+        "the rest of it if both match, unless it hasn't been fully scanned for HOURS "
+        f"(defaults to {GATE_RESCAN_HOURS})",
+    )
     parser.set_defaults(func=run)
@@ -3,8 +3,8 @@ from sys import stdout
 
 from ..models import cached, fetched
 from ..utils.bots import Bot
-from ..utils.filters import date_filter
-from ..utils.parsers import date_parser
+from ..utils.constants import INCREMENTAL_RUN, STORY_CONCURRENCY
+from ..utils.parsers import date_parser, positive_int_parser
 from ..utils.renderers import ViewerHistoryRenderer
 from ..utils.streams import ColoredOutput
 
@@ -13,7 +13,6 @@ def run(args: Namespace):
     bot = Bot.get(args.name, args.password, args.tfa_seed)
     args.name = bot.username
 
-    records = cached.StoryHistory.get(args.name)
     renderer = ViewerHistoryRenderer(
         out=ColoredOutput(args.out, "green"),
         username=args.target,
@@ -25,19 +24,20 @@ def run(args: Namespace):
 
     if args.sync:
         client = bot.login()
-        fetched_content = fetched.Stories.fetch(client, args.name, args.chunk_size)
-        records.dump_update(fetched_content)
+        history = cached.StoryHistory.get(args.name)
+        fetched_content = fetched.Stories.fetch(
+            client,
+            args.name,
+            args.chunk_size,
+            args.concurrent,
+            history,
+            args.incremental,
+        )
+        history.dump_update(fetched_content)
 
     renderer.render(
-        reversed(
-            list(
-                date_filter(
-                    args.from_date,
-                    args.to_date,
-                    records.stories.items(),
-                    lambda entry: entry[1].timestamp.date(),
-                )
-            )
+        cached.StoryHistory.lookup(
+            args.name, args.target, args.deep, args.from_date, args.to_date, args.all
         )
     )
 
@@ -75,8 +75,8 @@ def setup_parser(parser: ArgumentParser):
         action="store_true",
         help="By default only direct name equality is taken "
         "into account for user detection, while this flag "
-        "forces the use of its id as well (introducing a "
-        "greater overhead)",
+        "forces the use of its id as well (i.e. also matches "
+        "the stories it viewed under a different name)",
     )
     parser.add_argument(
         "--sync",
@@ -90,4 +90,23 @@ def setup_parser(parser: ArgumentParser):
         default=100,
         help="In combination with `--sync` controls the size of each chunk of viewers to fetch",
     )
+    parser.add_argument(
+        "--concurrent",
+        nargs="?",
+        type=int,
+        const=STORY_CONCURRENCY,
+        metavar="N",
+        help="In combination with `--sync` fetches the viewers of up to N (defaults to "
+        "%(const)s) stories at once, overlapping their waits (they share the bot, "
+        "its rate limit and make its requests in turn)",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs="?",
+        type=positive_int_parser,
+        const=INCREMENTAL_RUN,
+        metavar="RUN",
+        help="In combination with `--sync` stops fetching the viewers of a story once RUN "
+        "(defaults to %(const)s) consecutive ones were already recorded",
+    )
     parser.set_defaults(subfunc=run)
@@ -0,0 +1,153 @@
+from argparse import ArgumentParser, FileType, Namespace
+from datetime import datetime, timedelta
+from pathlib import Path
+from sys import stdout
+from time import time
+from typing import Iterable, TextIO
+
+from .utils.bots import Bot, Config
+from .utils.constants import GATE_RESCAN_HOURS, INCREMENTAL_RUN
+from .utils.parsers import hours_parser, positive_int_parser
+from .utils.pool import SyncResult, WorkerPool
+from .utils.schedule import SyncHistory, SyncTarget
+
+
+def create_pool(args: Namespace) -> WorkerPool:
+    config = Config.get()
+    if args.bots:
+        bots = [config.bots[config.uid_of_bot(name)] for name in args.bots]
+    elif config.bots:
+        bots = list(config.bots.values())
+    else:
+        bots = [Bot.get(args.name, args.password, args.tfa_seed)]
+    return WorkerPool(bots, args.chunk_size, args.concurrent, args.incremental, args.gate)
+
+
+def load_targets(args: Namespace) -> list[SyncTarget]:
+    targets: dict[str, SyncTarget] = {
+        target: SyncTarget(username=target) for target in args.targets
+    }
+    if args.targets_file is not None:
+        targets.update(
+            (target.username, target) for target in SyncTarget.load(args.targets_file)
+        )
+    return list(targets.values())
+
+
+def record(history: SyncHistory, results: Iterable[SyncResult]):
+    now = datetime.now()
+    for result in results:
+        if result.error is None:
+            history.last[result.target] = now
+    history.backup()
+
+
+def report(
+    out: TextIO,
+    history: SyncHistory,
+    results: list[SyncResult],
+    skipped: list[SyncTarget],
+    duration: float,
+):
+    failed = [result for result in results if result.error is not None]
+    out.write(
+        f"Synced {len(results) - len(failed)} targets, failed {len(failed)}, "
+        f"skipped {len(skipped)} (not due yet) in {duration:.1f}s\n\n"
+    )
+    for result in results:
+        status = "failed" if result.error is not None else "synced"
+        out.write(f"{result.target}: {status} by {result.bot} in {result.duration:.1f}s")
+        out.write(f" ({result.error!r})\n" if result.error is not None else "\n")
+    for target in skipped:
+        out.write(
+            f"{target.username}: skipped, last synced at "
+            f"{history.last[target.username]:%d/%m/%Y %H:%M:%S}\n"
+        )
+
+
+def run(args: Namespace):
+    pool = create_pool(args)
+    targets = load_targets(args)
+    if not targets:
+        args.out.write("No targets to sync\n")
+        return
+
+    history = SyncHistory.get()
+    due, skipped = history.schedule(targets, args.force)
+    start = time()
+    results = pool.run(target.username for target in due) if due else []
+    duration = time() - start
+
+    record(history, results)
+    report(args.out, history, results, skipped, duration)
+
+
+def setup_pool_parser(parser: ArgumentParser):
+    """Arguments shared by the commands that sync many targets through a worker pool"""
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        metavar="target",
+        help="The usernames of the accounts to sync",
+    )
+    parser.add_argument(
+        "--targets-file",
+        type=Path,
+        help="A json file with a list of targets to sync (in addition), each being an object "
+        "with a 'username' and optionally a 'priority' (higher ones are synced first) "
+        "and an 'interval' (in seconds or ISO 8601) that should elapse between syncs",
+    )
+    parser.add_argument(
+        "--bots",
+        nargs="+",
+        metavar="name",
+        help="The names of the configured bots to spread the targets across "
+        "(defaults to every configured bot)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=100,
+        help="Controls the size of each chunk to fetch while scrapping",
+    )
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="Scrap the followers and followings of each target concurrently",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs="?",
+        type=positive_int_parser,
+        const=INCREMENTAL_RUN,
+        metavar="RUN",
+        help="Stop scrapping each list once RUN (defaults to %(const)s) consecutive users match "
+        "the cached one and infer the rest from cache (falls back to a full scan "
+        "if the counts differ, renames further down the list are missed)",
+    )
+    parser.add_argument(
+        "--gate",
+        nargs="?",
+        type=hours_parser,
+        const=timedelta(hours=GATE_RESCAN_HOURS),
+        metavar="HOURS",
+        help="Compare the count and first chunk of each list with the cached ones and skip "
+        "the rest of it if both match, unless it hasn't been fully scanned for HOURS "
+        f"(defaults to {GATE_RESCAN_HOURS})",
+    )
+    parser.add_argument(
+        "--out",
+        type=FileType("w", encoding="utf-8"),
+        default=stdout,
+        help="An optional file to output the summary report",
+    )
+
+
+def setup_parser(parser: ArgumentParser):
+    setup_pool_parser(parser)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Sync every target regardless of its interval",
+    )
+    parser.set_defaults(func=run)
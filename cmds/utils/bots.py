@@ -2,15 +2,64 @@ from __future__ import annotations
 import logging
 from pydantic import BaseModel, field_serializer, field_validator, Field
 from base64 import b64decode, b64encode
+from datetime import datetime
+from pathlib import Path
+from time import time
 from typing import Optional, cast, TYPE_CHECKING
 from .tool_logger import logger
 from .uids import UIDMap
-from .constants import CONFIG_FOLDER, SESSIONS_FOLDER
+from .constants import CONFIG_FOLDER, SESSION_VERIFY_TTL, SESSIONS_FOLDER
 
 if TYPE_CHECKING:
     from instagrapi import Client
 
 _config: Optional[Config] = None
+# the public requests of every client are logged once, however many bots log in
+_public_request_handler: Optional[logging.Handler] = None
+
+
+class SessionHealth(BaseModel):
+    """A sidecar of a session file recording when it was last known to work,
+    so that a recently verified session can be trusted without a round trip"""
+
+    uid: int
+    verified_at: Optional[datetime] = None
+    failures: int = 0
+    last_failure: Optional[str] = None
+
+    @staticmethod
+    def path_of(uid: int) -> Path:
+        return SESSIONS_FOLDER / f"{uid}.health.json"
+
+    @classmethod
+    def of(cls, uid: int):
+        path = cls.path_of(uid)
+        if not path.is_file():
+            return cls(uid=uid)
+        with open(path, encoding="utf-8") as file:
+            return cls.model_validate_json(file.read())
+
+    def backup(self):
+        SESSIONS_FOLDER.mkdir(exist_ok=True)
+        with open(self.path_of(self.uid), "w", encoding="utf-8") as file:
+            file.write(self.model_dump_json(indent=2))
+
+    def is_fresh(self, ttl: float = SESSION_VERIFY_TTL) -> bool:
+        return (
+            self.verified_at is not None
+            and time() - self.verified_at.timestamp() < ttl
+        )
+
+    def verified(self):
+        self.verified_at = datetime.now()
+        self.failures = 0
+        self.backup()
+
+    def failed(self, error: Exception):
+        self.verified_at = None
+        self.failures += 1
+        self.last_failure = repr(error)
+        self.backup()
 
 
 class Bot(BaseModel):
@@ -44,33 +93,69 @@ class Bot(BaseModel):
         client.set_settings(session)
         client.login(self.username, self.password)
 
+        health = SessionHealth.of(uid)
+        if health.is_fresh():
+            logger.debug("session was verified recently, skipping validation")
+            client.handle_exception = self.session_rejection_handler(health, session_path)
+            return True
+
         try:
             client.get_timeline_feed()
-        except Exception:
+        except Exception as error:
             logger.debug(
                 "failed to login using the previous session, attempting manual login..."
             )
+            health.failed(error)
+            self.relogin(client, session_path)
+        health.verified()
+        return True
 
-            if not client.login(
-                self.username,
-                self.password,
-                relogin=True,
-                verification_code=self.tfa_code,
-            ):
-                logger.exception("failed to login")
-                raise RuntimeError("manual login failed")
+    def relogin(self, client: Client, session_path: Path):
+        if not client.login(
+            self.username,
+            self.password,
+            relogin=True,
+            verification_code=self.tfa_code,
+        ):
+            logger.exception("failed to login")
+            raise RuntimeError("manual login failed")
 
-            client.dump_settings(session_path)
-            client.relogin_attempt -= 1
-        return True
+        client.dump_settings(session_path)
+        client.relogin_attempt -= 1
+
+    def session_rejection_handler(self, health: SessionHealth, session_path: Path):
+        """Since a trusted session is not validated, the first request is the one to find out
+        that it was rejected. In that case this logs in again (as if validation had failed)
+        and lets instagrapi retry the request, otherwise the error is handled as usual"""
+        from instagrapi.exceptions import (
+            ChallengeRequired,
+            ClientUnauthorizedError,
+            LoginRequired,
+        )
+
+        def handle(client: Client, error: Exception):
+            if isinstance(error, (LoginRequired, ClientUnauthorizedError)):
+                logger.debug("the trusted session was rejected, attempting manual login...")
+                client.handle_exception = None
+                health.failed(error)
+                self.relogin(client, session_path)
+                health.verified()
+                return
+            if isinstance(error, ChallengeRequired) and client.with_challenge_flow:
+                client.challenge_resolve(client.last_json)
+                return
+            raise error
+
+        return handle
 
     def login(self):
         from instagrapi import Client
 
+        global _public_request_handler
         client = Client()
-        Client.public_request_logger.addHandler(
-            logging.FileHandler("insta.log")
-        )
+        if _public_request_handler is None:
+            _public_request_handler = logging.FileHandler("insta.log")
+            Client.public_request_logger.addHandler(_public_request_handler)
 
         if not self.try_session_login(client):
             logger.debug("no session was found, attempting manual login...")
@@ -83,6 +168,7 @@ class Bot(BaseModel):
             if not SESSIONS_FOLDER.is_dir():
                 SESSIONS_FOLDER.mkdir()
             client.dump_settings(SESSIONS_FOLDER / f"{client.user_id}.json")
+            SessionHealth(uid=client.user_id).verified()
 
         logger.info(f"logged in as: {client.username}")
         client.delay_range = [1, 3]
@@ -141,14 +227,17 @@ class Config(BaseModel):
             raise RuntimeError("missing configuration")
         return self.bots[self.current_uid]
 
-    def get_bot_by_name(self, username: str) -> Bot:
+    def uid_of_bot(self, username: str) -> int:
         uid = UIDMap.get().uid_of(username)
-        if uid is None:
+        if uid is None or uid not in self.bots:
             logger.critical(
                 f"no configuration is associated for bot with name: {username}"
             )
             raise RuntimeError("missing configuration")
-        self.current_uid = uid
+        return uid
+
+    def get_bot_by_name(self, username: str) -> Bot:
+        self.current_uid = self.uid_of_bot(username)
         self.backup()
         return self.current_bot
 
@@ -0,0 +1,45 @@
+import gzip
+import lzma
+from pathlib import Path
+from typing import IO, Optional, cast
+
+from .settings import CODECS, CodecType
+
+# the suffix each codec appends to the name of the files it compresses
+SUFFIXES: dict[CodecType, str] = {"none": "", "gzip": ".gz", "lzma": ".xz"}
+# a faster level than gzip's default, which compresses only slightly better
+GZIP_LEVEL = 6
+
+
+def path_with(path: Path, codec: CodecType) -> Path:
+    return path.with_name(f"{path.name}{SUFFIXES[codec]}")
+
+
+def find(path: Path) -> Optional[tuple[Path, CodecType]]:
+    """Locates the file at `path` whichever codec it was compressed with (if any)"""
+    for codec in CODECS:
+        compressed_path = path_with(path, codec)
+        if compressed_path.is_file():
+            return compressed_path, codec
+    return None
+
+
+def open_file(path: Path, mode: str, codec: CodecType) -> IO:
+    """Opens a file through a codec (i.e. compressing/decompressing as it's streamed).
+    Text modes are always utf-8"""
+    encoding = "utf-8" if "b" not in mode else None
+    if codec == "gzip":
+        # `GzipFile` isn't an `IO` for typeshed, it implements the same methods
+        return cast(
+            IO, gzip.open(path, mode, compresslevel=GZIP_LEVEL, encoding=encoding)
+        )
+    if codec == "lzma":
+        return lzma.open(path, mode, encoding=encoding)
+    return open(path, mode, encoding=encoding)
+
+
+def remove(path: Path, keep: Optional[CodecType] = None) -> None:
+    """Removes the copies of the file written with any codec but `keep`"""
+    for codec in CODECS:
+        if codec != keep:
+            path_with(path, codec).unlink(missing_ok=True)
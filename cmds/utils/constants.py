@@ -9,8 +9,17 @@ DiffsType: TypeAlias = Literal["user1", "user2", "mutuals"]
 CONFIG_FOLDER = Path("config")
 CACHE_FOLDER = Path("user info")
 SESSIONS_FOLDER = Path("sessions")
+SCRAPS_FOLDER = CACHE_FOLDER / "scraps"
 LISTS: Iterable[ListsType] = ("followers", "followings")
 CHANGES: Iterable[ChangesType] = ("added", "removed", "renamed")
 DIFFS: Iterable[DiffsType] = ("user1", "user2", "mutuals")
 CHANGES_ATTRS = dict(zip(CHANGES, (("+ ", "green"), ("- ", "red"), ("", "light_cyan"))))
 DATE_OUTPUT_FORMAT = "%d/%m/%Y %I:%M:%S%p"
+CHECKPOINT_INTERVAL = 1000
+CHECKPOINT_RATIO = 4
+SCRAP_CHECKPOINT_TTL = 12 * 60 * 60
+INCREMENTAL_RUN = 20
+GATE_RESCAN_HOURS = 24
+WATCH_INTERVAL_MINUTES = 15
+SESSION_VERIFY_TTL = 6 * 60 * 60
+STORY_CONCURRENCY = 4
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from .constants import CACHE_FOLDER
+
+DATABASE_PATH = CACHE_FOLDER / "cache.db"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uids (
+    username TEXT PRIMARY KEY,
+    uid INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uids_uid ON uids (uid);
+
+CREATE TABLE IF NOT EXISTS records (
+    owner INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    PRIMARY KEY (owner, kind)
+);
+
+CREATE TABLE IF NOT EXISTS members (
+    owner INTEGER NOT NULL,
+    list TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    UNIQUE (owner, list, uid)
+);
+CREATE INDEX IF NOT EXISTS members_username ON members (username);
+
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    owner INTEGER NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_owner_timestamp ON entries (owner, timestamp);
+
+CREATE TABLE IF NOT EXISTS changes (
+    entry INTEGER NOT NULL REFERENCES entries (id) ON DELETE CASCADE,
+    list TEXT NOT NULL,
+    change TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    old_username TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_entry ON changes (entry);
+CREATE INDEX IF NOT EXISTS changes_uid ON changes (uid);
+CREATE INDEX IF NOT EXISTS changes_username ON changes (username);
+CREATE INDEX IF NOT EXISTS changes_old_username ON changes (old_username);
+
+CREATE TABLE IF NOT EXISTS scans (
+    entry INTEGER NOT NULL REFERENCES entries (id) ON DELETE CASCADE,
+    list TEXT NOT NULL,
+    fingerprint TEXT,
+    gated INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scans_entry ON scans (entry);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    owner INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    list TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    username TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checkpoints_owner ON checkpoints (owner, idx);
+
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY,
+    owner INTEGER NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stories_owner_timestamp ON stories (owner, timestamp);
+
+CREATE TABLE IF NOT EXISTS viewers (
+    story INTEGER NOT NULL REFERENCES stories (id) ON DELETE CASCADE,
+    uid INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (story, uid)
+);
+CREATE INDEX IF NOT EXISTS viewers_uid ON viewers (uid);
+CREATE INDEX IF NOT EXISTS viewers_username ON viewers (username);
+"""
+
+_connection: Optional[sqlite3.Connection] = None
+
+
+def connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is not None:
+        return _connection
+    CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+    # the worker pool shares this connection between threads, serializing
+    # every access to the cache behind its own lock
+    _connection = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    _connection.execute("PRAGMA journal_mode = WAL")
+    _connection.execute("PRAGMA foreign_keys = ON")
+    _connection.executescript(SCHEMA)
+    return _connection
+
+
+def to_datetime(timestamp: float) -> datetime:
+    """Converts a stored timestamp back to the same (utc) datetime
+    that pydantic would produce when loading the json cache"""
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def date_range(
+    from_date: Optional[date], to_date: Optional[date]
+) -> tuple[float, float]:
+    """Converts an inclusive range of dates to the half open range of
+    timestamps it spans (unbounded sides are mapped to +-infinity)"""
+    start = (
+        datetime.combine(from_date, time.min, timezone.utc).timestamp()
+        if from_date is not None
+        else float("-inf")
+    )
+    end = (
+        datetime.combine(to_date + timedelta(days=1), time.min, timezone.utc).timestamp()
+        if to_date is not None
+        else float("inf")
+    )
+    return start, end
@@ -1,25 +1,20 @@
 from argparse import Namespace
-from datetime import date, datetime
-from typing import Callable, Iterable, Optional, Protocol
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Iterable, Optional, Sequence
 
 from .constants import CHANGES, LISTS, ChangesType, ListsType
 
 
-def date_filter[T](
-    from_date: Optional[date],
-    to_date: Optional[date],
-    iterable: Iterable[T],
-    date_access: Callable[[T], date] = lambda entry: entry.timestamp.date(),
-) -> Iterable[T]:
-    if from_date is not None and to_date is not None:
-        return (
-            entry for entry in iterable if from_date <= date_access(entry) <= to_date
-        )
-    if from_date is not None:
-        return (entry for entry in iterable if date_access(entry) >= from_date)
-    if to_date is not None:
-        return (entry for entry in iterable if date_access(entry) <= to_date)
-    return iterable
+def date_slice(
+    from_date: Optional[date], to_date: Optional[date], dates: Sequence[int]
+) -> slice:
+    """Locates the (inclusive) range of dates within a sorted sequence by bisection,
+    where `dates` holds the ordinal of each entry's date"""
+    return slice(
+        bisect_left(dates, from_date.toordinal()) if from_date is not None else 0,
+        bisect_right(dates, to_date.toordinal()) if to_date is not None else len(dates),
+    )
 
 
 def list_filter(args: Namespace) -> Iterable[ListsType]:
@@ -1,8 +1,32 @@
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from argparse import ArgumentTypeError
+from typing import Literal
 
 def date_parser(argument: str) -> date:
     try:
         return datetime.strptime(argument, "%d-%m-%Y").date()
     except ValueError:
-        raise ArgumentTypeError(f"'{argument}' is not a proper date")
\ No newline at end of file
+        raise ArgumentTypeError(f"'{argument}' is not a proper date")
+
+def hours_parser(argument: str) -> timedelta:
+    try:
+        return timedelta(hours=float(argument))
+    except ValueError:
+        raise ArgumentTypeError(f"'{argument}' is not a proper number of hours")
+
+def positive_int_parser(argument: str) -> int:
+    try:
+        value = int(argument)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise ArgumentTypeError(f"'{argument}' is not a positive number")
+    return value
+
+def retries_parser(argument: str) -> int | Literal["ask"]:
+    if argument == "ask":
+        return "ask"
+    try:
+        return int(argument)
+    except ValueError:
+        raise ArgumentTypeError(f"'{argument}' is neither a number nor 'ask'")
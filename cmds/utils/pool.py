@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+from time import time
+from typing import TYPE_CHECKING, Any, Iterable, Optional, cast
+
+from ..models import cached, fetched
+from .bots import Bot, Config
+from .settings import Settings
+from .tool_logger import logger
+
+if TYPE_CHECKING:
+    from instagrapi import Client
+
+
+@dataclass
+class SyncResult:
+    target: str
+    bot: str
+    duration: float
+    error: Optional[Exception] = None
+
+
+@dataclass
+class WorkerPool:
+    """Syncs many targets in parallel with one worker thread per bot. Each worker
+    has its own client, session and rate limit and keeps pulling targets from a
+    shared queue, while every access to the cache goes through a single lock.
+    Targets are scanned incrementally if `match_run` is set and their lists are gated
+    if `rescan` is set (see `fetched.User.fetch`)"""
+
+    bots: list[Bot]
+    chunk_size: int = 100
+    concurrent: bool = False
+    match_run: Optional[int] = None
+    rescan: Optional[timedelta] = None
+    lock: Lock = field(default_factory=Lock)
+    # kept logged in across runs
+    clients: list[Client] = field(default_factory=list)
+
+    def login(self) -> list[Client]:
+        if self.clients:
+            return self.clients
+        config = Config.get()
+        current_uid = config.current_uid
+
+        for bot in self.bots:
+            try:
+                self.clients.append(bot.login())
+            except self.expected_errors():
+                logger.exception(f"skipping bot that failed to login: {bot.username}")
+
+        # logging in switches the current bot, which the pool should not affect
+        if current_uid is not None and config.current_uid != current_uid:
+            config.current_uid = current_uid
+            config.backup()
+        return self.clients
+
+    def run(self, targets: Iterable[str]) -> list[SyncResult]:
+        clients = self.login()
+        if not clients:
+            raise RuntimeError("no bot managed to login")
+
+        queue: SimpleQueue[str] = SimpleQueue()
+        for target in targets:
+            queue.put(target)
+
+        if len(clients) > 1:
+            self.unattended()
+        results: list[SyncResult] = []
+        workers = [
+            Thread(target=self.work, args=(client, queue, results))
+            for client in clients
+        ]
+        logger.info(f"syncing {queue.qsize()} targets with {len(workers)} bots")
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    @staticmethod
+    def unattended() -> None:
+        """Workers can't prompt (several of them could at once, or while holding the cache
+        lock), so for this run the decisions of the retry policy that are still set to "ask"
+        are answered the way their prompts default to: not retrying nor committing"""
+        policy = Settings.get().retry
+        overrides: dict[str, Any] = {
+            "retries": 0 if policy.retries == "ask" else None,
+            "partial": "discard" if policy.partial == "ask" else None,
+        }
+        if any(value is not None for value in overrides.values()):
+            logger.warning(
+                "syncing with several bots, failed scraps won't be retried nor committed "
+                "(unless the retry policy says otherwise, see --retries and --partial)"
+            )
+            Settings.get().update(persist=False, retry=overrides)
+
+    @staticmethod
+    def expected_errors() -> tuple[type[Exception], ...]:
+        """The errors a login or a sync is expected to fail with, which only fail that bot
+        (or target) rather than the whole pool"""
+        from instagrapi.exceptions import ClientError
+        from pydantic import ValidationError
+
+        return (ClientError, ValidationError, OSError, RuntimeError)
+
+    def work(self, client: Client, queue: SimpleQueue[str], results: list[SyncResult]):
+        while True:
+            try:
+                target = queue.get_nowait()
+            except Empty:
+                return
+            results.append(self.sync(client, target))
+
+    def sync(self, client: Client, target: str) -> SyncResult:
+        bot = cast(str, client.username)
+        start = time()
+        try:
+            with self.lock:
+                known = cached.User.get(target)
+            fetched_user = fetched.User.fetch(
+                client,
+                target,
+                self.chunk_size,
+                self.concurrent,
+                known,
+                self.match_run,
+                self.rescan,
+            )
+            with self.lock:
+                known.dump_update(fetched_user)
+        except self.expected_errors() as error:
+            logger.exception(f"failed to sync: {target}")
+            return SyncResult(target, bot, time() - start, error)
+
+        logger.info(f"synced {target} (by {bot})")
+        return SyncResult(target, bot, time() - start)
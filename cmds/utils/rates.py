@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from random import uniform
+from threading import Lock
+from time import monotonic
+from typing import Optional, Protocol
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .constants import CONFIG_FOLDER
+from .tool_logger import logger
+
+RATES_PATH = CONFIG_FOLDER / "rates.json"
+_rates: Optional[RateLimits] = None
+_lock = Lock()
+
+
+class RateControl(Protocol):
+    """What the scrapper expects from a component that paces its requests"""
+
+    def reserve(self) -> float:
+        """Returns the number of seconds to wait before sending the next request"""
+        ...
+
+    def success(self) -> None: ...
+
+    def failure(self) -> None: ...
+
+
+class RateLimiter(BaseModel):
+    """A token bucket whose refill rate (in requests per second) adapts AIMD-style:
+    it grows additively while instagram responds normally and is cut
+    multiplicatively (along with a cooldown) whenever it pushes back"""
+
+    rate: float = 1 / 3
+    min_rate: float = 1 / 30
+    max_rate: float = 1.0
+    burst: float = 2
+    increase: float = 0.01
+    decrease: float = 0.5
+    cooldown: float = 7.5
+    max_cooldown: float = 300
+    _tokens: float = PrivateAttr(default=1)
+    _updated: float = PrivateAttr(default_factory=monotonic)
+    _failures: int = PrivateAttr(default=0)
+
+    def reserve(self) -> float:
+        now = monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0
+        return -self._tokens / self.rate * uniform(1, 1.25)
+
+    def success(self) -> None:
+        self._failures = 0
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def failure(self) -> None:
+        self._failures += 1
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        cooldown = min(self.max_cooldown, self.cooldown * 2 ** (self._failures - 1))
+        # going into debt makes the next reservation wait out the cooldown
+        self._tokens = min(self._tokens, -cooldown * self.rate)
+        logger.debug(
+            "backing off to %f requests per second with a cooldown of %f seconds",
+            self.rate,
+            cooldown,
+        )
+
+
+class RateLimits(BaseModel):
+    """The learned rate of each bot (by id) so that later runs don't start over"""
+
+    bots: dict[int, RateLimiter] = Field(default_factory=dict)
+
+    @classmethod
+    def get(cls):
+        global _rates
+        if _rates is not None:
+            return _rates
+        # the workers of a pool may all get it for the first time at once
+        with _lock:
+            if _rates is not None:
+                return _rates
+            if not RATES_PATH.is_file():
+                _rates = cls()
+            else:
+                with open(RATES_PATH, encoding="utf-8") as file:
+                    _rates = cls.model_validate_json(file.read())
+            return _rates
+
+    def backup(self):
+        # scraps of different bots may finish at the same time
+        with _lock:
+            CONFIG_FOLDER.mkdir(exist_ok=True)
+            with open(RATES_PATH, "w", encoding="utf-8") as file:
+                file.write(self.model_dump_json(indent=2))
+
+    def of(self, uid: int) -> RateLimiter:
+        return self.bots.setdefault(int(uid), RateLimiter())
@@ -156,7 +156,10 @@ class ChangelogRenderer(DiffRenderer):
             self.out.write("\n")
 
     def render_log_header(self, log: cached.ChangelogEntry) -> None:
-        self.out.write(f"Changelog - {log.timestamp.strftime(DATE_OUTPUT_FORMAT)}\n")
+        gated = f" (gated: {', '.join(log.gated)})" if log.gated else ""
+        self.out.write(
+            f"Changelog - {log.timestamp.strftime(DATE_OUTPUT_FORMAT)}{gated}\n"
+        )
 
 
 @dataclass(frozen=True)
@@ -47,14 +47,16 @@ class HistoryPointRenderer(BasicListRenderer):
         additional_text: list[str] = []
 
         for list_name in self.lists:
+            if self.summary and self.username is None:
+                # the usernames aren't needed (or decoded) just for the count
+                count = len(getattr(self.state, list_name))
+                self.out.write(f"{list_name.capitalize()}: {count}\n")
+                continue
             userset: frozenset[str] = getattr(self.state, f"{list_name}_usernames")
             if self.username is not None:
                 if self.username in userset:
                     additional_text.append(f"a {list_name[:-1]}")
                 continue
-            if self.summary:
-                self.out.write(f"{list_name.capitalize()}: {len(userset)}\n")
-                continue
             self.out.write(f"{list_name.capitalize()} ({len(userset)}):\n")
             super().render(userset)
 
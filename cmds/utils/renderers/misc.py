@@ -1,6 +1,5 @@
 from dataclasses import dataclass
 from datetime import date
-from itertools import tee
 from typing import Iterable, Optional
 
 from ...models import cached
@@ -18,31 +17,13 @@ class ViewerHistoryRenderer:
     all: bool
     deep: bool
 
-    def render(self, stories: Iterable[tuple[int, cached.Story]]):
+    def render(self, entries: Iterable[tuple[int, cached.Story, Optional[Viewer]]]):
+        """Renders the entries selected by `cached.StoryHistory.lookup`"""
         lookup_success: bool = False
         self.out.set_attrs(color="green", attrs=("bold", "underline"))
         self.render_header()
 
-        if self.deep:
-            stories, itr = tee(stories)
-            uid = self.lookup_uid(itr)
-            if uid is None:
-                self.render_failed_result()
-                return
-
-            def lookup(story: cached.Story) -> Optional[Viewer]:
-                return story.viewers.get(uid)
-
-        else:
-
-            def lookup(story: cached.Story) -> Optional[Viewer]:
-                for viewer in story.viewers.values():
-                    if viewer.name == self.username:
-                        return viewer
-                return None
-
-        for sid, story in stories:
-            viewer = lookup(story)
+        for sid, story, viewer in entries:
             if viewer is not None or self.all:
                 self.render_entry(sid, story, viewer)
                 lookup_success = True
@@ -85,10 +66,3 @@ class ViewerHistoryRenderer:
         if date_txt:
             self.out.write(f"{', '.join(date_txt)}\n")
         self.out.write("\n")
-
-    def lookup_uid(self, stories: Iterable[tuple[int, cached.Story]]) -> Optional[int]:
-        for _, story in stories:
-            for uid, viewer in story.viewers.items():
-                if viewer.name == self.username:
-                    return uid
-        return None
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+from .constants import CACHE_FOLDER
+
+SYNC_HISTORY_PATH = CACHE_FOLDER / "sync.json"
+_history: Optional[SyncHistory] = None
+
+
+class SyncTarget(BaseModel):
+    """An entry of a targets file. Targets with a higher priority are synced first
+    and the ones with an interval are skipped until it elapses since their last sync"""
+
+    username: str
+    priority: int = 0
+    interval: Optional[timedelta] = None
+
+    @staticmethod
+    def load(path: Path) -> list[SyncTarget]:
+        with open(path, encoding="utf-8") as file:
+            return TypeAdapter(list[SyncTarget]).validate_json(file.read())
+
+
+class SyncHistory(BaseModel):
+    """When each target was last synced successfully (by the sync command)"""
+
+    last: dict[str, datetime] = Field(default_factory=dict)
+
+    @classmethod
+    def get(cls):
+        global _history
+        if _history is not None:
+            return _history
+        if not SYNC_HISTORY_PATH.is_file():
+            _history = cls()
+        else:
+            with open(SYNC_HISTORY_PATH, encoding="utf-8") as file:
+                _history = cls.model_validate_json(file.read())
+        return _history
+
+    def backup(self):
+        SYNC_HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(SYNC_HISTORY_PATH, "w", encoding="utf-8") as file:
+            file.write(self.model_dump_json(indent=2))
+
+    def is_due(self, target: SyncTarget, now: datetime) -> bool:
+        last = self.last.get(target.username)
+        return target.interval is None or last is None or now - last >= target.interval
+
+    def schedule(
+        self, targets: list[SyncTarget], force: bool = False
+    ) -> tuple[list[SyncTarget], list[SyncTarget]]:
+        """Splits the targets into the ones that are due (in the order they should be synced)
+        and the ones that are skipped. Among equal priorities, the least recently synced go first"""
+        now = datetime.now()
+        due: list[SyncTarget] = []
+        skipped: list[SyncTarget] = []
+        for target in targets:
+            (due if force or self.is_due(target, now) else skipped).append(target)
+
+        due.sort(
+            key=lambda target: (
+                -target.priority,
+                self.last.get(target.username, datetime.min),
+            )
+        )
+        return due, skipped
@@ -1,124 +1,382 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from functools import wraps
-from random import uniform
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
 from time import sleep, time
-from typing import TYPE_CHECKING, Any, Optional, Protocol, cast
+from typing import TYPE_CHECKING, Any, Callable, Collection, Optional, TypeVar, cast
+from weakref import WeakKeyDictionary
 
-from .bots import Config
-from .constants import SESSIONS_FOLDER
+from pydantic import BaseModel, ValidationError
+
+from .bots import Config, SessionHealth
+from .constants import SCRAP_CHECKPOINT_TTL, SCRAPS_FOLDER, SESSIONS_FOLDER
+from .rates import RateControl, RateLimits
+from .settings import Settings
 from .tool_logger import logger
 
 if TYPE_CHECKING:
     from instagrapi import Client
     from instagrapi.types import UserShort
 
+ChunkRequest = Callable[[], tuple[list["UserShort"], str]]
+StopHook = Callable[[dict[int, str], dict[int, str]], Optional[dict[int, str]]]
+ResultType = TypeVar("ResultType")
+# a client keeps the state of its last request around, so concurrent scraps take turns
+_request_locks: WeakKeyDictionary[Client, Lock] = WeakKeyDictionary()
 
-class ScrapCallback(Protocol):
-    def __call__(_self, self: Any) -> tuple[list[UserShort], str]: ...
 
+class ScrapChunk(BaseModel):
+    users: dict[int, str]
+    cursor: str
 
-def scrap(callback: ScrapCallback):
-    @wraps(callback)
-    def wrapper(self: Any) -> dict[int, str]:
-        from instagrapi.exceptions import (
-            ChallengeRequired,
-            ClientJSONDecodeError,
-            ClientUnauthorizedError,
-            LoginRequired,
-        )
 
+@dataclass
+class ScrapCheckpoint:
+    """Persists the progress of a scrap (one line per fetched chunk) so that
+    an interrupted scrap can continue from its last cursor instead of starting over"""
+
+    path: Path
+
+    @classmethod
+    def of(cls, target_id: Any, name: str):
+        return cls(SCRAPS_FOLDER / f"{target_id}-{name}.jsonl")
+
+    def load(self) -> tuple[dict[int, str], str]:
         result: dict[int, str] = {}
+        cursor: str = ""
+        if not self.path.is_file():
+            return result, cursor
+        if time() - self.path.stat().st_mtime > SCRAP_CHECKPOINT_TTL:
+            logger.info("discarding stale scrap checkpoint")
+            self.clear()
+            return result, cursor
+
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    chunk = ScrapChunk.model_validate_json(line)
+                except ValidationError:
+                    # the process was killed while the last chunk was being written
+                    break
+                result.update(chunk.users)
+                cursor = chunk.cursor
+
+        logger.info(f"resuming scrap from checkpoint, current user count: {len(result)}")
+        return result, cursor
+
+    def save(self, users: dict[int, str], cursor: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(f"{ScrapChunk(users=users, cursor=cursor).model_dump_json()}\n")
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+@dataclass
+class IncrementalScan:
+    """A stop hook that ends a scrap once a run of `match_run` consecutive fetched
+    users matches the cached list in order (lists are returned roughly newest first).
+    The rest of the list is then inferred from the cache, which is only accepted if
+    the total matches the expected count, otherwise the scrap goes on as a full scan
+    (since removals further down the list can't be told apart from the cache)"""
+
+    known: dict[int, str]
+    user_count: Optional[int]
+    match_run: int
+    positions: dict[int, int] = field(init=False)
+    previous: Optional[int] = None
+    run: int = 0
+    active: bool = True
+
+    def __post_init__(self):
+        self.positions = {uid: position for position, uid in enumerate(self.known)}
+
+    def __call__(
+        self, result: dict[int, str], users: dict[int, str]
+    ) -> Optional[dict[int, str]]:
+        if not self.active:
+            return None
+
+        for uid in users:
+            position = self.positions.get(uid)
+            if position is None:
+                self.run = 0
+            elif self.previous is not None and position == self.previous + 1:
+                self.run += 1
+            else:
+                self.run = 1
+            self.previous = position
+            # a run only goes on through known users
+            if position is not None and self.run >= self.match_run:
+                return self.infer(result, position)
+        return None
+
+    def infer(self, result: dict[int, str], position: int) -> Optional[dict[int, str]]:
+        inferred = result.copy()
+        for uid, username in self.known.items():
+            if self.positions[uid] > position and uid not in inferred:
+                inferred[uid] = username
+
+        if len(inferred) != self.user_count:
+            logger.info(
+                f"matched the cached list but the count differs ({len(inferred)} "
+                f"instead of {self.user_count}), falling back to a full scan"
+            )
+            self.active = False
+            return None
+
+        logger.info(
+            f"matched the cached list after {len(result)} users, "
+            f"inferring the remaining {len(inferred) - len(result)} from cache"
+        )
+        return inferred
+
 
-        if self.user_count is not None:
+@dataclass
+class KnownViewers:
+    """A stop hook for story viewers, which are returned most recent first. Once a run of
+    `match_run` consecutive viewers (or all of them if fewer are known) were already recorded,
+    every viewer after them is assumed to be known as well and the scrap ends with what
+    was fetched so far (which is meant to be merged into the recorded viewers)"""
+
+    known: Collection[int]
+    match_run: int
+    run: int = 0
+
+    def __call__(
+        self, result: dict[int, str], users: dict[int, str]
+    ) -> Optional[dict[int, str]]:
+        match_run = min(self.match_run, len(self.known))
+        if match_run == 0:
+            return None
+        for uid in users:
+            self.run = self.run + 1 if uid in self.known else 0
+            if self.run >= match_run:
+                logger.info(
+                    f"reached already recorded viewers after {len(result)} users, "
+                    "skipping the rest"
+                )
+                return result
+        return None
+
+
+def fingerprint(users: dict[int, str]) -> str:
+    """A cheap digest of a chunk of users (in order) to tell whether a list has changed"""
+    digest = hashlib.blake2b(digest_size=8)
+    for uid, username in users.items():
+        digest.update(f"{uid}:{username};".encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class ListGate:
+    """A stop hook that fingerprints the first chunk of a list and, if `enabled`,
+    ends the scrap right there with the known list as is when nothing seems to have
+    changed (i.e. the expected count matches it and so does the fingerprint recorded
+    last time). Later chunks are passed on to the `then` hook (if any)"""
+
+    known: dict[int, str]
+    user_count: Optional[int]
+    previous: Optional[str]
+    enabled: bool = True
+    then: Optional[StopHook] = None
+    fingerprint: Optional[str] = None
+    gated: bool = False
+
+    def __call__(
+        self, result: dict[int, str], users: dict[int, str]
+    ) -> Optional[dict[int, str]]:
+        # a scrap resumed from a checkpoint does not start from the first chunk
+        if self.fingerprint is None and len(result) == len(users):
+            self.fingerprint = fingerprint(users)
+            if (
+                self.enabled
+                and self.fingerprint == self.previous
+                and self.user_count == len(self.known)
+            ):
+                logger.info("same count and first chunk as last time, skipping the rest")
+                self.gated = True
+                return self.known.copy()
+        return self.then(result, users) if self.then is not None else None
+
+
+RETRY_PROMPT = (
+    "loop was terminated by instagram before fetching all users, should it continue trying?"
+)
+
+
+@dataclass
+class ScrapSession:
+    """The state of a single scrap (i.e. a paginated loop over one list),
+    shared by both the sequential and the asyncio based loops"""
+
+    scrapper: Scrapper
+    name: str
+    result: dict[int, str] = field(default_factory=dict)
+    checkpoint: Optional[ScrapCheckpoint] = None
+    completed: bool = False
+    # consecutive retries, i.e. reset whenever the scrap makes progress
+    attempts: int = 0
+
+    def __post_init__(self):
+        scrapper = self.scrapper
+        if scrapper.resumable:
+            self.checkpoint = ScrapCheckpoint.of(scrapper.target_id, self.name)
+            self.result, scrapper.cursor = self.checkpoint.load()
+
+        if scrapper.user_count is not None:
             logger.debug(
                 "scrapping a total of %d users in chunks of size %d from target with id %s",
-                self.user_count,
-                self.chunk_size,
-                self.target_id,
+                scrapper.user_count,
+                scrapper.chunk_size,
+                scrapper.target_id,
             )
         else:
             logger.debug(
                 "scrapping users in chunks of size %d from target with id %s",
-                self.chunk_size,
-                self.target_id,
+                scrapper.chunk_size,
+                scrapper.target_id,
             )
 
-        def retry() -> bool:
-            start = time()
-            if (
-                input(
-                    "loop was terminated by instagram before fetching all users, should it continue trying? (Y/n) "
-                ).strip()
-                != "Y"
-            ):
-                return False
+    @staticmethod
+    def recoverable_errors() -> tuple[type[Exception], ...]:
+        from instagrapi.exceptions import (
+            ChallengeRequired,
+            ClientJSONDecodeError,
+            ClientUnauthorizedError,
+            LoginRequired,
+        )
 
-            diff = time() - start
-            duration = uniform(5, 10)
-            if duration > diff:
-                duration -= diff
-                logger.debug("sleeping for %f seconds", duration)
-                sleep(duration)
-
-            bot = Config.get().bots[self.client.user_id]
-            client: Client = self.client
-            client.logout()
-            client.login(
-                bot.username,
-                bot.password,
-                relogin=True,
-                verification_code=bot.tfa_code,
-            )
-            client.dump_settings(SESSIONS_FOLDER / f"{client.user_id}.json")
-            client.relogin_attempt -= 1
-            logger.debug("reloged in")
-            return True
+        return (
+            ChallengeRequired,
+            ClientJSONDecodeError,
+            ClientUnauthorizedError,
+            LoginRequired,
+        )
 
-        while True:
-            try:
-                user_list, cursor = callback(self)
-            except (ClientUnauthorizedError, LoginRequired):
-                if not retry():
-                    break
-                continue
-            except (ClientJSONDecodeError, ChallengeRequired):
-                if (
-                    input(
-                        "json decode failure possibly due to a challenge, should it continue? (Y/n) "
-                    ).strip()
-                    == "Y"
-                ):
-                    continue
-                break
+    def wait(self) -> None:
+        duration = self.scrapper.limiter.reserve()
+        if duration > 0:
+            logger.debug("sleeping for %f seconds", duration)
+            sleep(duration)
 
-            logger.debug(
-                "fetched chunk with total users %d and next cursor being '%s'",
-                len(user_list),
-                cursor,
-            )
-            result.update(
-                (int(user.pk), cast(str, user.username)) for user in user_list
-            )
-            logger.info(f"current user count: {len(result)}")
-
-            if not cursor:
-                if (
-                    self.user_count is not None
-                    and len(result) != self.user_count
-                    and retry()
-                ):
-                    continue
-                break
+    async def wait_async(self) -> None:
+        duration = self.scrapper.limiter.reserve()
+        if duration > 0:
+            await asyncio.sleep(duration)
+
+    def recover(self, error: Exception) -> tuple[str, bool]:
+        """Takes note of a failed request, returning the prompt of the decision
+        whether to retry it and whether to login again first (see `retry`)"""
+        from instagrapi.exceptions import ClientUnauthorizedError, LoginRequired
+
+        self.scrapper.limiter.failure()
+        if isinstance(error, (ClientUnauthorizedError, LoginRequired)):
+            SessionHealth.of(self.scrapper.client.user_id).failed(error)
+            return RETRY_PROMPT, True
+        return "json decode failure possibly due to a challenge, should it continue?", False
+
+    def backoff(self, prompt: str) -> Optional[float]:
+        """Consults the retry policy (which may prompt), returning how long
+        to wait before retrying or `None` if the scrap should end"""
+        policy = Settings.get().retry
+        if not policy.should_retry(self.attempts, prompt):
+            return None
+
+        duration = policy.delay(self.attempts)
+        self.attempts += 1
+        if duration > 0:
+            logger.info(f"retrying in {duration} seconds (attempt {self.attempts})")
+        return duration
+
+    def retry(self, prompt: str = RETRY_PROMPT, relogin: bool = True) -> bool:
+        duration = self.backoff(prompt)
+        if duration is None:
+            return False
+        sleep(duration)
+        # the cooldown imposed by the failure keeps elapsing while waiting for input
+        self.wait()
+        if relogin and Settings.get().retry.relogin:
+            self.relogin()
+        return True
 
-            self.cursor = cursor
-            sleep(uniform(2, 4))
+    async def retry_async(self, prompt: str = RETRY_PROMPT, relogin: bool = True) -> bool:
+        """Same as `retry` without blocking the other scraps, prompts and logins
+        happen in a worker thread (the latter in turn with their requests)"""
+        duration = await asyncio.to_thread(self.backoff, prompt)
+        if duration is None:
+            return False
+        await asyncio.sleep(duration)
+        await self.wait_async()
+        if relogin and Settings.get().retry.relogin:
+            await asyncio.to_thread(self.scrapper.request, self.relogin)
+        return True
 
-        logger.debug("finished scrapping (no next cursor was returned)")
-        return result
+    def relogin(self) -> None:
+        bot = Config.get().bots[self.scrapper.client.user_id]
+        client: Client = self.scrapper.client
+        client.logout()
+        client.login(
+            bot.username,
+            bot.password,
+            relogin=True,
+            verification_code=bot.tfa_code,
+        )
+        client.dump_settings(SESSIONS_FOLDER / f"{client.user_id}.json")
+        client.relogin_attempt -= 1
+        SessionHealth.of(client.user_id).verified()
+        logger.debug("reloged in")
+
+    def process(self, user_list: list[UserShort], cursor: str) -> bool:
+        """Merges a fetched chunk into the result and decides whether the loop should go on.
+        A list that ended short of the expected count is neither continued nor completed"""
+        logger.debug(
+            "fetched chunk with total users %d and next cursor being '%s'",
+            len(user_list),
+            cursor,
+        )
+        users: dict[int, str] = {
+            int(user.pk): cast(str, user.username) for user in user_list
+        }
+        self.result.update(users)
+        logger.info(f"current user count: {len(self.result)}")
+
+        if self.scrapper.stop is not None:
+            result = self.scrapper.stop(self.result, users)
+            if result is not None:
+                self.result = result
+                self.completed = True
+                return False
+
+        if not cursor:
+            user_count = self.scrapper.user_count
+            if user_count is not None and len(self.result) != user_count:
+                # left to the loop to retry (or not)
+                self.scrapper.limiter.failure()
+                return False
+            self.completed = True
+            return False
 
-    return wrapper
+        self.attempts = 0
+        self.scrapper.cursor = cursor
+        if self.checkpoint is not None:
+            self.checkpoint.save(users, cursor)
+        return True
+
+    def finish(self) -> dict[int, str]:
+        RateLimits.get().backup()
+        if not self.completed:
+            logger.debug("scrapping was interrupted, its progress is kept for resuming")
+            return self.result
+
+        logger.debug("finished scrapping")
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+        return self.result
 
 
 @dataclass
@@ -128,21 +386,96 @@ class Scrapper:
     user_count: Optional[int] = None
     chunk_size: int = 100
     cursor: str = ""
+    resumable: bool = True
+    limiter: RateControl = field(default=None)  # type: ignore[assignment]
+    stop: Optional[StopHook] = None
+
+    def __post_init__(self):
+        if self.limiter is None:
+            # shared by every scrap running on the same bot
+            self.limiter = RateLimits.get().of(self.client.user_id)
+
+    def request(self, request: Callable[[], ResultType]) -> ResultType:
+        """Performs a request on the client, once no other scrap is using it"""
+        with _request_locks.setdefault(self.client, Lock()):
+            return request()
+
+    def scrap(self, name: str, request: ChunkRequest) -> dict[int, str]:
+        session = ScrapSession(self, name)
+        errors = session.recoverable_errors()
+
+        while True:
+            session.wait()
+            try:
+                user_list, cursor = self.request(request)
+            except errors as error:
+                if session.retry(*session.recover(error)):
+                    continue
+                break
+            self.limiter.success()
+            if not session.process(user_list, cursor):
+                if not session.completed and session.retry():
+                    continue
+                # a list that ended short is kept as is unless it was retried
+                session.completed = True
+                break
+
+        return session.finish()
+
+    async def scrap_async(self, name: str, request: ChunkRequest) -> dict[int, str]:
+        """Same as `scrap` but requests are performed in a worker thread and paced by
+        the limiter shared with the other scraps of the bot, so that several of them can overlap.
+        Only their waits do, the requests of a client are still made one at a time"""
+        session = ScrapSession(self, name)
+        errors = session.recoverable_errors()
 
-    @scrap
-    def fetch_followers(self):
+        while True:
+            await session.wait_async()
+            try:
+                user_list, cursor = await asyncio.to_thread(self.request, request)
+            except errors as error:
+                if await session.retry_async(*session.recover(error)):
+                    continue
+                break
+            self.limiter.success()
+            if not session.process(user_list, cursor):
+                if not session.completed and await session.retry_async():
+                    continue
+                # a list that ended short is kept as is unless it was retried
+                session.completed = True
+                break
+
+        return session.finish()
+
+    def followers_chunk(self):
         return self.client.user_followers_gql_chunk(
             self.target_id, self.chunk_size, self.cursor
         )
 
-    @scrap
-    def fetch_followings(self):
+    def followings_chunk(self):
         return self.client.user_following_gql_chunk(
             self.target_id, self.chunk_size, self.cursor
         )
 
-    @scrap
-    def fetch_story_viewers(self):
+    def story_viewers_chunk(self):
         return self.client.story_viewers_chunk(
             int(self.target_id), self.chunk_size, self.cursor
         )
+
+    def fetch_followers(self) -> dict[int, str]:
+        return self.scrap("followers", self.followers_chunk)
+
+    def fetch_followings(self) -> dict[int, str]:
+        return self.scrap("followings", self.followings_chunk)
+
+    def fetch_story_viewers(self) -> dict[int, str]:
+        return self.scrap("story_viewers", self.story_viewers_chunk)
+
+    async def fetch_followers_async(self) -> dict[int, str]:
+        return await self.scrap_async("followers", self.followers_chunk)
+
+    async def fetch_followings_async(self) -> dict[int, str]:
+        return await self.scrap_async("followings", self.followings_chunk)
+
+    async def fetch_story_viewers_async(self) -> dict[int, str]:
+        return await self.scrap_async("story_viewers", self.story_viewers_chunk)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Any, Literal, Optional, TypeAlias
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .constants import CONFIG_FOLDER
+
+StorageType: TypeAlias = Literal["json", "sqlite"]
+StateFormatType: TypeAlias = Literal["json", "binary"]
+CodecType: TypeAlias = Literal["none", "gzip", "lzma"]
+PartialType: TypeAlias = Literal["ask", "commit", "discard"]
+
+SETTINGS_PATH = CONFIG_FOLDER / "settings.json"
+STORAGES: tuple[StorageType, ...] = ("json", "sqlite")
+STATE_FORMATS: tuple[StateFormatType, ...] = ("json", "binary")
+CODECS: tuple[CodecType, ...] = ("none", "gzip", "lzma")
+PARTIALS: tuple[PartialType, ...] = ("ask", "commit", "discard")
+_settings: Optional[Settings] = None
+
+
+class RetryPolicy(BaseModel):
+    """Answers the decisions that would otherwise be prompted for when instagram
+    pushes back, so that unattended runs neither hang nor need babysitting.
+    A value of "ask" keeps prompting for that decision"""
+
+    retries: int | Literal["ask"] = "ask"
+    backoff: list[float] = Field(default_factory=list)
+    relogin: bool = True
+    partial: PartialType = "ask"
+
+    def should_retry(self, attempt: int, prompt: str) -> bool:
+        """Whether a scrap should go on after its `attempt`-th consecutive failure (from 0)"""
+        if self.retries == "ask":
+            return input(f"{prompt} (Y/n) ").strip() == "Y"
+        return attempt < self.retries
+
+    def delay(self, attempt: int) -> float:
+        """How long to wait before the `attempt`-th consecutive retry (the last one of the schedule repeats)"""
+        if not self.backoff:
+            return 0
+        return self.backoff[min(attempt, len(self.backoff) - 1)]
+
+    def commit_partial(self, prompt: str) -> bool:
+        if self.partial == "ask":
+            return input(f"{prompt} (Y/n) ").strip() == "Y"
+        return self.partial == "commit"
+
+
+class Settings(BaseModel):
+    """Persistent tool-wide preferences. These are set through the global
+    command line options and are remembered for later invocations,
+    except for the retry policy which the options only override for the current one"""
+
+    storage: StorageType = "json"
+    # the format of the state files written by the json storage
+    state_format: StateFormatType = "json"
+    # the compression of the files written by the json storage
+    codec: CodecType = "none"
+    retry: RetryPolicy = Field(default_factory=RetryPolicy)
+    # the configured values of the fields overridden for the current invocation only
+    _configured: dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def get(cls):
+        global _settings
+        if _settings is not None:
+            return _settings
+        if not SETTINGS_PATH.is_file():
+            _settings = cls()
+        else:
+            with open(SETTINGS_PATH, encoding="utf-8") as file:
+                _settings = cls.model_validate_json(file.read())
+        return _settings
+
+    def backup(self):
+        if not CONFIG_FOLDER.is_dir():
+            CONFIG_FOLDER.mkdir()
+        with open(SETTINGS_PATH, "w", encoding="utf-8") as file:
+            file.write(
+                self.model_copy(update=self._configured).model_dump_json(indent=2)
+            )
+
+    def update(self, persist: bool = True, **fields: Any):
+        """Overrides the specified fields (ignoring the ones that are `None`)
+        and backs up the result if anything changed, unless `persist` is unset.
+        Nested settings are given as a dict of their own fields (following the same rules)"""
+        for name, value in fields.items():
+            if isinstance(value, dict):
+                current: BaseModel = getattr(self, name)
+                fields[name] = current.model_copy(
+                    update={key: item for key, item in value.items() if item is not None}
+                )
+        changes = {
+            name: value
+            for name, value in fields.items()
+            if value is not None and getattr(self, name) != value
+        }
+        if not changes:
+            return
+        for name, value in changes.items():
+            if not persist:
+                self._configured.setdefault(name, getattr(self, name))
+            setattr(self, name, value)
+        if persist:
+            self.backup()
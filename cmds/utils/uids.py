@@ -1,10 +1,15 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Mapping, Optional
+from . import database
 from .constants import CACHE_FOLDER
+from .settings import Settings
 
 UIDS_PATH = CACHE_FOLDER / "uids.json"
+USERNAMES_PATH = CACHE_FOLDER / "usernames.json"
+USERNAMES_JOURNAL_PATH = CACHE_FOLDER / "usernames.jsonl"
 _uid_map: Optional[UIDMap] = None
+_username_table: Optional[UsernameTable] = None
 
 
 class UIDMap(BaseModel):
@@ -15,23 +20,145 @@ class UIDMap(BaseModel):
         global _uid_map
         if _uid_map is not None:
             return _uid_map
-        if not UIDS_PATH.is_file():
-            _uid_map = cls()
+        if Settings.get().storage == "sqlite":
+            _uid_map = cls.from_database()
         else:
-            with open(UIDS_PATH, encoding="utf-8") as file:
-                _uid_map = cls.model_validate_json(file.read())
+            _uid_map = cls.from_file()
         return _uid_map
 
+    @classmethod
+    def from_file(cls):
+        if not UIDS_PATH.is_file():
+            return cls()
+        with open(UIDS_PATH, encoding="utf-8") as file:
+            return cls.model_validate_json(file.read())
+
+    @classmethod
+    def from_database(cls):
+        rows = database.connect().execute("SELECT username, uid FROM uids")
+        return cls.model_construct(table=dict(rows))
+
     def backup(self):
+        if Settings.get().storage == "sqlite":
+            self.to_database()
+            return
         if not CACHE_FOLDER.is_dir():
             CACHE_FOLDER.mkdir()
         with open(UIDS_PATH, "w", encoding="utf-8") as file:
             file.write(self.model_dump_json(indent=2))
 
+    def to_database(self):
+        with database.connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO uids (username, uid) VALUES (?, ?)",
+                self.table.items(),
+            )
+
     def add_entry(self, username: str, uid: int, backup: bool = True):
+        if self.table.get(username) == uid:
+            return
         self.table[username] = uid
         if backup:
             self.backup()
 
     def uid_of(self, username: str):
         return self.table.get(username)
+
+
+class UsernameChanges(BaseModel):
+    """A line of the journal of the `UsernameTable`"""
+
+    # when the names became current (`None` for names that were never known otherwise)
+    at: Optional[float] = None
+    names: dict[int, str] = Field(default_factory=dict)
+
+
+class UsernameTable(BaseModel):
+    """The known usernames of every user that appears in any cached state (with the json
+    storage), shared by all of them so that their current lists only store the uids of users
+    whose name matches it. The names a user had before being renamed are kept along with
+    when they stopped being current, so that every state still resolves the names it was
+    last synced with. Changes are appended to a journal, which is folded back into the table
+    by `backup`"""
+
+    names: dict[int, str] = Field(default_factory=dict)
+    # the names users had until a point in time (in order), i.e. before being renamed
+    previous: dict[int, list[tuple[float, str]]] = Field(default_factory=dict)
+    # the changes recorded since the table was last persisted
+    _changes: list[UsernameChanges] = PrivateAttr(default_factory=list)
+
+    @classmethod
+    def get(cls):
+        global _username_table
+        if _username_table is None:
+            _username_table = cls.from_file()
+        return _username_table
+
+    @classmethod
+    def from_file(cls):
+        table = cls()
+        if USERNAMES_PATH.is_file():
+            with open(USERNAMES_PATH, encoding="utf-8") as file:
+                table = cls.model_validate_json(file.read())
+        if USERNAMES_JOURNAL_PATH.is_file():
+            with open(USERNAMES_JOURNAL_PATH, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        table.apply(UsernameChanges.model_validate_json(line))
+        return table
+
+    def backup(self):
+        if not CACHE_FOLDER.is_dir():
+            CACHE_FOLDER.mkdir()
+        with open(USERNAMES_PATH, "w", encoding="utf-8") as file:
+            file.write(self.model_dump_json())
+        USERNAMES_JOURNAL_PATH.unlink(missing_ok=True)
+        self._changes.clear()
+
+    def apply(self, changes: UsernameChanges):
+        names, previous = self.names, self.previous
+        for uid, username in changes.names.items():
+            current = names.get(uid)
+            if current is not None and changes.at is not None:
+                previous.setdefault(uid, []).append((changes.at, current))
+            names[uid] = username
+
+    def record(self, users: Mapping[int, str], at: Optional[float] = None):
+        """Takes note of the names of `users` as of `at`, replacing the ones already known.
+        Without a point in time only the names of unknown users are recorded
+        (i.e. the names may be outdated)"""
+        names = self.names
+        changes = UsernameChanges(at=at)
+        for uid, username in users.items():
+            current = names.get(uid)
+            if current is None or (at is not None and current != username):
+                changes.names[uid] = username
+        if changes.names:
+            self.apply(changes)
+            self._changes.append(changes)
+
+    def commit(self):
+        """Persists the recorded names, which has to happen before
+        anything referring to them (by uid alone) is written"""
+        if not self._changes:
+            return
+        # the journal is folded once replaying it costs more than reading the table
+        if (
+            not USERNAMES_PATH.is_file()
+            or USERNAMES_JOURNAL_PATH.is_file()
+            and USERNAMES_JOURNAL_PATH.stat().st_size > USERNAMES_PATH.stat().st_size
+        ):
+            self.backup()
+            return
+        with open(USERNAMES_JOURNAL_PATH, "a", encoding="utf-8") as file:
+            for changes in self._changes:
+                file.write(f"{changes.model_dump_json()}\n")
+        self._changes.clear()
+
+    def name_at(self, uid: int, at: Optional[float]) -> Optional[str]:
+        """The name `uid` had at `at` (its latest one if `None`)"""
+        if at is not None:
+            for until, username in self.previous.get(uid, ()):
+                if at < until:
+                    return username
+        return self.names.get(uid)
@@ -0,0 +1,95 @@
+from array import array
+from collections.abc import Sequence, Sized
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+# numpy is an optional dependency, when it's missing (or the lists are small)
+# the plain dict based implementation in `mixins.User` is used instead
+try:
+    import numpy as np
+except ImportError:
+    # the module isn't used unless `enabled` found it
+    np = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+else:
+    NDArray = Any
+
+MIN_SIZE = 5_000
+
+
+class SortedUsers(NamedTuple):
+    """A user list as parallel arrays, sorted by uid"""
+
+    uids: "NDArray[np.int64]"
+    names: "NDArray[np.object_]"
+
+    @classmethod
+    def of(cls, users: dict[int, str]):
+        uids = np.fromiter(users.keys(), dtype=np.int64, count=len(users))
+        names = np.empty(len(users), dtype=object)
+        names[:] = list(users.values())
+        order = uids.argsort()
+        return cls(uids[order], names[order])
+
+    def positions_in(self, other: "SortedUsers") -> tuple["NDArray[np.bool_]", Any]:
+        """Locates each of the uids in `other`, returning a mask of the ones
+        that were found and the position (in `other`) of every uid"""
+        if not len(other.uids):
+            return np.zeros(len(self.uids), dtype=np.bool_), np.zeros(
+                len(self.uids), dtype=np.intp
+            )
+        positions = np.searchsorted(other.uids, self.uids)
+        positions[positions == len(other.uids)] = 0
+        return other.uids[positions] == self.uids, positions
+
+
+def enabled(*lists: Sized) -> bool:
+    return np is not None and max(map(len, lists)) >= MIN_SIZE
+
+
+def added(current: SortedUsers, other: SortedUsers) -> dict[int, str]:
+    mask, _ = current.positions_in(other)
+    mask = ~mask
+    return dict(zip(current.uids[mask].tolist(), current.names[mask].tolist()))
+
+
+def mutuals(
+    users: dict[int, str], current: SortedUsers, other: SortedUsers
+) -> dict[int, str]:
+    mask, _ = current.positions_in(other)
+    missing = current.uids[~mask]
+    if len(missing) > len(current.uids) // 2:
+        return dict(zip(current.uids[mask].tolist(), current.names[mask].tolist()))
+
+    # when most of the users are mutuals it's far cheaper to copy and drop the rest
+    result = users.copy()
+    for uid in missing.tolist():
+        del result[uid]
+    return result
+
+
+def renamed(current: SortedUsers, other: SortedUsers) -> dict[int, tuple[str, str]]:
+    mask, positions = current.positions_in(other)
+    new_names = current.names[mask]
+    old_names = other.names[positions[mask]]
+    changed = new_names != old_names
+    return dict(
+        zip(
+            current.uids[mask][changed].tolist(),
+            zip(old_names[changed].tolist(), new_names[changed].tolist()),
+        )
+    )
+
+
+def grouped(
+    keys: array, distinct: Sequence[int], *columns: array
+) -> tuple[list[int], list[list[int]]]:
+    """See `viewer_index.grouped`"""
+    values = np.frombuffer(keys, dtype=keys.typecode)
+    order = values.argsort(kind="stable")
+    offsets = np.searchsorted(values[order], np.asarray(distinct, dtype=values.dtype))
+    return offsets.tolist(), [
+        np.frombuffer(column, dtype=column.typecode)[order].tolist()
+        for column in columns
+    ]
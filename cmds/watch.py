@@ -0,0 +1,72 @@
+from argparse import ArgumentParser, Namespace
+from datetime import timedelta
+from time import sleep, time
+
+from .sync import create_pool, load_targets, record, report, setup_pool_parser
+from .utils.constants import WATCH_INTERVAL_MINUTES
+from .utils.schedule import SyncHistory
+from .utils.tool_logger import logger
+
+
+def run(args: Namespace):
+    pool = create_pool(args)
+    targets = load_targets(args)
+    if not targets:
+        args.out.write("No targets to watch\n")
+        return
+
+    history = SyncHistory.get()
+    default = timedelta(minutes=args.interval)
+    intervals: dict[str, float] = {
+        target.username: (target.interval or default).total_seconds()
+        for target in targets
+    }
+    due_at: dict[str, float] = {
+        target.username: (
+            history.last[target.username].timestamp() + intervals[target.username]
+            if target.username in history.last
+            else 0
+        )
+        for target in targets
+    }
+
+    # the clients (and the cached records loaded by each sync) are kept in memory
+    # between rounds so that only the first one pays for logging in and loading
+    pool.login()
+    logger.info(f"watching {len(targets)} targets, press Ctrl+C to stop")
+    try:
+        while True:
+            now = time()
+            due = sorted(
+                (target for target in targets if due_at[target.username] <= now),
+                key=lambda target: (-target.priority, due_at[target.username]),
+            )
+            if not due:
+                duration = min(due_at.values()) - now
+                logger.debug("sleeping for %f seconds until the next target is due", duration)
+                sleep(duration)
+                continue
+
+            start = time()
+            results = pool.run(target.username for target in due)
+            for result in results:
+                due_at[result.target] = time() + intervals[result.target]
+            record(history, results)
+            report(args.out, history, results, [], time() - start)
+            args.out.write("\n")
+            args.out.flush()
+    except KeyboardInterrupt:
+        logger.info("stopped watching")
+
+
+def setup_parser(parser: ArgumentParser):
+    setup_pool_parser(parser)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=WATCH_INTERVAL_MINUTES,
+        metavar="MINUTES",
+        help="How often to sync the targets that don't specify their own interval "
+        "(defaults to %(default)s)",
+    )
+    parser.set_defaults(func=run)
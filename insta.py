@@ -1,6 +1,20 @@
-from argparse import ArgumentParser
+from argparse import ArgumentParser, BooleanOptionalAction
 
-from cmds import checkout, compare, diff, listbots, log, login, state, story
+from cmds import (
+    cache,
+    checkout,
+    compare,
+    diff,
+    listbots,
+    log,
+    login,
+    state,
+    story,
+    sync,
+    watch,
+)
+from cmds.utils.parsers import retries_parser
+from cmds.utils.settings import CODECS, PARTIALS, STATE_FORMATS, STORAGES, Settings
 from cmds.utils.tool_logger import setup as setup_logger
 
 
@@ -24,6 +38,49 @@ def main():
         dest="tfa_seed",
         help="The 2fa seed to generate codes from (if required)",
     )
+    parser.add_argument(
+        "--storage",
+        choices=STORAGES,
+        help="The storage backend to use for the cache (remembered for later invocations)",
+    )
+    parser.add_argument(
+        "--state-format",
+        choices=STATE_FORMATS,
+        help="The format to write the state files of the json storage in, 'binary' being "
+        "a compact one that is read in place (remembered for later invocations)",
+    )
+    parser.add_argument(
+        "--codec",
+        choices=CODECS,
+        help="The compression of the cache files of the json storage "
+        "(remembered for later invocations)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=retries_parser,
+        help="How many consecutive times a scrap should retry after instagram pushes back "
+        "or 'ask' to prompt every time (overrides the configured policy for this run)",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        nargs="+",
+        metavar="SECONDS",
+        help="How long to wait before each consecutive retry, the last one repeating "
+        "(overrides the configured policy for this run)",
+    )
+    parser.add_argument(
+        "--relogin",
+        action=BooleanOptionalAction,
+        help="Whether to login again before retrying after the session was rejected "
+        "(overrides the configured policy for this run)",
+    )
+    parser.add_argument(
+        "--partial",
+        choices=PARTIALS,
+        help="Whether to cache a result that is missing users, "
+        "or 'ask' to prompt every time (overrides the configured policy for this run)",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -84,9 +141,42 @@ def main():
             "listbots", help="List all of the currently configured bots"
         )
     )
+    sync.setup_parser(
+        subparsers.add_parser(
+            "sync",
+            help="Logs the current state of many accounts at once "
+            "by spreading them across the configured bots",
+        )
+    )
+    watch.setup_parser(
+        subparsers.add_parser(
+            "watch",
+            help="Keeps running and syncs each of the accounts at its own interval, "
+            "staying logged in between rounds",
+        )
+    )
+    cache.setup_parser(
+        subparsers.add_parser(
+            "cache", help="Maintenance operations on the cached records"
+        )
+    )
 
     args = parser.parse_args()
     setup_logger(args.verbose)
+    Settings.get().update(
+        storage=args.storage,
+        state_format=args.state_format,
+        codec=args.codec,
+    )
+    Settings.get().update(
+        persist=False,
+        retry=dict(
+            retries=args.retries,
+            backoff=args.backoff,
+            relogin=args.relogin,
+            partial=args.partial,
+        ),
+    )
     args.func(args)
 
 
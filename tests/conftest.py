@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+from pydantic import Field
+
+from cmds.models import cached, fetched
+from cmds.models.cached import user as cached_user
+from cmds.models.mixins import cached as cached_mixin
+from cmds.utils import database, settings, uids
+
+START = datetime(2024, 1, 1, 12)
+
+Lists = dict[str, dict[int, str]]
+
+
+@pytest.fixture(autouse=True)
+def scratch(tmp_path, monkeypatch):
+    """Every test runs against an empty cache in a scratch directory,
+    with the changelog entries timestamped by a clock of its own"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "_settings", None)
+    monkeypatch.setattr(uids, "_uid_map", None)
+    monkeypatch.setattr(uids, "_username_table", None)
+    monkeypatch.setattr(database, "_connection", None)
+    monkeypatch.setattr(cached_mixin, "_cached", {})
+
+    clock = {"now": START}
+
+    class ClockedEntry(cached.ChangelogEntry):
+        timestamp: datetime = Field(default_factory=lambda: clock["now"])
+
+    monkeypatch.setattr(cached_user, "ChangelogEntry", ClockedEntry)
+    yield clock
+    if database._connection is not None:
+        database._connection.close()
+
+
+def reload() -> None:
+    """Forgets everything loaded so far, as a new invocation would"""
+    cached_mixin._cached.clear()
+    uids._username_table = None
+
+
+def sync(target: str, uid: int, lists: Lists) -> None:
+    cached.User.get(target).dump_update(
+        fetched.User(
+            username=target,
+            id=uid,
+            followers=dict(lists["followers"]),
+            followings=dict(lists["followings"]),
+            follower_count=len(lists["followers"]),
+            following_count=len(lists["followings"]),
+        )
+    )
@@ -0,0 +1,104 @@
+"""The changelog index (json storage): syncs only append to its journal and lookups by
+username only decode the entries that mention it"""
+
+from datetime import timedelta
+
+import pytest
+from conftest import START, reload, sync
+
+from cmds.models import cached
+from cmds.models.cached import user as cached_user
+from cmds.models.cached.index import ChangelogIndex
+from cmds.utils import settings
+
+ENTRIES = 40
+
+
+def build(clock: dict) -> None:
+    """Syncs a target daily, each day adding a user (`user{day}`) that's renamed
+    (to `renamed{day}`) the day after and removed the day after that"""
+    for day in range(ENTRIES):
+        clock["now"] = START + timedelta(days=day)
+        followers = {day: f"user{day}"}
+        if day >= 1:
+            followers[day - 1] = f"renamed{day - 1}"
+        sync("target", 7, {"followers": followers, "followings": {}})
+
+
+@pytest.fixture
+def decoded(monkeypatch) -> list[int]:
+    """Keeps track of the changelog entries that are decoded"""
+    positions: list[int] = []
+    entry = cached_user.LazyList.entry
+
+    def tracked(self, index):
+        if isinstance(self, cached_user.LazyChangelog) and isinstance(
+            self.items[index], (str, int)
+        ):
+            positions.append(index)
+        return entry(self, index)
+
+    monkeypatch.setattr(cached_user.LazyList, "entry", tracked)
+    return positions
+
+
+@pytest.mark.parametrize("state_format", ["json", "binary"])
+def test_lookup_decodes_the_mentions_only(scratch, decoded, state_format):
+    settings.Settings.get().update(state_format=state_format)
+    build(scratch)
+    cached.User.get("target").dump("target", 7)
+    reload()
+    decoded.clear()
+
+    history = list(cached.User.history("target", mention="user10"))
+    # added (as user10), renamed (from it) and removed (as renamed10) the days after
+    assert len(decoded) == 2
+    assert [entry.timestamp.date() for entry in history] == [
+        (START + timedelta(days=day)).date() for day in reversed(range(ENTRIES))
+    ]
+    mentions = [entry for entry in history if entry.change_count]
+    assert [entry.timestamp.date() for entry in mentions] == [
+        (START + timedelta(days=day)).date() for day in (11, 10)
+    ]
+    assert mentions[0].followers.renamed == {10: ("user10", "renamed10")}
+    assert mentions[1].followers.added == {10: "user10"}
+
+
+def test_syncs_only_append_to_the_journal(scratch):
+    build(scratch)
+    path = cached.User.index_path_of(7)
+    journal = ChangelogIndex.journal_path_of(path)
+    assert not path.exists()
+    with open(journal, encoding="utf-8") as file:
+        assert len(file.readlines()) == ENTRIES
+
+    # the index is folded once it's read
+    assert cached.User.changelog_index("target").size == ENTRIES
+    assert path.is_file() and not journal.exists()
+    folded = path.read_text(encoding="utf-8")
+
+    scratch["now"] = START + timedelta(days=ENTRIES)
+    sync("target", 7, {"followers": {}, "followings": {}})
+    assert path.read_text(encoding="utf-8") == folded
+    with open(journal, encoding="utf-8") as file:
+        assert len(file.readlines()) == 1
+    reload()
+    postings = cached.User.changelog_index("target").postings_of_uid(39)
+    assert [change_type for _, _, change_type in postings] == ["added", "removed"]
+
+
+def test_unjournaled_entries_are_indexed(scratch):
+    build(scratch)
+    cached.User.changelog_index("target")
+    path = cached.User.index_path_of(7)
+    # e.g. synced while the journal couldn't be written
+    path.unlink()
+    scratch["now"] = START + timedelta(days=ENTRIES)
+    sync("target", 7, {"followers": {}, "followings": {}})
+    reload()
+
+    index = cached.User.changelog_index("target")
+    assert index.size == ENTRIES + 1
+    assert index.uids_of("user0") == {0}
+    postings = index.postings_of_uid(39)
+    assert [change_type for _, _, change_type in postings] == ["added", "removed"]
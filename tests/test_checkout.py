@@ -0,0 +1,134 @@
+"""Round trips of cached states through every storage, format and codec: checkouts
+(and lookups by username) must reconstruct the lists exactly as they were fetched,
+including the names users had back then"""
+
+import random
+from datetime import timedelta
+
+import pytest
+from conftest import START, Lists, reload, sync
+
+from cmds.models import cached
+from cmds.utils import settings, uids
+from cmds.utils.constants import LISTS
+
+DAYS = 30
+STORAGES = [
+    ("json", "json", "none"),
+    ("json", "binary", "none"),
+    ("json", "json", "gzip"),
+    ("json", "binary", "lzma"),
+    ("sqlite", "json", "none"),
+]
+
+
+def build(clock: dict, seed: int = 0) -> tuple[list[Lists], set[str]]:
+    """Syncs two targets with overlapping lists daily (the first one skipping every
+    third day) while users keep being renamed, returning the lists of the first target
+    as of the end of each day and every name its users were ever fetched with"""
+    rng = random.Random(seed)
+    names = {uid: f"user{uid}" for uid in range(1, 200)}
+    members: dict[str, set[int]] = {list_name: set() for list_name in LISTS}
+    other: set[int] = set()
+    snapshots: list[Lists] = []
+    fetched_names: set[str] = set()
+    lists: Lists = {list_name: {} for list_name in LISTS}
+
+    for day in range(DAYS):
+        for group in (*members.values(), other):
+            for uid in rng.sample(sorted(group), min(len(group), 2)):
+                group.discard(uid)
+            group.update(rng.sample(sorted(names), 5))
+        for uid in rng.sample(sorted(names), 3):
+            names[uid] = f"{names[uid]}_{day}"
+
+        # the other target sees the renames of the users they share first
+        clock["now"] = START + timedelta(days=day)
+        sync("other", 8, {"followers": {uid: names[uid] for uid in other}, "followings": {}})
+        if day % 3 != 2:
+            clock["now"] = START + timedelta(days=day, hours=1)
+            lists = {
+                list_name: {uid: names[uid] for uid in members[list_name]}
+                for list_name in LISTS
+            }
+            sync("target", 7, lists)
+            for users in lists.values():
+                fetched_names.update(users.values())
+        snapshots.append({list_name: dict(users) for list_name, users in lists.items()})
+    return snapshots, fetched_names
+
+
+def check(snapshots: list[Lists], fetched_names: set[str]) -> None:
+    user = cached.User.get("target")
+    for list_name in LISTS:
+        assert getattr(user, list_name) == snapshots[-1][list_name]
+    for day, expected in enumerate(snapshots):
+        # the state at a date is the one left by the days before it
+        state = user.checkout((START + timedelta(days=day + 1)).date())
+        for list_name in LISTS:
+            assert dict(getattr(state, list_name).items()) == expected[list_name], day
+    for name in fetched_names:
+        assert any(cached.User.history("target", mention=name)), name
+
+
+@pytest.mark.parametrize("storage,state_format,codec", STORAGES)
+def test_checkout_round_trip(scratch, storage, state_format, codec):
+    settings.Settings.get().update(storage=storage, state_format=state_format, codec=codec)
+    snapshots, fetched_names = build(scratch)
+    reload()
+    check(snapshots, fetched_names)
+
+    # rewritten in full (through checkpoints as well)
+    user = cached.User.get("target")
+    assert user.rebuild_checkpoints(interval=4) > 0
+    user.dump("target", 7)
+    reload()
+    check(snapshots, fetched_names)
+
+
+@pytest.mark.parametrize("state_format", ["json", "binary"])
+def test_renames_seen_by_other_targets(scratch, state_format):
+    settings.Settings.get().update(state_format=state_format)
+    build(scratch)
+    user = cached.User.get("target")
+    renamed = {uid: f"{name}_later" for uid, name in user.followers.items()}
+    scratch["now"] = START + timedelta(days=DAYS)
+    sync("other", 8, {"followers": renamed, "followings": {}})
+    reload()
+
+    # the target is still named as of its last sync, until it's synced again
+    assert cached.User.get("target").followers == user.followers
+    sync("target", 7, {"followers": renamed, "followings": user.followings})
+    reload()
+    entry = cached.User.get("target").changelog[-1]
+    assert entry.followers.renamed == {
+        uid: (name, renamed[uid]) for uid, name in user.followers.items()
+    }
+
+
+@pytest.mark.parametrize("state_format", ["json", "binary"])
+def test_missing_username_table(scratch, state_format):
+    settings.Settings.get().update(state_format=state_format)
+    snapshots, fetched_names = build(scratch)
+    cached.User.get("target").dump("target", 7)
+    uids.USERNAMES_PATH.unlink()
+    uids.USERNAMES_JOURNAL_PATH.unlink(missing_ok=True)
+    reload()
+    check(snapshots, fetched_names)
+
+
+@pytest.mark.parametrize("state_format", ["json", "binary"])
+def test_checkouts_dont_share_the_lists(scratch, state_format):
+    settings.Settings.get().update(state_format=state_format)
+    build(scratch)
+    reload()
+    user = cached.User.get("target")
+    user.rebuild_checkpoints(interval=4)
+    followers = dict(user.followers.items())
+    # as of the current state and of a checkpoint, where nothing is replayed
+    for at in (START + timedelta(days=DAYS), START + timedelta(days=5)):
+        state = user.checkout(at.date())
+        state.followers.clear()
+        state.followers[0] = "added"
+    assert dict(user.followers.items()) == followers
+    assert all(0 not in checkpoint.followers for checkpoint in user.checkpoints)
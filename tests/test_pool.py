@@ -0,0 +1,31 @@
+"""The retry policy of a pool of workers, which can't prompt"""
+
+import pytest
+
+from cmds.utils import settings
+from cmds.utils.pool import WorkerPool
+
+
+def test_pools_never_prompt(monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail(prompt))
+    policy = settings.Settings.get()
+    policy.update(retry={"retries": "ask", "partial": "ask", "backoff": [5]})
+    WorkerPool.unattended()
+
+    retry = settings.Settings.get().retry
+    assert not retry.should_retry(0, "retry?")
+    assert not retry.commit_partial("commit?")
+    assert retry.backoff == [5]
+    # only for the current run
+    with open(settings.SETTINGS_PATH, encoding="utf-8") as file:
+        persisted = settings.Settings.model_validate_json(file.read())
+    assert persisted.retry.retries == "ask" and persisted.retry.partial == "ask"
+
+
+def test_configured_policies_are_kept():
+    settings.Settings.get().update(retry={"retries": 3, "partial": "commit"})
+    WorkerPool.unattended()
+
+    retry = settings.Settings.get().retry
+    assert retry.should_retry(2, "retry?") and not retry.should_retry(3, "retry?")
+    assert retry.commit_partial("commit?")
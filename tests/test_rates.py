@@ -0,0 +1,60 @@
+"""The pacing of the requests of a bot, against a clock of its own"""
+
+import pytest
+
+from cmds.utils import rates
+from cmds.utils.rates import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch) -> dict:
+    now = {"now": 0.0}
+    monkeypatch.setattr(rates, "monotonic", lambda: now["now"])
+    # without the jitter
+    monkeypatch.setattr(rates, "uniform", lambda low, high: low)
+    return now
+
+
+def paced(clock: dict, **fields) -> RateLimiter:
+    instance = RateLimiter(**fields)
+    instance._updated = clock["now"]
+    return instance
+
+
+def test_bursts_then_paces(clock):
+    limiter = paced(clock, rate=0.5, burst=2)
+    assert limiter.reserve() == 0
+    # a token is refilled every 2 seconds
+    assert limiter.reserve() == pytest.approx(2)
+    clock["now"] += 2
+    assert limiter.reserve() == pytest.approx(2)
+
+
+def test_failures_back_off(clock):
+    limiter = paced(clock, rate=0.5, min_rate=0.1, cooldown=10, max_cooldown=15)
+    # the cooldown and then a token at the reduced rate, the cooldown doubling
+    # (up to its maximum) and the rate being halved (down to its minimum) every time
+    for rate, cooldown in ((0.25, 10), (0.125, 15), (0.1, 15)):
+        clock["now"] += 1000
+        assert limiter.reserve() == 0
+        limiter.failure()
+        assert limiter.rate == rate
+        assert limiter.reserve() == pytest.approx(cooldown + 1 / rate)
+
+
+def test_successes_recover(clock):
+    limiter = paced(clock, rate=0.5, min_rate=0.2, max_rate=0.6, increase=0.05)
+    for _ in range(3):
+        limiter.failure()
+    assert limiter.rate == 0.2
+
+    limiter.success()
+    assert limiter.rate == pytest.approx(0.25)
+    for _ in range(10):
+        limiter.success()
+    assert limiter.rate == 0.6
+    # the cooldowns start over
+    clock["now"] += 100
+    limiter.reserve()
+    limiter.failure()
+    assert limiter.reserve() == pytest.approx(limiter.cooldown + 1 / 0.3)
@@ -0,0 +1,230 @@
+"""Scraps without a client: the progress they keep for resuming, the hooks that end
+them early (fed with chunks the way the scrapping loop passes them on) and the retry
+policy answering their failures"""
+
+import os
+from time import time
+from types import SimpleNamespace
+
+import pytest
+
+from cmds.models import cached, fetched
+from cmds.utils import rates, scrapping, settings
+from cmds.utils.constants import SCRAP_CHECKPOINT_TTL
+from cmds.utils.rates import RateLimiter
+from cmds.utils.scrapping import (
+    IncrementalScan,
+    KnownViewers,
+    ListGate,
+    ScrapCheckpoint,
+    Scrapper,
+    ScrapSession,
+    fingerprint,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_rates(monkeypatch):
+    monkeypatch.setattr(rates, "_rates", None)
+
+
+KNOWN = {uid: f"user{uid}" for uid in range(1, 11)}
+
+
+def fed(hook, *chunks: dict[int, str]):
+    """Feeds the chunks to a stop hook (the result growing with each one) until it stops
+    the scrap, returning what it ended it with (or `None`) and the chunks it took"""
+    result: dict[int, str] = {}
+    for taken, users in enumerate(chunks, 1):
+        result.update(users)
+        stopped = hook(result, users)
+        if stopped is not None:
+            return stopped, taken
+    return None, len(chunks)
+
+
+def chunk(users: dict[int, str]) -> list:
+    return [SimpleNamespace(pk=str(uid), username=name) for uid, name in users.items()]
+
+
+def scrapper(user_count: int = 6) -> Scrapper:
+    client = SimpleNamespace(user_id=1)
+    return Scrapper(client, "7", user_count, chunk_size=2, limiter=RateLimiter())
+
+
+def test_interrupted_scraps_resume():
+    session = ScrapSession(scrapper(), "followers")
+    assert session.process(chunk({1: "a", 2: "b"}), "first")
+    assert session.process(chunk({3: "c", 4: "d"}), "second")
+    # interrupted (e.g. by instagram) and never retried
+    assert session.finish() == {1: "a", 2: "b", 3: "c", 4: "d"}
+
+    resumed = scrapper()
+    session = ScrapSession(resumed, "followers")
+    assert resumed.cursor == "second"
+    assert session.result == {1: "a", 2: "b", 3: "c", 4: "d"}
+    assert not session.process(chunk({5: "e", 6: "f"}), "")
+    assert session.completed
+    assert session.finish() == {uid: name for uid, name in zip(range(1, 7), "abcdef")}
+    assert not ScrapCheckpoint.of("7", "followers").path.exists()
+
+    # the checkpoints of the other lists are kept apart
+    assert ScrapSession(scrapper(), "followings").result == {}
+
+
+def test_half_written_chunks_are_dropped():
+    checkpoint = ScrapCheckpoint.of("7", "followers")
+    checkpoint.save({1: "a"}, "first")
+    with open(checkpoint.path, "a", encoding="utf-8") as file:
+        file.write('{"users": {"2": "b"}, "cur')
+    assert checkpoint.load() == ({1: "a"}, "first")
+
+
+def test_stale_checkpoints_are_discarded():
+    checkpoint = ScrapCheckpoint.of("7", "followers")
+    checkpoint.save({1: "a"}, "first")
+    modified = time() - SCRAP_CHECKPOINT_TTL - 1
+    os.utime(checkpoint.path, (modified, modified))
+
+    assert checkpoint.load() == ({}, "")
+    assert not checkpoint.path.exists()
+
+
+def test_incremental_scans_stop_on_a_known_run():
+    new = {100: "new"}
+    scan = IncrementalScan(KNOWN, len(KNOWN) + 1, match_run=3)
+    # a run is broken by unknown users and by known ones out of order
+    chunks = [
+        new | {1: "user1", 2: "user2"},
+        {4: "user4", 3: "user3"},
+        {5: "user5", 6: "user6", 7: "user7"},
+    ]
+    result, taken = fed(scan, *chunks)
+    assert taken == 3
+    # the rest (after `user7`) is inferred from the cache
+    assert result == new | KNOWN
+
+
+def test_incremental_scans_fall_back_to_full_scans():
+    # someone further down the list was removed
+    scan = IncrementalScan(KNOWN, len(KNOWN), match_run=2)
+    result, taken = fed(scan, {100: "new", 1: "user1", 2: "user2"}, {3: "user3"})
+    assert (result, taken) == (None, 2)
+    assert not scan.active
+
+
+def test_incremental_scans_reset_on_new_users():
+    scan = IncrementalScan(KNOWN, len(KNOWN) + 1, match_run=2)
+    chunks = [{1: "user1"}, {100: "new"}, {2: "user2", 3: "user3"}]
+    assert fed(scan, *chunks) == ({1: "user1", 100: "new"} | KNOWN, 3)
+
+
+FIRST = {uid: KNOWN[uid] for uid in (1, 2, 3)}
+
+
+def test_unchanged_lists_are_gated():
+    gate = ListGate(KNOWN, len(KNOWN), fingerprint(FIRST))
+    assert fed(gate, FIRST, {4: "user4"}) == (KNOWN, 1)
+    assert gate.gated
+
+
+def test_changed_lists_go_on():
+    chunks = [FIRST, {4: "user4"}]
+    # a different count, first chunk or the gate being disabled
+    for gate in (
+        ListGate(KNOWN, len(KNOWN) + 1, fingerprint(FIRST)),
+        ListGate(KNOWN, len(KNOWN), fingerprint(FIRST | {1: "renamed"})),
+        ListGate(KNOWN, len(KNOWN), fingerprint(FIRST), enabled=False),
+    ):
+        assert fed(gate, *chunks) == (None, 2)
+        assert not gate.gated
+        # the fingerprint is still taken, to be recorded for the next time
+        assert gate.fingerprint == fingerprint(FIRST)
+
+
+def test_gated_lists_pass_chunks_on():
+    then = IncrementalScan(KNOWN, len(KNOWN) + 1, match_run=2)
+    gate = ListGate(KNOWN, len(KNOWN) + 1, fingerprint(FIRST), then=then)
+    assert fed(gate, {100: "new"}, FIRST) == ({100: "new"} | KNOWN, 2)
+
+
+def test_resumed_scraps_are_not_fingerprinted():
+    gate = ListGate(KNOWN, len(KNOWN), fingerprint(FIRST))
+    # a scrap resumed from a checkpoint, its first chunk isn't the first of the list
+    assert gate({100: "new"} | FIRST, FIRST) is None
+    assert gate.fingerprint is None and not gate.gated
+
+
+def test_viewers_stop_on_a_recorded_run():
+    hook = KnownViewers(set(KNOWN), match_run=3)
+    # the most recent viewers first, the run being broken by new ones
+    chunks = [
+        {100: "new", 1: "user1", 2: "user2"},
+        {101: "newer", 3: "user3"},
+        {4: "user4", 5: "user5"},
+        {6: "user6"},
+    ]
+    result, taken = fed(hook, *chunks)
+    assert taken == 3
+    # what was fetched so far, to be merged into the recorded viewers
+    assert result == chunks[0] | chunks[1] | chunks[2]
+
+
+def test_viewers_of_short_histories():
+    # fewer viewers recorded than the run, all of them are enough
+    users = {100: "new", 2: "user2", 1: "user1"}
+    assert fed(KnownViewers({1, 2}, match_run=5), users) == (users, 1)
+    # nothing recorded, nothing to stop at
+    assert fed(KnownViewers(set(), match_run=5), users) == (None, 1)
+
+
+@pytest.fixture
+def policy(monkeypatch) -> settings.RetryPolicy:
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail(prompt))
+    slept: list[float] = []
+    monkeypatch.setattr(scrapping, "sleep", slept.append)
+    settings.Settings.get().update(
+        persist=False, retry={"retries": 3, "backoff": [60, 300], "relogin": False}
+    )
+    return settings.Settings.get().retry
+
+
+def test_retries_follow_the_policy(policy):
+    assert [policy.should_retry(attempt, "retry?") for attempt in range(5)] == [
+        True,
+        True,
+        True,
+        False,
+        False,
+    ]
+    # the last delay of the schedule repeats
+    assert [policy.delay(attempt) for attempt in range(4)] == [60, 300, 300, 300]
+    assert settings.RetryPolicy(backoff=[]).delay(3) == 0
+
+
+def test_retries_count_consecutive_failures(policy):
+    session = ScrapSession(scrapper(), "followers")
+    assert [session.backoff("retry?") for _ in range(4)] == [60, 300, 300, None]
+
+    # progress starts the count over
+    session = ScrapSession(scrapper(), "followers")
+    assert session.retry() and session.retry()
+    assert session.process(chunk({1: "a", 2: "b"}), "first")
+    assert session.attempts == 0
+    assert session.backoff("retry?") == 60
+
+
+@pytest.mark.parametrize("partial,committed", [("commit", True), ("discard", False)])
+def test_partial_results_follow_the_policy(policy, partial, committed):
+    settings.Settings.get().update(persist=False, retry={"partial": partial})
+    # fewer followers than instagram counted
+    partial_user = fetched.User(
+        username="target",
+        id=7,
+        followers={1: "a", 2: "b"},
+        followings={},
+        follower_count=3,
+        following_count=0,
+    )
+    cached.User.get("target").dump_update(partial_user)
+    assert cached.User.exists("target") is committed
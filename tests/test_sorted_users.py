@@ -0,0 +1,26 @@
+"""The sorted arrays the lists are compared through (with numpy) follow the lists"""
+
+import pytest
+from conftest import sync
+
+from cmds.models import cached
+from cmds.utils import vectorized
+
+pytest.importorskip("numpy")
+
+
+def test_changes_in_place_are_seen(monkeypatch):
+    monkeypatch.setattr(vectorized, "MIN_SIZE", 0)
+    sync("target", 7, {"followers": {1: "one", 2: "two"}, "followings": {}})
+    user = cached.User.get("target")
+    assert user.sorted_users("followers").names.tolist() == ["one", "two"]
+
+    # a journal entry renaming a user, replayed on the same list
+    entry = cached.ChangelogEntry(followers=cached.Update(renamed={1: ("one", "uno")}))
+    followers = user.followers
+    user.replay(entry.model_dump_json())
+    assert user.followers is followers
+    assert user.sorted_users("followers").names.tolist() == ["uno", "two"]
+    assert user.renamed_from(cached.User(followers={1: "one", 2: "two"}), "followers") == {
+        1: ("one", "uno")
+    }
@@ -0,0 +1,148 @@
+"""Story lookups (json storage) through the persisted viewer index: they must match
+a plain scan of the viewers, including the records synced after the index was written"""
+
+import random
+from datetime import timedelta
+
+import pytest
+from conftest import START, reload
+
+from cmds.models import cached, fetched
+from cmds.models.cached import viewer_index
+from cmds.models.cached.viewer_index import ViewerIndex
+from cmds.models.viewer import Viewer
+
+OWNER, OWNER_UID = "owner", 99
+
+
+def story(day: int, viewers: dict[int, str]) -> fetched.Story:
+    recorded_at = START + timedelta(days=day)
+    return fetched.Story(
+        taken_at=recorded_at,
+        viewers={
+            uid: Viewer(name=name, recorded_at=recorded_at) for uid, name in viewers.items()
+        },
+    )
+
+
+def sync(stories: dict[int, fetched.Story]) -> None:
+    cached.StoryHistory.get(OWNER).dump_update(
+        fetched.Stories(username=OWNER, id=OWNER_UID, stories=stories)
+    )
+
+
+def build(days: int = 20, seed: int = 0) -> None:
+    """Syncs a story a day, viewed by users that keep being renamed
+    (at times to the name another user had before)"""
+    rng = random.Random(seed)
+    names = {uid: f"user{uid}" for uid in range(1, 60)}
+    for day in range(days):
+        for uid in rng.sample(sorted(names), 4):
+            names[uid] = rng.choice([f"user{uid}_{day}", *names.values()])
+        viewers = rng.sample(sorted(names), 30)
+        sync({day: story(day, {uid: names[uid] for uid in viewers})})
+
+
+def scanned(viewer: str, deep: bool = False, all: bool = False) -> list:
+    """The lookup as the viewers would be scanned one by one"""
+    history = cached.StoryHistory.get(OWNER)
+    stories = sorted(history.stories.items(), key=lambda item: item[1].timestamp)
+    stories.reverse()
+    matches = {
+        sid: next(
+            (uid for uid, record in story.viewers.items() if record.name == viewer), None
+        )
+        for sid, story in stories
+    }
+    if deep:
+        uid = next((uid for uid in matches.values() if uid is not None), None)
+        if uid is None:
+            return []
+        matches = {
+            sid: uid if uid in story.viewers else None for sid, story in stories
+        }
+    return [
+        (sid, matches[sid] and story.viewers[matches[sid]])
+        for sid, story in stories
+        if all or matches[sid] is not None
+    ]
+
+
+def looked_up(viewer: str, deep: bool = False, all: bool = False) -> list:
+    return [
+        (sid, record)
+        for sid, _, record in cached.StoryHistory.lookup(OWNER, viewer, deep, all=all)
+    ]
+
+
+def names() -> set[str]:
+    return set(cached.StoryHistory.get(OWNER)._names.strings)
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_lookups_match_the_scan(monkeypatch, vectorized):
+    monkeypatch.setattr(
+        viewer_index.vectorized, "MIN_SIZE", 0 if vectorized else float("inf")
+    )
+    build()
+    path = cached.StoryHistory.viewer_index_path_of(OWNER_UID)
+    assert not path.exists()
+    for viewer in sorted(names()):
+        for deep in (False, True):
+            assert looked_up(viewer, deep) == scanned(viewer, deep), (viewer, deep)
+    assert path.is_file()
+
+
+def test_unknown_viewers():
+    build(days=3)
+    assert looked_up("nobody", deep=True, all=True) == []
+    assert looked_up("nobody", all=True) == [(sid, None) for sid in (2, 1, 0)]
+
+
+def test_first_match_of_a_story():
+    sync({0: story(0, {1: "first", 2: "second"})})
+    # the first viewer gave up the name to the second one while the story was up
+    sync({0: story(0, {1: "first_", 3: "first"})})
+    sync({1: story(1, {3: "first"})})
+    assert [(sid, record.name) for sid, record in looked_up("first")] == [
+        (1, "first"),
+        (0, "first"),
+    ]
+    assert cached.StoryHistory.get(OWNER).stories[0].viewers.find("uids", 3) == 2
+    assert looked_up("first") == scanned("first")
+    # the uid is the one recorded with the name in the most recent story
+    assert [sid for sid, _ in looked_up("first", deep=True)] == [1, 0]
+    assert looked_up("first", deep=True) == scanned("first", deep=True)
+
+
+def test_syncs_are_scanned_until_the_index_is_rebuilt():
+    build()
+    looked_up("user1")
+    path = cached.StoryHistory.viewer_index_path_of(OWNER_UID)
+    written = path.read_bytes()
+
+    # a few more records are scanned past the covered ones
+    sync({100: story(100, {1: "late", 2: "user2"})})
+    for viewer in ("late", "user2"):
+        for deep in (False, True):
+            assert looked_up(viewer, deep) == scanned(viewer, deep)
+    assert path.read_bytes() == written
+
+    # and once they're too many the index covers them as well
+    sync({101: story(101, {uid: f"later{uid}" for uid in range(1000, 1200)})})
+    assert looked_up("later1100", deep=True) == scanned("later1100", deep=True)
+    index = ViewerIndex.open(path)
+    assert index is not None and index.covered[101] == 200
+
+
+def test_a_line_per_story():
+    build(days=3)
+    path = cached.StoryHistory.path_of(OWNER_UID)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3 + 5
+    assert all(line.startswith(f'"{sid}": {{') for sid, line in zip(range(3), lines[2:]))
+
+    reload()
+    history = cached.StoryHistory.get(OWNER)
+    assert [len(story.viewers) for story in history.stories.values()] == [30] * 3
+    assert looked_up("user1") == scanned("user1")